@@ -0,0 +1,242 @@
+"""
+Contrôle d'admission devant l'étape de génération LLM.
+
+Limite le nombre de générations simultanées et place les requêtes en surplus
+dans une file d'attente bornée, ordonnée par classe de priorité. Une requête
+est rejetée lorsque la file est pleine ou que son attente dépasse le délai
+autorisé ; le rejet indique au client quand réessayer (Retry-After).
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from logger import logger, request_logger
+from constants import (
+    DEFAULT_LLM_MAX_IN_FLIGHT, DEFAULT_LLM_MAX_QUEUE, DEFAULT_LLM_QUEUE_TIMEOUT,
+    DEFAULT_RETRY_AFTER, WAIT_TIME_BUCKETS
+)
+
+# Classes de priorité : une valeur plus petite est servie en premier
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    """Levée lorsqu'une requête ne peut pas être admise (surcharge)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "shed")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.shed = False
+
+
+class AdmissionController:
+    """
+    Limiteur de concurrence avec file d'attente bornée et priorités.
+
+    Lorsque la file est pleine, une requête interactive évince la requête batch
+    arrivée le plus récemment ; une requête batch est rejetée.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_LLM_MAX_IN_FLIGHT,
+                 max_queue: int = DEFAULT_LLM_MAX_QUEUE,
+                 queue_timeout: float = DEFAULT_LLM_QUEUE_TIMEOUT):
+        """
+        Initialise le contrôleur d'admission.
+
+        Args:
+            max_in_flight: Nombre maximal de générations simultanées
+            max_queue: Nombre maximal de requêtes en attente
+            queue_timeout: Délai d'attente maximal par défaut (secondes)
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        # Durée moyenne (EWMA) d'occupation d'un slot, pour estimer Retry-After
+        self._service_time = None
+
+        self._admitted = 0
+        self._rejected = {"queue_full": 0, "timeout": 0, "preempted": 0}
+        self._wait_count = 0
+        self._wait_sum = 0.0
+        self._wait_max = 0.0
+        self._wait_buckets = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+
+    def acquire(self, priority: str = "interactive", timeout: Optional[float] = None) -> float:
+        """
+        Attend un slot de génération.
+
+        Args:
+            priority: Classe de priorité ("interactive" ou "batch")
+            timeout: Délai d'attente maximal en secondes (défaut: queue_timeout)
+
+        Returns:
+            float: Temps passé en file d'attente (secondes)
+
+        Raises:
+            AdmissionRejected: Si la file est pleine (429) ou si le délai est dépassé (503)
+        """
+        level = PRIORITIES.get(priority, PRIORITIES["batch"])
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+
+        with self._cond:
+            if self._in_flight < self.max_in_flight and self._waiting == 0:
+                self._in_flight += 1
+                self._record_admission(0.0)
+                return 0.0
+
+            if self._waiting >= self.max_queue and not self._shed_lower_priority(level):
+                self._rejected["queue_full"] += 1
+                raise AdmissionRejected(
+                    "LLM queue is full", 429, self._retry_after())
+
+            waiter = _Waiter(level)
+            heapq.heappush(
+                self._heap, (level, next(self._sequence), waiter))
+            self._waiting += 1
+
+            deadline = start + max(0.0, timeout)
+            while not (waiter.granted or waiter.shed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if waiter.granted:
+                waited = time.monotonic() - start
+                self._record_admission(waited)
+                return waited
+
+            if waiter.shed:
+                raise AdmissionRejected(
+                    "Pre-empted by higher priority traffic", 503, self._retry_after())
+
+            # Délai dépassé : le waiter est retiré paresseusement de la file
+            waiter.cancelled = True
+            self._waiting -= 1
+            self._rejected["timeout"] += 1
+            raise AdmissionRejected(
+                f"Timed out after {timeout:.1f}s waiting for an LLM slot", 503,
+                self._retry_after())
+
+    def release(self, held_for: Optional[float] = None):
+        """
+        Libère un slot et le transmet à la requête en attente la plus prioritaire.
+
+        Args:
+            held_for: Durée d'occupation du slot (secondes), pour l'estimation de Retry-After
+        """
+        with self._cond:
+            if held_for is not None:
+                self._service_time = held_for if self._service_time is None else \
+                    0.8 * self._service_time + 0.2 * held_for
+            self._in_flight -= 1
+            while self._heap and self._in_flight < self.max_in_flight:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled or waiter.shed:
+                    continue
+                waiter.granted = True
+                self._waiting -= 1
+                self._in_flight += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", timeout: Optional[float] = None):
+        """
+        Gestionnaire de contexte qui occupe un slot de génération.
+
+        Yields:
+            float: Temps passé en file d'attente (secondes)
+        """
+        waited = self.acquire(priority, timeout)
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - start)
+        if waited > 0:
+            request_logger.info(
+                f"LLM slot ({priority}) waited {waited * 1000:.0f} ms in queue")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Retourne l'état de la file et les statistiques d'attente.
+
+        Returns:
+            Dict[str, Any]: Slots occupés, profondeur de file, admissions, rejets et
+            histogramme cumulatif des temps d'attente (secondes)
+        """
+        with self._cond:
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_TIME_BUCKETS + ["+Inf"], self._wait_buckets):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "admitted_total": self._admitted,
+                "rejected_total": dict(self._rejected),
+                "wait_seconds": {
+                    "count": self._wait_count,
+                    "sum": self._wait_sum,
+                    "max": self._wait_max,
+                    "mean": self._wait_sum / self._wait_count if self._wait_count else 0.0,
+                    "buckets": buckets,
+                },
+                "service_seconds_ewma": self._service_time or 0.0,
+            }
+
+    def _shed_lower_priority(self, level: int) -> bool:
+        # Évincer la requête en attente la moins prioritaire (la plus récente à priorité égale)
+        candidates = [entry for entry in self._heap
+                      if not entry[2].cancelled and not entry[2].shed and entry[0] > level]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))[2]
+        victim.shed = True
+        self._waiting -= 1
+        self._rejected["preempted"] += 1
+        self._cond.notify_all()
+        logger.info("Pre-empted a queued batch request for interactive traffic")
+        return True
+
+    def _record_admission(self, waited: float):
+        self._admitted += 1
+        self._wait_count += 1
+        self._wait_sum += waited
+        self._wait_max = max(self._wait_max, waited)
+        for i, bound in enumerate(WAIT_TIME_BUCKETS):
+            if waited <= bound:
+                self._wait_buckets[i] += 1
+                break
+        else:
+            self._wait_buckets[-1] += 1
+
+    def _retry_after(self) -> int:
+        # Temps estimé pour écouler la file actuelle avec les slots disponibles
+        if not self._service_time:
+            return DEFAULT_RETRY_AFTER
+        estimate = self._service_time * (self._waiting + 1) / self.max_in_flight
+        return max(DEFAULT_RETRY_AFTER, math.ceil(estimate))
@@ -1,18 +1,40 @@
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from rag import setup_rag_pipeline
-from embedding import setup_vector_store
+from rag import setup_rag_pipeline, build_query_with_history, stream_answer
+from embedding import (
+    setup_vector_store, get_chunk_id, get_documents_by_ids, get_embedding_model,
+    close_vector_store
+)
+from sharding import ShardedVectorStore
+from collection_manager import (
+    Collection, CollectionManager, UnknownCollection, estimate_memory
+)
+from session import SessionStore, SessionCollectionMismatch
+from rerank import CrossEncoderReranker
+from admission import AdmissionController, AdmissionRejected
+from deadline import Deadline
+from llm_pool import check_llm_availability, get_llm_pool
+from batch import normalize_batch_items, run_batch
 from utils import load_documents
 import os
-import requests
+import threading
 import time
-from requests.exceptions import ConnectionError, Timeout, RequestException
-from logger import logger
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from requests.exceptions import ConnectionError
+from logger import logger, request_logger
 from constants import (
     DEFAULT_DATA_PATH, DEFAULT_DB_PATH, ENV_TOKENIZERS_PARALLELISM,
     ENV_TOKENIZERS_PARALLELISM_VALUE, MSG_LOADING_DOCUMENTS,
     MSG_LOADED_DOCUMENTS, MSG_SETUP_VECTOR_STORE, MSG_INIT_RAG,
-    ERROR_FILE_NOT_FOUND, DEFAULT_LM_STUDIO_URL
+    ERROR_FILE_NOT_FOUND, DEFAULT_LM_STUDIO_URL,
+    DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_MAX_CONCURRENCY, DEFAULT_BATCH_MAX_QUERIES,
+    DEFAULT_RERANK_MODEL, DEFAULT_RERANK_CANDIDATES, DEFAULT_EMBEDDING_BACKEND,
+    DEFAULT_DEDUP_THRESHOLD, DEFAULT_NUM_SHARDS, DEFAULT_SHARD_TIMEOUT,
+    DEFAULT_LLM_MAX_IN_FLIGHT, DEFAULT_LLM_MAX_QUEUE, DEFAULT_LLM_QUEUE_TIMEOUT,
+    DEFAULT_REQUEST_DEADLINE, DEFAULT_HEALTH_CHECK_TIMEOUT, DEADLINE_RESPONSE_MARGIN,
+    DEFAULT_PREFLIGHT_WORKERS, DEFAULT_COLLECTION, DEFAULT_COLLECTIONS_PATH,
+    DEFAULT_COLLECTIONS_MEMORY_BUDGET_MB
 )
 
 # Initialize Flask app
@@ -25,28 +47,93 @@ os.environ[ENV_TOKENIZERS_PARALLELISM] = ENV_TOKENIZERS_PARALLELISM_VALUE
 
 data_path = os.getenv("DATA_PATH", DEFAULT_DATA_PATH)
 db_path = os.getenv("DB_PATH", DEFAULT_DB_PATH)
-
-# Ensure data file exists
-if not os.path.exists(data_path):
-    logger.error(ERROR_FILE_NOT_FOUND.format(data_path))
-    raise FileNotFoundError(ERROR_FILE_NOT_FOUND.format(data_path))
-
-# Load documents and set up vector store
-logger.info(MSG_LOADING_DOCUMENTS)
-documents = load_documents(data_path)
-logger.info(MSG_LOADED_DOCUMENTS.format(len(documents)))
-
-logger.info(MSG_SETUP_VECTOR_STORE)
-vector_store = setup_vector_store(documents, db_path, force_rebuild=False)
-
-# Set up RAG pipeline
-logger.info(MSG_INIT_RAG)
-rag_chain = setup_rag_pipeline(vector_store)
+embedding_backend = os.getenv("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND)
+collections_path = os.getenv("COLLECTIONS_PATH", DEFAULT_COLLECTIONS_PATH)
+collections_memory_budget = float(os.getenv(
+    "COLLECTIONS_MEMORY_BUDGET_MB", str(DEFAULT_COLLECTIONS_MEMORY_BUDGET_MB)))
+
+# Duplicate and near-duplicate elimination at ingest
+dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", str(DEFAULT_DEDUP_THRESHOLD)))
+
+# Optional sharded index searched with scatter-gather
+num_shards = int(os.getenv("NUM_SHARDS", str(DEFAULT_NUM_SHARDS)))
+shard_timeout = float(os.getenv("SHARD_TIMEOUT", str(DEFAULT_SHARD_TIMEOUT)))
+
+# Optional cross-encoder re-ranking stage
+rerank_enabled = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+rerank_candidates = int(os.getenv("RERANK_CANDIDATES", str(DEFAULT_RERANK_CANDIDATES)))
+reranker = CrossEncoderReranker(
+    model_name=os.getenv("RERANK_MODEL", DEFAULT_RERANK_MODEL)) if rerank_enabled else None
+
+# One embedding model instance shared by every collection
+embedding_model = get_embedding_model(embedding_backend)
+embedding_dimension = len(embedding_model.embed_query("dimension"))
+
+
+def open_collection(name, path, documents=None):
+    """Open the collection stored at path, or rebuild it from documents when given."""
+    logger.info(MSG_SETUP_VECTOR_STORE)
+    vector_store = setup_vector_store(
+        documents or [], path, force_rebuild=documents is not None,
+        embedding_model=embedding_model,
+        dedup=dedup_enabled, dedup_threshold=dedup_threshold,
+        num_shards=num_shards, shard_timeout=shard_timeout)
+    logger.info(MSG_INIT_RAG)
+    rag_chain = setup_rag_pipeline(
+        vector_store, reranker=reranker, candidates=rerank_candidates)
+    return Collection(name, vector_store, rag_chain,
+                      memory=estimate_memory(vector_store, embedding_dimension))
+
+
+def close_collection(collection, last_copy):
+    """Release an evicted or replaced collection once no request uses it."""
+    # Another copy opened on the same directory shares its chromadb system
+    close_vector_store(collection.vector_store, release_system=last_copy)
+
+
+# Named collections, opened on first use and evicted under a memory budget
+collections = CollectionManager(
+    db_path, collections_path, open_collection, memory_budget_mb=collections_memory_budget,
+    close_collection=close_collection)
+
+# The default collection is built from DATA_PATH the first time the API starts
+if not collections.exists(DEFAULT_COLLECTION):
+    if not os.path.exists(data_path):
+        logger.error(ERROR_FILE_NOT_FOUND.format(data_path))
+        raise FileNotFoundError(ERROR_FILE_NOT_FOUND.format(data_path))
+    logger.info(MSG_LOADING_DOCUMENTS)
+    documents = load_documents(data_path)
+    logger.info(MSG_LOADED_DOCUMENTS.format(len(documents)))
+    collections.build(DEFAULT_COLLECTION, documents)
+
+# Conversation sessions (bounded history and sources of the last exchange)
+sessions = SessionStore()
+
+# Optional pool of LLM endpoints (LM_STUDIO_URLS), shared with the RAG chain
+llm_pool = get_llm_pool()
+
+# Admission control in front of the LLM stage (limits are pool-wide)
+llm_admission = AdmissionController(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", str(DEFAULT_LLM_MAX_IN_FLIGHT))),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", str(DEFAULT_LLM_MAX_QUEUE))),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", str(DEFAULT_LLM_QUEUE_TIMEOUT))))
+
+# Request deadlines and the worker pools used to enforce them
+request_deadline = float(os.getenv("REQUEST_DEADLINE", str(DEFAULT_REQUEST_DEADLINE)))
+preflight_executor = ThreadPoolExecutor(
+    max_workers=DEFAULT_PREFLIGHT_WORKERS, thread_name_prefix="preflight")
+# One worker per admission slot, plus headroom for generations being cancelled
+generation_executor = ThreadPoolExecutor(
+    max_workers=llm_admission.max_in_flight * 2, thread_name_prefix="generation")
 
 
 @app.route('/chat', methods=['POST'])
 def chat():
     """Endpoint to handle chatbot queries."""
+    # Every stage below is bounded by the remaining request budget
+    deadline = Deadline.from_headers(request.headers, default=request_deadline)
+
     data = request.get_json()
     user_query = data.get("query", "")
 
@@ -54,113 +141,369 @@ def chat():
         logger.warning("Received empty query")
         return jsonify({"error": "Query is required"}), 400
 
-    # Check if LLM service is available
+    try:
+        collection = collections.acquire(data.get("collection") or DEFAULT_COLLECTION)
+    except (ValueError, UnknownCollection) as e:
+        return collection_error_response(e)
+
+    # An evicted collection is closed only once the requests using it are done
+    try:
+        return answer_query(collection, data, user_query, deadline)
+    finally:
+        collections.release(collection)
+
+
+def answer_query(collection, data, user_query, deadline):
+    """Answer a /chat query from a collection acquired by the caller."""
+    try:
+        session_id = sessions.get_or_create(
+            data.get("session_id"), collection=collection.name).session_id
+    except SessionCollectionMismatch as e:
+        # History and sources of a session only make sense in its own collection
+        logger.warning(str(e))
+        return jsonify({"error": str(e), "collection": e.collection}), 409
+
     llm_url = os.getenv("LM_STUDIO_URL", DEFAULT_LM_STUDIO_URL)
     # Add debug logs for Docker detection and URL configuration
-    logger.info(f"IS_DOCKER env: {os.getenv('IS_DOCKER', 'not set')}")
-    logger.info(
-        f"Using LLM URL: {llm_url} (DEFAULT is {DEFAULT_LM_STUDIO_URL})")
+    request_logger.info(
+        f"IS_DOCKER env: {os.getenv('IS_DOCKER', 'not set')}")
+    request_logger.info(
+        f"Using LLM service: {describe_llm_service(llm_url)} (DEFAULT is {DEFAULT_LM_STUDIO_URL})")
+
+    # The history only goes into the prompt: retrieval uses the question alone
+    history = sessions.build_history(session_id)
+    question = build_query_with_history(user_query, history)
 
-    llm_available = check_llm_availability(llm_url)
+    # Run the LLM health check and retrieval concurrently
+    health_future = preflight_executor.submit(
+        llm_service_available, llm_url, deadline.timeout(cap=DEFAULT_HEALTH_CHECK_TIMEOUT))
+    retrieval_future = preflight_executor.submit(
+        collection.rag_chain.retriever.invoke, user_query)
+
+    try:
+        source_docs = retrieval_future.result(timeout=deadline.timeout())
+    except FutureTimeoutError:
+        logger.error(
+            f"Retrieval did not finish within the request deadline ({deadline.budget:.1f}s)")
+        return jsonify({
+            "error": "Deadline exceeded",
+            "message": "Context retrieval did not finish within the request deadline."
+        }), 504
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"Error retrieving context: {error_msg}")
+        return jsonify({
+            "error": f"Error processing your query: {error_msg}",
+            "message": "The server encountered an error while retrieving context for your request."
+        }), 500
+
+    sources = [doc.metadata for doc in source_docs]
+
+    try:
+        llm_available = health_future.result(timeout=deadline.timeout())
+    except FutureTimeoutError:
+        llm_available = False
 
     if not llm_available:
-        error_msg = f"LLM service is not available at {llm_url}. Please make sure LM Studio is running."
+        error_msg = (f"LLM service is not available at {describe_llm_service(llm_url)}. "
+                     "Please make sure LM Studio is running.")
         logger.error(error_msg)
         return jsonify({
             "error": "LLM service unavailable",
-            "message": error_msg
+            "message": error_msg,
+            "sources": sources,
+            "session_id": session_id
         }), 503  # Service Unavailable
 
-    # Process query with retry
-    max_retries = 3
-    retry_delay = 1  # seconds
+    # Wait for an LLM slot no longer than the remaining budget
+    try:
+        llm_admission.acquire(
+            "interactive", timeout=deadline.timeout(margin=DEADLINE_RESPONSE_MARGIN))
+    except AdmissionRejected as e:
+        logger.warning(f"Request rejected by admission control: {str(e)}")
+        return overload_response(e, sources)
 
-    for attempt in range(max_retries):
-        try:
-            logger.info(
-                f"Processing query: {user_query} (attempt {attempt+1}/{max_retries})")
-            result = rag_chain.invoke({"query": user_query})
-            response = {
-                "answer": result.get("result", "No answer generated"),
-                "sources": [doc.metadata for doc in result.get("source_documents", [])]
-            }
-            return jsonify(response)
-
-        except ConnectionError as e:
-            logger.error(
-                f"Connection error (attempt {attempt+1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-            else:
-                return jsonify({
-                    "error": "Failed to connect to LLM service after multiple attempts",
-                    "message": f"The server could not connect to the LLM service at {llm_url}. Please ensure LM Studio is running and accessible."
-                }), 503
+    try:
+        answer, complete = generate_within_deadline(
+            collection.rag_chain, question, source_docs, deadline)
 
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Error processing query: {error_msg}")
-            return jsonify({
-                "error": f"Error processing your query: {error_msg}",
-                "message": "The server encountered an error while processing your request. This might be due to the complexity of your query or the size of the document corpus."
-            }), 500
+    except ConnectionError as e:
+        logger.error(f"Connection error: {str(e)}")
+        return jsonify({
+            "error": "Failed to connect to LLM service after multiple attempts",
+            "message": f"The server could not connect to the LLM service at {describe_llm_service(llm_url)}. Please ensure LM Studio is running and accessible.",
+            "sources": sources,
+            "session_id": session_id
+        }), 503
 
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"Error processing query: {error_msg}")
+        return jsonify({
+            "error": f"Error processing your query: {error_msg}",
+            "message": "The server encountered an error while processing your request. This might be due to the complexity of your query or the size of the document corpus.",
+            "sources": sources,
+            "session_id": session_id
+        }), 500
 
-def check_llm_availability(url):
-    """Check if the LLM service is available by making a simple request."""
+    if not complete:
+        logger.warning(
+            f"Generation did not finish within the request deadline ({deadline.budget:.1f}s), "
+            f"returning a partial answer ({len(answer)} characters)")
+
+    # An empty partial answer would only feed a blank assistant turn into the next prompt
+    if complete or answer:
+        sessions.add_turn(session_id, user_query, answer,
+                          [get_chunk_id(doc) for doc in source_docs], collection=collection.name)
+    return jsonify({
+        "answer": answer,
+        "sources": sources,
+        "session_id": session_id,
+        "collection": collection.name,
+        "partial": not complete
+    })
+
+
+def generate_within_deadline(rag_chain, question, source_docs, deadline):
+    """
+    Stream the answer from the LLM until it completes or the deadline is reached.
+
+    The caller must hold an admission slot: it is released by the generation
+    worker once the LLM call actually stops. Connection errors are retried with
+    exponential backoff only while nothing has been generated and the remaining
+    budget allows it.
+
+    Returns:
+        tuple: (answer text, True if the generation completed)
+    """
+    tokens = []
+    cancelled = threading.Event()
+
+    def worker():
+        start = time.monotonic()
+        max_retries = 3
+        retry_delay = 1  # seconds
+        try:
+            for attempt in range(max_retries):
+                if cancelled.is_set():
+                    # The request gave up while this worker was queued or backing off
+                    return
+                try:
+                    request_logger.info(
+                        f"Generating answer (attempt {attempt+1}/{max_retries})")
+                    for token in stream_answer(rag_chain, question, source_docs):
+                        if cancelled.is_set():
+                            # Closing the stream stops the generation on the LLM side
+                            return
+                        tokens.append(token)
+                    return
+                except ConnectionError as e:
+                    if tokens or attempt == max_retries - 1 or \
+                            deadline.timeout(margin=DEADLINE_RESPONSE_MARGIN) <= retry_delay:
+                        raise
+                    logger.error(
+                        f"Connection error (attempt {attempt+1}/{max_retries}): {str(e)}")
+                    logger.info(f"Retrying in {retry_delay} seconds...")
+                    # Wake up as soon as the request is cancelled to free the admission slot
+                    if cancelled.wait(retry_delay):
+                        return
+                    retry_delay *= 2  # Exponential backoff
+        finally:
+            llm_admission.release(time.monotonic() - start)
+
+    future = generation_executor.submit(worker)
     try:
-        # Try a simple request to the models endpoint (standard for OpenAI-compatible APIs)
-        response = requests.get(f"{url}/models", timeout=3)
-        if response.status_code == 200:
-            logger.info(f"LLM service available at {url}")
-            return True
-
-        # If models endpoint doesn't work, try a direct test with a simple completion
-        headers = {
-            "Content-Type": "application/json",
-        }
-        test_data = {
-            # This should be ignored by most OpenAI compatible APIs if model doesn't match
-            "model": "gpt-3.5-turbo",
-            "messages": [{"role": "user", "content": "Hello"}],
-            "max_tokens": 5
-        }
-
-        response = requests.post(
-            f"{url}/chat/completions", headers=headers, json=test_data, timeout=5)
-        # Accept any non-server error (even 401 or 404 means the server is responding)
-        if response.status_code < 500:
-            logger.info(f"LLM service responding at {url}")
-            return True
+        future.result(timeout=deadline.timeout(margin=DEADLINE_RESPONSE_MARGIN))
+        return "".join(tokens), True
+    except FutureTimeoutError:
+        cancelled.set()
+        return "".join(list(tokens)), False
+
+
+def collection_error_response(error):
+    """Build a 400 response for an invalid collection name, or 404 for an unknown one."""
+    if isinstance(error, UnknownCollection):
+        logger.warning(str(error))
+        return jsonify({"error": str(error), "collections": collections.names()}), 404
+    return jsonify({"error": str(error)}), 400
+
+
+def overload_response(rejection, sources=None):
+    """Build a 429/503 response with a Retry-After header from an admission rejection."""
+    body = {
+        "error": "LLM service overloaded",
+        "message": str(rejection),
+        "retry_after": rejection.retry_after
+    }
+    if sources is not None:
+        body["sources"] = sources
+    return jsonify(body), rejection.status_code, {"Retry-After": str(rejection.retry_after)}
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Endpoint to process many queries at once.
+
+    Body: {"queries": ["...", {"id": "q1", "query": "..."}], "concurrency": 4,
+           "collection": "default"}
+    Results are streamed back as JSON Lines in completion order; a failed
+    item carries an "error" field instead of an answer.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_queries = data.get("queries")
+
+    if not isinstance(raw_queries, list) or not raw_queries:
+        logger.warning("Received empty batch")
+        return jsonify({"error": "A non-empty 'queries' list is required"}), 400
+
+    if len(raw_queries) > DEFAULT_BATCH_MAX_QUERIES:
+        return jsonify({
+            "error": f"Too many queries: {len(raw_queries)} (maximum {DEFAULT_BATCH_MAX_QUERIES})"
+        }), 413
 
-        logger.warning(
-            f"LLM service returned status code {response.status_code} at {url}")
-        return False
-
-    except (ConnectionError, Timeout) as e:
-        logger.warning(f"Connection error when checking LLM service: {str(e)}")
-        return False
-    except RequestException as e:
-        logger.warning(f"Request error when checking LLM service: {str(e)}")
-        return False
-    except Exception as e:
-        logger.warning(f"Unexpected error when checking LLM service: {str(e)}")
-        return False
+    try:
+        concurrency = int(data.get("concurrency", DEFAULT_BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'concurrency' must be an integer"}), 400
+    concurrency = max(1, min(concurrency, DEFAULT_BATCH_MAX_CONCURRENCY))
+
+    name = data.get("collection") or DEFAULT_COLLECTION
+    try:
+        collections.path_for(name)
+    except ValueError as e:
+        return collection_error_response(e)
+
+    llm_url = os.getenv("LM_STUDIO_URL", DEFAULT_LM_STUDIO_URL)
+    if not llm_service_available(llm_url):
+        error_msg = (f"LLM service is not available at {describe_llm_service(llm_url)}. "
+                     "Please make sure LM Studio is running.")
+        logger.error(error_msg)
+        return jsonify({
+            "error": "LLM service unavailable",
+            "message": error_msg
+        }), 503
+
+    items = normalize_batch_items(raw_queries)
+    try:
+        collection = collections.acquire(name)
+    except UnknownCollection as e:
+        return collection_error_response(e)
+    logger.info(
+        f"Processing batch of {len(items)} queries (concurrency: {concurrency})")
+
+    def generate():
+        for result in run_batch(items, collection.rag_chain, collection.vector_store,
+                                concurrency=concurrency,
+                                admission=llm_admission):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Released once the stream is fully sent or the client disconnects
+    response.call_on_close(lambda: collections.release(collection))
+    return response
+
+
+def llm_service_available(url, timeout=DEFAULT_HEALTH_CHECK_TIMEOUT):
+    """Check the LLM pool health, or probe the single LLM endpoint when no pool is configured."""
+    if llm_pool is not None:
+        available = llm_pool.is_available()
+        if not available:
+            logger.warning(f"No healthy endpoint in {describe_llm_service(url)}")
+        return available
+    return check_llm_availability(url, timeout)
+
+
+def describe_llm_service(url):
+    """Name the LLM endpoints serving requests, for logs and error messages."""
+    if llm_pool is None:
+        return url
+    endpoints = llm_pool.get_metrics()["endpoints"]
+    healthy = [e["url"] for e in endpoints if e["healthy"]]
+    ejected = [e["url"] for e in endpoints if not e["healthy"]]
+    description = f"the LLM pool (healthy: {', '.join(healthy) or 'none'}"
+    if ejected:
+        description += f"; ejected: {', '.join(ejected)}"
+    return description + ")"
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint exposing admission queue depth, wait times and stage statistics."""
+    loaded = collections.loaded()
+    return jsonify({
+        "admission": llm_admission.get_metrics(),
+        "llm_pool": llm_pool.get_metrics() if llm_pool is not None else None,
+        "rerank": reranker.get_stats() if reranker is not None else None,
+        "collections": collections.get_stats(),
+        "shards": {
+            name: collection.vector_store.get_stats() for name, collection in loaded.items()
+            if isinstance(collection.vector_store, ShardedVectorStore)
+        } or None,
+        "sessions": len(sessions)
+    })
+
+
+@app.route('/collections', methods=['GET'])
+def list_collections():
+    """Endpoint listing the collections available on disk and those currently loaded."""
+    loaded = collections.loaded()
+    return jsonify({
+        "default": DEFAULT_COLLECTION,
+        "collections": [
+            {"name": name, "loaded": name in loaded}
+            for name in collections.names()
+        ]
+    })
 
 
 @app.route('/sources', methods=['GET'])
 def sources():
-    """Endpoint to retrieve sources for the last chatbot response."""
-    logger.info("Sources endpoint called (not yet implemented)")
-    return jsonify({"message": "This endpoint is not yet implemented."})
+    """Endpoint to retrieve sources for the last chatbot response of a session."""
+    session_id = request.args.get("session_id", "")
+    if not session_id:
+        return jsonify({"error": "session_id is required"}), 400
+
+    session = sessions.get(session_id)
+    if session is None:
+        logger.warning(f"Sources requested for unknown session: {session_id}")
+        return jsonify({"error": "Unknown or expired session"}), 404
+    source_ids = sessions.get_last_source_ids(session_id) or []
+
+    # Sources are looked up in the collection the session was answered from
+    try:
+        with collections.use(session.collection or DEFAULT_COLLECTION) as collection:
+            # Chunks are read by ID, without running the retrieval again
+            source_docs = get_documents_by_ids(collection.vector_store, source_ids)
+    except (ValueError, UnknownCollection) as e:
+        return collection_error_response(e)
+
+    return jsonify({
+        "session_id": session_id,
+        "collection": collection.name,
+        "sources": [
+            {"chunk_id": get_chunk_id(doc), "content": doc.page_content,
+             "metadata": doc.metadata}
+            for doc in source_docs
+        ]
+    })
 
 
 @app.route('/load_documents', methods=['POST'])
 def load_new_documents():
-    """Endpoint to load a new .jsonl file from an uploaded file."""
+    """
+    Endpoint to load a new .jsonl file from an uploaded file.
+
+    The optional form field "collection" names the collection to (re)build;
+    other collections are left untouched.
+    """
     try:
+        name = request.form.get("collection") or DEFAULT_COLLECTION
+        try:
+            collections.path_for(name)
+        except ValueError as e:
+            return collection_error_response(e)
+
         if 'file' not in request.files:
             logger.warning("No file part in the request")
             return jsonify({"error": "No file part"}), 400
@@ -200,23 +543,17 @@ def load_new_documents():
         new_documents = load_documents(temp_file_path)
         logger.info(f"Loaded {len(new_documents)} new documents")
 
-        # Set up new vector store
-        logger.info("Setting up new vector store...")
-        global vector_store
-        vector_store = setup_vector_store(
-            new_documents, db_path, force_rebuild=True)
-
-        # Reinitialize RAG pipeline
-        logger.info("Reinitializing RAG pipeline...")
-        global rag_chain
-        rag_chain = setup_rag_pipeline(vector_store)
+        # Build the collection's vector store and RAG pipeline
+        logger.info(f"Setting up collection '{name}'...")
+        collections.build(name, new_documents)
 
         # Remove temporary file
         os.remove(temp_file_path)
         logger.info(f"Temporary file {temp_file_path} removed")
 
         return jsonify({
-            "message": f"File '{file.filename}' successfully processed with {len(new_documents)} documents loaded.",
+            "message": f"File '{file.filename}' successfully processed with {len(new_documents)} documents loaded into collection '{name}'.",
+            "collection": name,
             "saved_path": permanent_file_path
         }), 200
 
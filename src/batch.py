@@ -0,0 +1,163 @@
+"""
+Traitement par lots de requêtes RAG.
+
+Les requêtes d'un lot sont encodées en un seul appel au modèle d'embedding,
+la récupération est faite en une seule recherche multi-requêtes, puis les
+générations sont réparties sur un nombre limité de threads. Les résultats
+sont produits dans l'ordre de complétion.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+from embedding import search_by_vectors, get_chunk_id
+from rag import generate_answer, get_reranker, get_search_k
+from admission import AdmissionRejected
+from logger import logger
+from constants import DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_QUEUE_TIMEOUT
+
+
+def normalize_batch_items(raw_items: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Normalise les éléments d'un lot en dictionnaires {"id", "query"}.
+
+    Chaque élément peut être une chaîne ou un dictionnaire avec une clé 'query'
+    (et optionnellement 'id'). L'identifiant par défaut est la position dans le lot.
+
+    Args:
+        raw_items: Éléments bruts du lot
+
+    Returns:
+        List[Dict[str, Any]]: Éléments normalisés
+    """
+    items = []
+    for index, raw in enumerate(raw_items):
+        if isinstance(raw, dict):
+            query = raw.get("query", "")
+            item_id = raw.get("id", index)
+        else:
+            query = raw
+            item_id = index
+        items.append({"id": item_id, "query": query if isinstance(query, str) else ""})
+    return items
+
+
+def load_batch_queries(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Charge les requêtes d'un lot depuis un fichier.
+
+    Chaque ligne est soit un objet JSON avec une clé 'query' (et optionnellement 'id'),
+    soit une question en texte brut.
+
+    Args:
+        file_path: Chemin vers le fichier de requêtes
+
+    Returns:
+        List[Dict[str, Any]]: Éléments normalisés
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        logger.error(f"File not found: {file_path}")
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    raw_items = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('//'):
+                continue
+            if line.startswith('{'):
+                try:
+                    raw_items.append(json.loads(line))
+                    continue
+                except json.JSONDecodeError:
+                    logger.warning(
+                        f"Invalid JSON line in {file_path}, using it as plain text")
+            raw_items.append(line)
+
+    logger.info(f"Loaded {len(raw_items)} batch queries from {file_path}")
+    return normalize_batch_items(raw_items)
+
+
+def run_batch(items: List[Dict[str, Any]], rag_chain, vector_store,
+              concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+              admission=None) -> Iterator[Dict[str, Any]]:
+    """
+    Traite un lot de requêtes et produit les résultats dans l'ordre de complétion.
+
+    Une erreur sur un élément est renvoyée dans le résultat de cet élément
+    (clé 'error') sans interrompre le reste du lot.
+
+    Args:
+        items: Éléments normalisés {"id", "query"}
+        rag_chain: La chaîne RAG utilisée pour la génération
+        vector_store: La base vectorielle utilisée pour la récupération
+        concurrency: Nombre maximal de générations simultanées
+        admission: Contrôleur d'admission optionnel (les générations sont en priorité "batch")
+
+    Yields:
+        Dict[str, Any]: {"id", "query", "answer", "sources"} ou {"id", "query", "error"}
+    """
+    valid_items = []
+    for item in items:
+        if item["query"].strip():
+            valid_items.append(item)
+        else:
+            yield {"id": item["id"], "query": item["query"], "error": "Query is required"}
+
+    if not valid_items:
+        return
+
+    # Encodage de toutes les requêtes en un seul appel, puis recherche multi-requêtes
+    # avec les mêmes paramètres de récupération que la chaîne RAG
+    try:
+        queries = [item["query"] for item in valid_items]
+        query_vectors = vector_store.embeddings.embed_documents(queries)
+        retrieved = search_by_vectors(
+            vector_store, query_vectors, get_search_k(rag_chain))
+        reranker = get_reranker(rag_chain)
+        if reranker is not None:
+            retrieved = reranker.rerank_batch(queries, retrieved)
+    except Exception as e:
+        logger.error(f"Batch retrieval failed: {str(e)}")
+        for item in valid_items:
+            yield {"id": item["id"], "query": item["query"],
+                   "error": f"Retrieval failed: {str(e)}"}
+        return
+
+    logger.info(
+        f"Retrieved context for {len(valid_items)} batch queries, generating with concurrency {concurrency}")
+
+    def process(item, documents):
+        if admission is None:
+            answer = generate_answer(rag_chain, item["query"], documents)
+        else:
+            with admission.slot("batch", timeout=DEFAULT_BATCH_QUEUE_TIMEOUT):
+                answer = generate_answer(rag_chain, item["query"], documents)
+        return {
+            "id": item["id"],
+            "query": item["query"],
+            "answer": answer,
+            "sources": [dict(doc.metadata, chunk_id=get_chunk_id(doc)) for doc in documents]
+        }
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = {
+            executor.submit(process, item, documents): item
+            for item, documents in zip(valid_items, retrieved)
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield future.result()
+            except AdmissionRejected as e:
+                yield {"id": item["id"], "query": item["query"], "error": str(e),
+                       "retry_after": e.retry_after}
+            except Exception as e:
+                logger.warning(
+                    f"Batch item {item['id']} failed: {str(e)}")
+                yield {"id": item["id"], "query": item["query"], "error": str(e)}
+    finally:
+        # Annuler les générations en attente si le consommateur s'arrête (ex: client déconnecté)
+        executor.shutdown(wait=False, cancel_futures=True)
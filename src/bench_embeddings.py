@@ -0,0 +1,116 @@
+"""
+Vérification de parité et benchmark des backends d'embedding.
+
+Compare les vecteurs de chaque backend à ceux du backend de référence PyTorch
+(similarité cosinus) et mesure le débit en ingestion (lots de textes) ainsi que
+la latence d'une requête isolée.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from typing import List
+from utils import load_documents
+from embedding import get_embedding_model, split_documents
+from logger import logger
+from constants import (
+    DEFAULT_DATA_PATH, DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKENDS,
+    DEFAULT_EMBEDDING_THREADS, DEFAULT_PARITY_THRESHOLD,
+    ENV_TOKENIZERS_PARALLELISM, ENV_TOKENIZERS_PARALLELISM_VALUE
+)
+
+# Éviter des problèmes avec les tokenizers HuggingFace
+os.environ[ENV_TOKENIZERS_PARALLELISM] = ENV_TOKENIZERS_PARALLELISM_VALUE
+
+
+def cosine_similarities(reference: List[List[float]], candidate: List[List[float]]) -> np.ndarray:
+    """Similarité cosinus ligne à ligne entre deux ensembles de vecteurs."""
+    a = np.asarray(reference, dtype=np.float32)
+    b = np.asarray(candidate, dtype=np.float32)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.clip(norms, 1e-12, None)
+
+
+def benchmark_backend(model, texts: List[str], queries: List[str], repeats: int):
+    """
+    Mesure le débit d'ingestion et la latence par requête d'un modèle d'embedding.
+
+    Returns:
+        Tuple: (vecteurs des textes, textes/seconde, latence médiane d'une requête en ms)
+    """
+    # Préchauffage : chargement paresseux, allocation des buffers
+    model.embed_documents(texts[:8])
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        vectors = model.embed_documents(texts)
+    throughput = len(texts) * repeats / (time.perf_counter() - start)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return vectors, throughput, float(np.median(latencies))
+
+
+def main():
+    """
+    Point d'entrée du benchmark : charge un échantillon du corpus, calcule les
+    vecteurs de référence puis compare chaque backend demandé.
+    """
+    parser = argparse.ArgumentParser(
+        description='Embedding backend parity check and throughput benchmark')
+    parser.add_argument('--data_path', type=str, default=DEFAULT_DATA_PATH,
+                        help='Path to the documents used as benchmark corpus')
+    parser.add_argument('--backends', type=str, nargs='+', default=EMBEDDING_BACKENDS,
+                        choices=EMBEDDING_BACKENDS, help='Backends to benchmark')
+    parser.add_argument('--model', type=str, default=DEFAULT_EMBEDDING_MODEL,
+                        help='Embedding model name')
+    parser.add_argument('--num_threads', type=int, default=DEFAULT_EMBEDDING_THREADS,
+                        help='Inference threads (0 = all available cores)')
+    parser.add_argument('--max_texts', type=int, default=1000,
+                        help='Maximum number of chunks used for the benchmark')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Number of passes over the corpus for the throughput measure')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_PARITY_THRESHOLD,
+                        help='Minimum cosine similarity with the reference vectors')
+    args = parser.parse_args()
+
+    chunks = split_documents(load_documents(args.data_path))
+    texts = [chunk.page_content for chunk in chunks][:args.max_texts]
+    if not texts:
+        raise ValueError(f"No texts found in {args.data_path}")
+    queries = [text[:100] for text in texts[:50]]
+    logger.info(f"Benchmarking on {len(texts)} texts")
+
+    reference_model = get_embedding_model(
+        "torch", args.model, args.num_threads)
+    reference, reference_throughput, reference_latency = benchmark_backend(
+        reference_model, texts, queries, args.repeats)
+
+    print(f"{'backend':<10} {'texts/s':>9} {'speedup':>8} {'query ms':>9} {'min cos':>8} {'mean cos':>9}")
+    print(f"{'torch':<10} {reference_throughput:>9.1f} {1.0:>8.2f} {reference_latency:>9.2f} "
+          f"{1.0:>8.4f} {1.0:>9.4f}")
+
+    parity_ok = True
+    for backend in args.backends:
+        if backend == "torch":
+            continue
+        model = get_embedding_model(backend, args.model, args.num_threads)
+        vectors, throughput, latency = benchmark_backend(
+            model, texts, queries, args.repeats)
+        similarities = cosine_similarities(reference, vectors)
+        print(f"{backend:<10} {throughput:>9.1f} {throughput / reference_throughput:>8.2f} "
+              f"{latency:>9.2f} {similarities.min():>8.4f} {similarities.mean():>9.4f}")
+        if similarities.min() < args.threshold:
+            logger.warning(
+                f"Backend {backend} below parity threshold: min cosine {similarities.min():.4f} < {args.threshold}")
+            parity_ok = False
+
+    sys.exit(0 if parity_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark de passage à l'échelle de l'index partitionné.
+
+Construit le même corpus avec 1, 2, 4 et 8 shards puis mesure, pour chaque
+configuration, la latence de recherche (p50/p95), le débit avec des requêtes
+concurrentes et le recouvrement du top-k avec l'index à un seul shard. Une
+latence réseau simulée par shard permet d'approcher le cas de workers distants.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from utils import load_documents
+from embedding import setup_vector_store, get_shards, search_by_vectors
+from sharding import ShardedVectorStore, LocalShard
+from evaluate import get_cached_embeddings, percentile
+from logger import logger
+from constants import (
+    DEFAULT_DATA_PATH, DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_BACKEND,
+    DEFAULT_EMBEDDING_CACHE_DIR, DEFAULT_RETRIEVER_TOP_K, DEFAULT_SHARD_TIMEOUT,
+    ENV_TOKENIZERS_PARALLELISM, ENV_TOKENIZERS_PARALLELISM_VALUE
+)
+
+# Éviter des problèmes avec les tokenizers HuggingFace
+os.environ[ENV_TOKENIZERS_PARALLELISM] = ENV_TOKENIZERS_PARALLELISM_VALUE
+
+
+class DelayedShard:
+    """Shard dont chaque recherche subit une latence fixe, pour simuler un worker distant."""
+
+    def __init__(self, shard, delay: float):
+        self.shard = shard
+        self.delay = delay
+
+    def query(self, query_vectors, k):
+        time.sleep(self.delay)
+        return self.shard.query(query_vectors, k)
+
+    def hydrate(self, chunk_ids):
+        return self.shard.hydrate(chunk_ids)
+
+    def count(self):
+        return self.shard.count()
+
+
+def measure(vector_store, query_vectors: List[List[float]], k: int, concurrency: int):
+    """
+    Mesure la latence d'une recherche isolée et le débit avec des recherches concurrentes.
+
+    Returns:
+        Tuple: (résultats par requête, latence p50 en ms, latence p95 en ms, requêtes/seconde)
+    """
+    # Préchauffage : chargement des index HNSW en mémoire
+    search_by_vectors(vector_store, query_vectors[:1], k)
+
+    results = []
+    latencies = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        results.append(search_by_vectors(vector_store, [vector], k)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda vector: search_by_vectors(vector_store, [vector], k),
+                          query_vectors))
+    throughput = len(query_vectors) / (time.perf_counter() - start)
+    return results, percentile(latencies, 50), percentile(latencies, 95), throughput
+
+
+def overlap(reference, candidate) -> float:
+    """Part moyenne des chunks du top-k de référence retrouvés dans le top-k candidat."""
+    ratios = []
+    for expected, actual in zip(reference, candidate):
+        expected_ids = {doc.id for doc in expected}
+        if expected_ids:
+            ratios.append(len(expected_ids & {doc.id for doc in actual}) / len(expected_ids))
+    return sum(ratios) / len(ratios) if ratios else 1.0
+
+
+def main():
+    """
+    Point d'entrée du benchmark : construit un index par nombre de shards et
+    compare latence, débit et recouvrement avec l'index non partitionné.
+    """
+    parser = argparse.ArgumentParser(
+        description='Scatter-gather scaling benchmark for the sharded vector index')
+    parser.add_argument('--data_path', type=str, default=DEFAULT_DATA_PATH,
+                        help='Path to the documents used as benchmark corpus')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Shard counts to benchmark')
+    parser.add_argument('--k', type=int, default=DEFAULT_RETRIEVER_TOP_K,
+                        help='Number of chunks retrieved per query')
+    parser.add_argument('--num_queries', type=int, default=200,
+                        help='Number of queries sampled from the corpus')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Concurrent searches for the throughput measure')
+    parser.add_argument('--shard_delay', type=float, default=0.0,
+                        help='Simulated per-shard network latency in milliseconds')
+    parser.add_argument('--shard_timeout', type=float, default=DEFAULT_SHARD_TIMEOUT,
+                        help='Seconds to wait for each shard')
+    parser.add_argument('--embedding_backend', type=str, default=DEFAULT_EMBEDDING_BACKEND,
+                        help='Embedding inference backend')
+    parser.add_argument('--embedding_cache', type=str, default=DEFAULT_EMBEDDING_CACHE_DIR,
+                        help='Directory of the on-disk embedding cache')
+    parser.add_argument('--work_dir', type=str, default=None,
+                        help='Directory for the temporary indexes (default: system temp dir)')
+    args = parser.parse_args()
+
+    documents = load_documents(args.data_path)
+    embedding_model = get_cached_embeddings(
+        DEFAULT_EMBEDDING_MODEL, args.embedding_cache, args.embedding_backend)
+    queries = [doc.page_content[:200] for doc in documents[:args.num_queries]]
+    query_vectors = [embedding_model.embed_query(query) for query in queries]
+    logger.info(f"Benchmarking {len(query_vectors)} queries on {len(documents)} documents")
+
+    print(f"{'shards':>6} {'chunks':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'qps':>8} {'overlap':>8}")
+    reference = None
+    for num_shards in args.shards:
+        persist_directory = tempfile.mkdtemp(prefix="shard_bench_", dir=args.work_dir)
+        try:
+            start = time.perf_counter()
+            vector_store = setup_vector_store(
+                documents, persist_directory, force_rebuild=True,
+                embedding_model=embedding_model,
+                num_shards=num_shards, shard_timeout=args.shard_timeout)
+            build_time = time.perf_counter() - start
+            if args.shard_delay:
+                # Même un index à un seul shard passe par un worker simulé
+                shards = [DelayedShard(shard, args.shard_delay / 1000) for shard in
+                          (vector_store.shards if num_shards > 1 else [LocalShard(vector_store)])]
+                vector_store = ShardedVectorStore(
+                    shards, embedding_model, shard_timeout=args.shard_timeout)
+            num_chunks = sum(shard.count() if hasattr(shard, "count") else shard._collection.count()
+                             for shard in get_shards(vector_store))
+
+            results, p50, p95, throughput = measure(
+                vector_store, query_vectors, args.k, args.concurrency)
+            if reference is None:
+                reference = results
+            print(f"{num_shards:>6} {num_chunks:>8} {build_time:>8.1f} {p50:>8.2f} {p95:>8.2f} "
+                  f"{throughput:>8.1f} {overlap(reference, results):>8.3f}")
+        finally:
+            shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
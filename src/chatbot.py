@@ -1,6 +1,9 @@
 import sys
 from typing import Dict, List, Any
-from logger import logger
+from logger import logger, request_logger
+from session import SessionStore
+from rag import build_query_with_history, generate_answer
+from embedding import get_chunk_id, get_documents_by_ids
 from constants import (
     DEFAULT_LM_STUDIO_URL, DEFAULT_MODEL_NAME, DEFAULT_TEMPERATURE,
     UI_WELCOME_MESSAGE, UI_GOODBYE_MESSAGE, UI_SOURCES_HEADER, UI_SOURCES_FOOTER
@@ -13,15 +16,21 @@ class ChatbotCLI:
     Gère les entrées utilisateur, les réponses et l'affichage des sources.
     """
 
-    def __init__(self, rag_chain):
+    def __init__(self, rag_chain, vector_store=None, session_store=None):
         """
         Initialise le chatbot CLI.
 
         Args:
             rag_chain: La chaîne RAG utilisée pour traiter les requêtes
+            vector_store: La base vectorielle, utilisée par la commande 'sources'
+            session_store: Stockage des sessions (un stockage dédié est créé si absent)
         """
         self.rag_chain = rag_chain
-        self.history = []  # Historique des conversations
+        self.vector_store = vector_store
+        # Historique des conversations, borné et compact
+        self.sessions = session_store or SessionStore(
+            max_sessions=1, ttl=float('inf'))
+        self.session_id = self.sessions.get_or_create().session_id
         logger.info("ChatbotCLI initialized")
 
     def start(self):
@@ -46,26 +55,33 @@ class ChatbotCLI:
                 logger.debug("User entered empty query")
                 continue
 
+            if user_input.lower() == "sources":
+                self._display_last_sources()
+                continue
+
             # Traitement de la requête via RAG
             try:
-                logger.info(f"Processing user query: {user_input}")
-                result = self.rag_chain.invoke({"query": user_input})
-
-                # Stockage de la réponse dans l'historique
-                self.history.append({"query": user_input, "response": result})
+                request_logger.info(f"Processing user query: {user_input}")
+                # Récupération avec la question seule, l'historique ne va que dans le prompt
+                source_docs = self.rag_chain.retriever.invoke(user_input)
+                logger.debug(f"Retrieved {len(source_docs)} source documents")
+                history = self.sessions.build_history(self.session_id)
+                answer = generate_answer(
+                    self.rag_chain, build_query_with_history(user_input, history), source_docs)
 
-                # Extraction et affichage de la réponse
-                answer = result.get("result", "No answer generated")
+                # Affichage de la réponse
                 # Garder print pour l'interface utilisateur
                 print("\nChatbot:", answer)
                 logger.debug(f"Generated answer: {answer[:100]}..." if len(
                     answer) > 100 else answer)
 
-                # Obtention des sources
-                source_docs = result.get("source_documents", [])
-                logger.debug(f"Retrieved {len(source_docs)} source documents")
                 self._display_sources(source_docs)
 
+                # Stockage de l'échange dans l'historique, sous forme compacte
+                self.sessions.add_turn(
+                    self.session_id, user_input, answer,
+                    [get_chunk_id(doc) for doc in source_docs])
+
             except Exception as e:
                 error_msg = f"Error processing your question: {str(e)}"
                 # Garder print pour l'interface utilisateur
@@ -74,6 +90,19 @@ class ChatbotCLI:
                 # Garder print pour l'interface utilisateur
                 print("Please try again with a different question.")
 
+    def _display_last_sources(self):
+        """Affiche les sources de la dernière réponse à partir des identifiants stockés."""
+        source_ids = self.sessions.get_last_source_ids(self.session_id)
+        if not source_ids:
+            # Garder print pour l'interface utilisateur
+            print("No sources available yet.")
+            return
+        if self.vector_store is None:
+            print(f"Source IDs: {', '.join(source_ids)}")
+            return
+        self._display_sources(
+            get_documents_by_ids(self.vector_store, source_ids))
+
     def _display_sources(self, sources: List[Any]):
         """
         Affiche les sources utilisées pour générer la réponse.
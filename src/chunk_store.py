@@ -0,0 +1,320 @@
+"""
+Stockage colonnaire compact des chunks.
+
+Les textes de tous les chunks sont concaténés dans un seul bloc avec un tableau
+d'offsets ; les métadonnées sont normalisées une seule fois à l'ingestion et
+rangées par clé (clés et chaînes internées) dans des colonnes typées. Les objets
+Document ne sont reconstruits qu'à la demande, pour les chunks finalement
+renvoyés par la recherche.
+"""
+import base64
+import json
+import os
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from logger import logger
+from constants import CHUNK_STORE_FILENAME
+
+_SIMPLE_TYPES = (str, int, float, bool)
+# Code de type des colonnes et valeur de remplissage des lignes sans valeur
+_ARRAY_TYPES = {"bool": ("b", False), "int": ("q", 0), "float": ("d", 0.0)}
+
+
+def normalize_metadata(metadata) -> Dict[str, Any]:
+    """
+    Convertit des métadonnées quelconques en dictionnaire de valeurs simples.
+
+    Les dictionnaires imbriqués sont aplatis avec des préfixes, les listes
+    encodées en JSON et les autres types convertis en chaîne ; les valeurs
+    None sont ignorées.
+
+    Args:
+        metadata: Métadonnées d'un document (dict, chaîne ou None)
+
+    Returns:
+        Dict[str, Any]: Métadonnées compatibles avec la base vectorielle
+    """
+    if metadata is None:
+        return {}
+    if isinstance(metadata, str):
+        return {"content": metadata}
+    if not isinstance(metadata, dict):
+        return {}
+
+    normalized = {}
+    for k, v in metadata.items():
+        if v is None:
+            continue
+        if isinstance(v, _SIMPLE_TYPES):
+            normalized[k] = v
+        elif isinstance(v, dict):
+            for sub_k, sub_v in v.items():
+                if isinstance(sub_v, _SIMPLE_TYPES):
+                    normalized[f"{k}_{sub_k}"] = sub_v
+        elif isinstance(v, (list, tuple)):
+            try:
+                normalized[k] = json.dumps(v)
+            except (TypeError, ValueError):
+                normalized[k] = str(v)
+        else:
+            normalized[k] = str(v)
+    return normalized
+
+
+def _kind_of(value) -> str:
+    # bool avant int : bool est une sous-classe de int
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return "str"
+
+
+class _Column:
+    """Valeurs d'une clé de métadonnées pour tous les chunks, avec masque de présence."""
+
+    __slots__ = ("kind", "values", "present")
+
+    def __init__(self, kind: str, size: int):
+        self.kind = kind
+        self.present = bytearray(size)
+        if kind in _ARRAY_TYPES:
+            typecode, fill = _ARRAY_TYPES[kind]
+            self.values = array(typecode, [fill]) * size
+        else:
+            self.values = [None] * size
+
+    def append(self, value):
+        if value is None:
+            self.present.append(0)
+            self.values.append(_ARRAY_TYPES[self.kind][1] if self.kind in _ARRAY_TYPES else None)
+            return
+        kind = _kind_of(value)
+        if kind != self.kind:
+            self._promote(kind)
+        if self.kind == "str":
+            value = sys.intern(value)
+        elif self.kind == "float":
+            value = float(value)
+        self.values.append(value)
+        self.present.append(1)
+
+    def _promote(self, kind: str):
+        # int + float -> float ; tout autre mélange -> colonne d'objets
+        if {self.kind, kind} == {"int", "float"}:
+            self.kind = "float"
+            self.values = array("d", self.values)
+        elif self.kind != "object":
+            self.kind = "object"
+            self.values = [v if p else None for v, p in zip(self.values, self.present)]
+
+    def get(self, i: int):
+        if not self.present[i]:
+            return None
+        value = self.values[i]
+        return bool(value) if self.kind == "bool" else value
+
+    def nbytes(self) -> int:
+        if self.kind in _ARRAY_TYPES:
+            values = self.values.buffer_info()[1] * self.values.itemsize
+        else:
+            # Les chaînes internées sont partagées : seul le tableau de références compte
+            values = sys.getsizeof(self.values)
+        return values + sys.getsizeof(self.present)
+
+
+class ChunkStore:
+    """
+    Chunks stockés en colonnes : un bloc de texte contigu, des offsets et des
+    colonnes de métadonnées typées.
+    """
+
+    def __init__(self):
+        self._blob = ""
+        self._pending = []
+        self._offsets = array("Q", [0])
+        self._ids = []
+        self._index = {}
+        self._keys = {}
+        self._columns = []
+        self._counters = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, chunk_id) -> bool:
+        return chunk_id in self._index
+
+    @property
+    def ids(self) -> List[str]:
+        """Identifiants des chunks, dans l'ordre d'ingestion."""
+        return self._ids
+
+    def add(self, text: str, metadata=None, chunk_id: Optional[str] = None) -> str:
+        """
+        Ajoute un chunk en normalisant ses métadonnées.
+
+        Sauf s'il est fourni, l'identifiant est de la forme "<id du document>-<n>"
+        ("chunk-<i>" pour les documents sans identifiant).
+
+        Args:
+            text: Contenu du chunk
+            metadata: Métadonnées brutes du chunk
+            chunk_id: Identifiant déjà attribué (ex: lors de la répartition en shards)
+
+        Returns:
+            str: Identifiant attribué au chunk
+        """
+        metadata = normalize_metadata(metadata)
+        metadata.pop("chunk_id", None)
+        position = len(self._ids)
+
+        if chunk_id is None:
+            source_id = metadata.get("id")
+            if source_id is None or source_id == "":
+                chunk_id = f"chunk-{position}"
+            else:
+                n = self._counters.get(source_id, 0)
+                self._counters[source_id] = n + 1
+                chunk_id = f"{source_id}-{n}"
+
+        text = text or ""
+        self._pending.append(text)
+        self._offsets.append(self._offsets[-1] + len(text))
+        self._ids.append(chunk_id)
+        self._index[chunk_id] = position
+
+        for key in metadata:
+            if key not in self._keys:
+                self._keys[sys.intern(key)] = len(self._columns)
+                self._columns.append(
+                    _Column(_kind_of(metadata[key]), position))
+        for key, column_index in self._keys.items():
+            self._columns[column_index].append(metadata.get(key))
+        return chunk_id
+
+    def _text_blob(self) -> str:
+        if self._pending:
+            self._blob += "".join(self._pending)
+            self._pending = []
+        return self._blob
+
+    def text(self, position: int) -> str:
+        """Retourne le texte du chunk à la position donnée."""
+        return self._text_blob()[self._offsets[position]:self._offsets[position + 1]]
+
+    def metadata(self, position: int) -> Dict[str, Any]:
+        """Reconstruit les métadonnées du chunk à la position donnée (avec `chunk_id`)."""
+        metadata = {}
+        for key, column_index in self._keys.items():
+            value = self._columns[column_index].get(position)
+            if value is not None:
+                metadata[key] = value
+        metadata["chunk_id"] = self._ids[position]
+        return metadata
+
+    def get(self, chunk_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Retourne (texte, métadonnées) d'un chunk, ou None s'il est inconnu."""
+        position = self._index.get(chunk_id)
+        if position is None:
+            return None
+        return self.text(position), self.metadata(position)
+
+    def records(self, start: int, end: int) -> Tuple[List[str], List[str]]:
+        """
+        Retourne les identifiants et textes d'une tranche de chunks, pour le
+        calcul des embeddings par lots. Les métadonnées restent dans ce stockage.
+        """
+        end = min(end, len(self._ids))
+        return self._ids[start:end], [self.text(i) for i in range(start, end)]
+
+    def hydrate(self, chunk_ids) -> List[Any]:
+        """
+        Construit les objets Document des chunks demandés.
+
+        Args:
+            chunk_ids: Identifiants des chunks, dans l'ordre souhaité
+
+        Returns:
+            List[Document]: Documents des chunks connus, dans l'ordre demandé
+        """
+        from langchain_core.documents import Document
+
+        documents = []
+        for chunk_id in chunk_ids:
+            record = self.get(chunk_id)
+            if record is not None:
+                documents.append(
+                    Document(page_content=record[0], metadata=record[1], id=chunk_id))
+        return documents
+
+    def memory_usage(self) -> int:
+        """Estime la mémoire occupée par le stockage, en octets."""
+        blob = self._text_blob()
+        offsets = self._offsets.buffer_info()[1] * self._offsets.itemsize
+        ids = sys.getsizeof(self._ids) + sum(sys.getsizeof(i) for i in self._ids)
+        index = sys.getsizeof(self._index)
+        columns = sum(column.nbytes() for column in self._columns)
+        return sys.getsizeof(blob) + offsets + ids + index + columns
+
+    def save(self, directory: str):
+        """Enregistre le stockage dans `directory`, à côté de la base vectorielle."""
+        os.makedirs(directory, exist_ok=True)
+        columns = {}
+        for key, column_index in self._keys.items():
+            column = self._columns[column_index]
+            columns[key] = {
+                "kind": column.kind,
+                "values": column.values.tolist() if column.kind in _ARRAY_TYPES else column.values,
+                "present": base64.b64encode(bytes(column.present)).decode("ascii"),
+            }
+        state = {
+            "version": 1,
+            "ids": self._ids,
+            "offsets": self._offsets.tolist(),
+            "text": self._text_blob(),
+            "columns": columns,
+        }
+        path = os.path.join(directory, CHUNK_STORE_FILENAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(temp_path, path)
+        logger.info(f"Saved chunk store with {len(self)} chunks to {path}")
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["ChunkStore"]:
+        """
+        Charge le stockage enregistré dans `directory`.
+
+        Returns:
+            Optional[ChunkStore]: Le stockage, ou None si la base a été créée sans
+            stockage de chunks
+        """
+        path = os.path.join(directory, CHUNK_STORE_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            state = json.load(file)
+
+        store = cls()
+        store._blob = state["text"]
+        store._offsets = array("Q", state["offsets"])
+        store._ids = state["ids"]
+        store._index = {chunk_id: i for i, chunk_id in enumerate(store._ids)}
+        for key, data in state["columns"].items():
+            column = _Column(data["kind"], 0)
+            column.present = bytearray(base64.b64decode(data["present"]))
+            if column.kind in _ARRAY_TYPES:
+                column.values = array(_ARRAY_TYPES[column.kind][0], data["values"])
+            elif column.kind == "str":
+                column.values = [sys.intern(v) if v is not None else None for v in data["values"]]
+            else:
+                column.values = data["values"]
+            store._keys[sys.intern(key)] = len(store._columns)
+            store._columns.append(column)
+        logger.info(f"Loaded chunk store with {len(store)} chunks from {path}")
+        return store
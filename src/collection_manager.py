@@ -0,0 +1,383 @@
+"""
+Collections nommées servies par l'API, ouvertes à la demande.
+
+Chaque collection est une base vectorielle indépendante : la collection
+"default" est stockée dans DB_PATH, les autres dans un sous-dossier de
+COLLECTIONS_PATH. Une collection n'est ouverte qu'à sa première utilisation,
+puis conservée en mémoire tant que le budget le permet ; au-delà, les
+collections les moins récemment utilisées sont fermées (LRU). Une
+reconstruction est écrite dans un dossier temporaire puis substituée à
+l'ancien une fois ses requêtes terminées : la collection servie n'est jamais
+réécrite sous les requêtes en cours. Une collection
+évincée n'est fermée qu'une fois terminées les requêtes qui l'utilisent
+(voir `acquire` / `release`). Plusieurs copies d'une même collection peuvent
+alors coexister (une évincée encore utilisée, une rouverte) : le registre
+compte les copies ouvertes par dossier pour ne libérer les ressources
+partagées par dossier (système chromadb) qu'à la fermeture de la dernière.
+Le modèle d'embedding et le re-ranker sont partagés par toutes les collections.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from logger import logger
+from constants import (
+    DEFAULT_COLLECTION, DEFAULT_COLLECTIONS_MEMORY_BUDGET_MB, HNSW_MEMORY_OVERHEAD
+)
+
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_MB = 1024 * 1024
+
+
+class UnknownCollection(Exception):
+    """Levée quand une collection demandée n'existe pas sur disque."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Unknown collection: {name}")
+        self.name = name
+
+
+def estimate_memory(vector_store, dimension: int) -> int:
+    """
+    Estime la mémoire occupée par une base vectorielle ouverte, en octets.
+
+    Compte les vecteurs float32 de chaque shard (avec le surcoût de l'index
+    HNSW) et son stockage de chunks.
+
+    Args:
+        vector_store: Chroma ou ShardedVectorStore
+        dimension: Dimension des embeddings
+    """
+    total = 0
+    for shard in getattr(vector_store, "shards", None) or [vector_store]:
+        # Un LocalShard enveloppe la collection Chroma du shard
+        store = getattr(shard, "vector_store", shard)
+        total += int(store._collection.count() * dimension * 4 * HNSW_MEMORY_OVERHEAD)
+        chunk_store = getattr(store, "chunk_store", None)
+        if chunk_store is not None:
+            total += chunk_store.memory_usage()
+    return total
+
+
+class Collection:
+    """Une collection ouverte : sa base vectorielle et la chaîne RAG construite dessus."""
+
+    def __init__(self, name: str, vector_store, rag_chain, memory: int = 0):
+        self.name = name
+        self.vector_store = vector_store
+        self.rag_chain = rag_chain
+        self.memory = memory
+        # Dossier d'où la collection a été ouverte, renseigné par le registre
+        self.path = None
+        self.last_used = time.monotonic()
+        # Requêtes en cours et état d'éviction, protégés par le verrou du registre
+        self.users = 0
+        self.retired = False
+        self.closed = False
+
+
+class CollectionManager:
+    """
+    Registre thread-safe des collections ouvertes, avec éviction LRU sous un
+    budget mémoire.
+    """
+
+    def __init__(self, default_path: str, collections_path: str,
+                 open_collection: Callable[[str, str, Optional[List[Any]]], Collection],
+                 memory_budget_mb: float = DEFAULT_COLLECTIONS_MEMORY_BUDGET_MB,
+                 close_collection: Optional[Callable[[Collection, bool], None]] = None):
+        """
+        Args:
+            default_path: Dossier de la collection "default"
+            collections_path: Dossier contenant un sous-dossier par collection nommée
+            open_collection: Fonction (nom, dossier, documents) qui ouvre la
+                collection existante si documents vaut None, ou la reconstruit
+                à partir des documents fournis
+            memory_budget_mb: Mémoire totale des collections ouvertes au-delà
+                de laquelle les moins récemment utilisées sont fermées
+            close_collection: Fonction (collection, dernière copie) qui libère les
+                ressources d'une collection évincée ou remplacée, appelée quand plus
+                aucune requête ne l'utilise ; le second argument indique qu'aucune
+                autre copie du même dossier n'est ouverte
+        """
+        self.default_path = default_path
+        self.collections_path = collections_path
+        self.open_collection = open_collection
+        self.close_collection = close_collection
+        self.memory_budget = int(memory_budget_mb * _MB)
+        self._loaded = OrderedDict()
+        self._load_locks = {}
+        # Copies ouvertes et verrou d'ouverture/fermeture, par dossier
+        self._copies = {}
+        self._directory_locks = {}
+        # Noms dont le dossier est en cours de remplacement par une reconstruction
+        self._swapping = set()
+        self._lock = threading.Lock()
+        # Signalé à chaque fin de requête, pour attendre qu'une collection ne soit plus utilisée
+        self._released = threading.Condition(self._lock)
+        self._stats = {"loads": 0, "builds": 0, "evictions": 0}
+
+    def path_for(self, name: str) -> str:
+        """
+        Retourne le dossier d'une collection.
+
+        Raises:
+            ValueError: Si le nom contient autre chose que lettres, chiffres, '-' et '_'
+        """
+        if not isinstance(name, str) or not _COLLECTION_NAME.match(name):
+            raise ValueError(
+                f"Invalid collection name: {name!r} "
+                f"(expected 1-64 letters, digits, '-' or '_')")
+        if name == DEFAULT_COLLECTION:
+            return self.default_path
+        return os.path.join(self.collections_path, name)
+
+    def exists(self, name: str) -> bool:
+        """Indique si la collection existe sur disque."""
+        return os.path.isdir(self.path_for(name))
+
+    def names(self) -> List[str]:
+        """Noms des collections disponibles sur disque."""
+        names = [DEFAULT_COLLECTION] if os.path.isdir(self.default_path) else []
+        if os.path.isdir(self.collections_path):
+            names.extend(sorted(
+                name for name in os.listdir(self.collections_path)
+                if name != DEFAULT_COLLECTION and _COLLECTION_NAME.match(name)
+                and os.path.isdir(os.path.join(self.collections_path, name))))
+        return names
+
+    def acquire(self, name: str = DEFAULT_COLLECTION) -> Collection:
+        """
+        Retourne une collection pour une requête, en l'ouvrant à sa première
+        utilisation. Chaque appel doit être suivi d'un appel à `release`.
+
+        Raises:
+            ValueError: Si le nom est invalide
+            UnknownCollection: Si la collection n'existe pas sur disque
+        """
+        path = self.path_for(name)
+        collection = self._touch(name)
+        if collection is not None:
+            return collection
+        if not os.path.isdir(path) and not self._is_swapping(name):
+            raise UnknownCollection(name)
+
+        # L'ouverture est faite hors du verrou global : une collection lente à
+        # charger ne bloque pas les requêtes sur les autres
+        with self._load_lock(name):
+            collection = self._touch(name)
+            if collection is not None:
+                return collection
+            if not os.path.isdir(path):
+                raise UnknownCollection(name)
+
+            start = time.perf_counter()
+            collection = self._open(name, path, None)
+            logger.info(
+                f"Opened collection '{name}' in {time.perf_counter() - start:.2f}s "
+                f"({collection.memory / _MB:.1f} MiB)")
+            self._register(collection, "loads", acquire=True)
+            return collection
+
+    def release(self, collection: Collection):
+        """Signale la fin d'une requête ; ferme la collection si elle a été évincée entre-temps."""
+        with self._lock:
+            collection.users -= 1
+            close = collection.retired and collection.users == 0
+            if collection.users == 0:
+                self._released.notify_all()
+        if close:
+            self._close(collection)
+
+    @contextmanager
+    def use(self, name: str = DEFAULT_COLLECTION):
+        """Contexte qui acquiert la collection et la libère en sortie."""
+        collection = self.acquire(name)
+        try:
+            yield collection
+        finally:
+            self.release(collection)
+
+    def build(self, name: str, documents: List[Any]) -> Collection:
+        """
+        Construit (ou reconstruit) une collection à partir de documents, sans
+        toucher aux autres collections.
+
+        La collection est construite dans un dossier temporaire pendant que
+        l'ancienne version continue de servir les requêtes. Les nouvelles
+        requêtes attendent ensuite la fin de celles en cours sur l'ancienne
+        version, qui est fermée et dont le dossier est remplacé.
+
+        Raises:
+            ValueError: Si le nom est invalide
+        """
+        path = self.path_for(name)
+        staging = f"{path}.staging-{uuid.uuid4().hex[:8]}"
+        start = time.perf_counter()
+        try:
+            # La copie de construction est fermée avant le déplacement de son dossier
+            self._close(self._open(name, staging, documents))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        with self._load_lock(name):
+            with self._lock:
+                self._swapping.add(name)
+                previous = self._loaded.pop(name, None)
+                if previous is not None:
+                    previous.retired = True
+                    while previous.users > 0:
+                        self._released.wait()
+            try:
+                if previous is not None:
+                    self._close(previous)
+                self._replace_directory(staging, path)
+            finally:
+                with self._lock:
+                    self._swapping.discard(name)
+
+            collection = self._open(name, path, None)
+            logger.info(
+                f"Built collection '{name}' with {len(documents)} documents in "
+                f"{time.perf_counter() - start:.2f}s ({collection.memory / _MB:.1f} MiB)")
+            self._register(collection, "builds")
+            return collection
+
+    def loaded(self) -> Dict[str, Collection]:
+        """Collections actuellement ouvertes, de la moins à la plus récemment utilisée."""
+        with self._lock:
+            return dict(self._loaded)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retourne l'état du registre.
+
+        Returns:
+            Dict[str, Any]: Budget et mémoire utilisée (MiB), collections ouvertes,
+            nombre d'ouvertures, de constructions et d'évictions
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "memory_budget_mb": round(self.memory_budget / _MB, 1),
+                "memory_used_mb": round(sum(c.memory for c in self._loaded.values()) / _MB, 1),
+                "loaded": {
+                    name: {"memory_mb": round(c.memory / _MB, 1),
+                           "idle_seconds": round(now - c.last_used, 1)}
+                    for name, c in self._loaded.items()
+                },
+                **self._stats,
+            }
+
+    def _is_swapping(self, name: str) -> bool:
+        with self._lock:
+            return name in self._swapping
+
+    @staticmethod
+    def _replace_directory(staging: str, path: str):
+        # L'ancien dossier est mis de côté puis supprimé : le remplacement est
+        # fait par deux renommages, sans recopier la nouvelle base
+        trash = None
+        if os.path.exists(path):
+            trash = f"{path}.old-{uuid.uuid4().hex[:8]}"
+            os.rename(path, trash)
+        os.rename(staging, path)
+        if trash is not None:
+            shutil.rmtree(trash, ignore_errors=True)
+
+    def _touch(self, name: str) -> Optional[Collection]:
+        with self._lock:
+            collection = self._loaded.get(name)
+            if collection is not None:
+                self._loaded.move_to_end(name)
+                collection.last_used = time.monotonic()
+                collection.users += 1
+            return collection
+
+    def _load_lock(self, name: str) -> threading.Lock:
+        # Appelé seulement pour une collection existante ou en construction :
+        # des noms inconnus ne font pas grossir le dictionnaire
+        with self._lock:
+            return self._load_locks.setdefault(name, threading.Lock())
+
+    def _directory_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._directory_locks.setdefault(path, threading.Lock())
+
+    def _open(self, name: str, path: str, documents: Optional[List[Any]]) -> Collection:
+        # Sous le verrou du dossier : aucune copie n'y est fermée pendant l'ouverture
+        with self._directory_lock(path):
+            collection = self.open_collection(name, path, documents)
+            collection.path = path
+            with self._lock:
+                self._copies[path] = self._copies.get(path, 0) + 1
+        return collection
+
+    def _register(self, collection: Collection, counter: str, acquire: bool = False):
+        with self._lock:
+            previous = self._loaded.get(collection.name)
+            self._loaded[collection.name] = collection
+            self._loaded.move_to_end(collection.name)
+            if acquire:
+                collection.users += 1
+            self._stats[counter] += 1
+            retired = self._evict(keep=collection.name)
+            if previous is not None and previous is not collection:
+                retired.append(self._retire(previous))
+        for old in retired:
+            if old is not None:
+                self._close(old)
+
+    def _retire(self, collection: Collection) -> Optional[Collection]:
+        # Appelé sous self._lock : retourne la collection si elle peut être fermée tout de suite
+        collection.retired = True
+        return collection if collection.users == 0 else None
+
+    def _close(self, collection: Collection):
+        with self._lock:
+            if collection.closed:
+                return
+            collection.closed = True
+        # Une copie du même dossier ne peut pas être ouverte pendant la fermeture
+        with self._directory_lock(collection.path):
+            with self._lock:
+                remaining = self._copies.get(collection.path, 1) - 1
+                if remaining > 0:
+                    self._copies[collection.path] = remaining
+                else:
+                    self._copies.pop(collection.path, None)
+            if self.close_collection is not None:
+                try:
+                    self.close_collection(collection, remaining <= 0)
+                except Exception as e:
+                    logger.warning(f"Failed to close collection '{collection.name}': {str(e)}")
+        logger.info(f"Closed collection '{collection.name}'")
+
+    def _evict(self, keep: str) -> List[Optional[Collection]]:
+        # Appelé sous self._lock. Les requêtes en cours gardent la collection
+        # évincée, qui n'est fermée qu'à la fin de la dernière (voir release).
+        retired = []
+        used = sum(c.memory for c in self._loaded.values())
+        for name in list(self._loaded):
+            if used <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            evicted = self._loaded.pop(name)
+            used -= evicted.memory
+            retired.append(self._retire(evicted))
+            self._stats["evictions"] += 1
+            logger.info(
+                f"Evicted idle collection '{name}' ({evicted.memory / _MB:.1f} MiB) "
+                f"to stay within the {self.memory_budget / _MB:.0f} MiB budget")
+        if used > self.memory_budget:
+            logger.warning(
+                f"Collection '{keep}' alone exceeds the memory budget "
+                f"({used / _MB:.1f} MiB > {self.memory_budget / _MB:.0f} MiB)")
+        return retired
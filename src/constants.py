@@ -15,16 +15,111 @@ ENV_TOKENIZERS_PARALLELISM_VALUE = "false"
 DEFAULT_CHUNK_SIZE = 512
 DEFAULT_CHUNK_OVERLAP = 0.2
 
+# Stockage des chunks et écriture dans la base vectorielle
+CHUNK_STORE_FILENAME = "chunk_store.json"
+DEFAULT_INGEST_BATCH_SIZE = 1024  # chunks embeddés et écrits par lot
+DEFAULT_INGEST_QUEUE_SIZE = 4  # lots en attente entre deux étapes de l'ingestion en flux
+DEFAULT_INGEST_REPORT_INTERVAL = 10.0  # secondes entre deux rapports de débit
+INGEST_CHECKPOINT_FILENAME = "ingest_checkpoint.json"
+
+# Index partitionné (shards)
+DEFAULT_NUM_SHARDS = 1
+DEFAULT_SHARD_TIMEOUT = 2.0  # secondes d'attente maximale d'un shard
+DEFAULT_SHARD_MAX_IN_FLIGHT = 16  # recherches simultanées par shard (et workers dédiés)
+SHARD_MANIFEST_FILENAME = "shards.json"
+
+# Collections nommées servies par l'API
+DEFAULT_COLLECTION = "default"  # collection stockée dans DB_PATH
+DEFAULT_COLLECTIONS_PATH = 'chroma_collections'  # un sous-dossier par collection nommée
+DEFAULT_COLLECTIONS_MEMORY_BUDGET_MB = 2048
+HNSW_MEMORY_OVERHEAD = 1.15  # mémoire de l'index HNSW rapportée à celle des vecteurs bruts (mesurée avec chromadb 1.5)
+
+# Élimination des doublons à l'ingestion
+DEFAULT_DEDUP_ENABLED = True
+DEFAULT_DEDUP_THRESHOLD = 0.9  # Similarité de Jaccard estimée des quasi-doublons
+DEFAULT_DEDUP_NUM_PERM = 128
+DEFAULT_DEDUP_BANDS = 16  # 16 bandes de 8 lignes : seuil LSH d'environ 0.7
+DEFAULT_DEDUP_SHINGLE_SIZE = 5  # mots
+
 # Configuration LLM
 DEFAULT_LM_STUDIO_URL = f"http://localhost:1234/v1"
 DEFAULT_MODEL_NAME = "mistral-7b-instruct-v0.3"
 DEFAULT_TEMPERATURE = 0.3
 
+# Pool de serveurs LLM (LM_STUDIO_URLS)
+LLM_ROUTING_POLICIES = ["least_outstanding", "ewma"]
+DEFAULT_LLM_ROUTING = "least_outstanding"
+DEFAULT_LLM_EJECT_AFTER = 3  # échecs consécutifs avant éjection
+DEFAULT_LLM_PROBE_INTERVAL = 10.0  # secondes entre deux health checks
+DEFAULT_LLM_HEDGE_AFTER = 0.0  # secondes avant une requête de couverture (0 = désactivé)
+DEFAULT_LLM_EWMA_ALPHA = 0.3
+
+# Contrôle d'admission devant le LLM
+DEFAULT_LLM_MAX_IN_FLIGHT = 2
+DEFAULT_LLM_MAX_QUEUE = 32
+DEFAULT_LLM_QUEUE_TIMEOUT = 30  # secondes
+DEFAULT_BATCH_QUEUE_TIMEOUT = 300  # secondes
+DEFAULT_RETRY_AFTER = 1  # secondes, valeur minimale de l'en-tête Retry-After
+WAIT_TIME_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60]
+
+# Échéances des requêtes
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+DEFAULT_REQUEST_DEADLINE = 30.0  # secondes
+MAX_REQUEST_DEADLINE = 120.0  # secondes
+DEFAULT_HEALTH_CHECK_TIMEOUT = 3.0  # secondes
+DEADLINE_RESPONSE_MARGIN = 0.1  # secondes réservées à la construction de la réponse
+DEFAULT_PREFLIGHT_WORKERS = 16
+
 # Configuration RAG
 DEFAULT_RETRIEVER_TOP_K = 3
 
+# Configuration du re-ranking (cross-encoder)
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_RERANK_CANDIDATES = 20
+DEFAULT_RERANK_BATCH_SIZE = 32
+DEFAULT_RERANK_CACHE_SIZE = 10000
+
+# Configuration du traitement par lots
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_BATCH_MAX_CONCURRENCY = 16
+DEFAULT_BATCH_MAX_QUERIES = 10000
+
+# Configuration des sessions de conversation
+DEFAULT_SESSION_MAX_SESSIONS = 1000
+DEFAULT_SESSION_TTL = 3600  # secondes
+DEFAULT_SESSION_MAX_TURNS = 10
+DEFAULT_HISTORY_TOKEN_BUDGET = 256
+DEFAULT_HISTORY_ANSWER_CHARS = 300
+CHARS_PER_TOKEN = 4  # Estimation grossière pour les modèles anglais/français
+
 # Paramètres pour les embeddings
 DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Backends : "torch" (PyTorch), "onnx" (ONNX Runtime float32), "onnx-int8" (quantification dynamique int8)
+EMBEDDING_BACKENDS = ["torch", "onnx", "onnx-int8"]
+DEFAULT_EMBEDDING_BACKEND = "torch"
+DEFAULT_EMBEDDING_THREADS = 0  # 0 = nombre de cœurs disponibles
+DEFAULT_EMBEDDING_BATCH_SIZE = 32
+DEFAULT_EMBEDDING_MAX_SEQ_LENGTH = 256
+DEFAULT_EMBEDDING_LENGTH_BUCKETS = [32, 64, 128, 256]
+DEFAULT_ONNX_CACHE_DIR = 'onnx_models'
+DEFAULT_PARITY_THRESHOLD = 0.99
+
+# Paramètres pour l'évaluation hors ligne de la récupération
+DEFAULT_EMBEDDING_CACHE_DIR = 'embedding_cache'
+DEFAULT_EVAL_QUERIES_PATH = 'eval_queries.jsonl'
+DEFAULT_EVAL_CHUNK_SIZES = [256, 512, 1024]
+DEFAULT_EVAL_CHUNK_OVERLAPS = [0.0, 0.2]
+DEFAULT_EVAL_TOP_KS = [1, 3, 5, 10]
+
+# Configuration de la journalisation
+DEFAULT_LOG_FORMAT = "text"  # "text" ou "json"
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+DEFAULT_LOG_ASYNC = False
+DEFAULT_LOG_QUEUE_SIZE = 10000
+DEFAULT_LOG_DROP_POLICY = "drop_new"  # "drop_new", "drop_old" ou "block"
+DEFAULT_LOG_BLOCK_TIMEOUT = 0.05  # secondes, pour la politique "block"
+DEFAULT_LOG_SAMPLING = ""  # ex: "chatbot_rag.request=0.1"
 
 # Messages utilisateur
 MSG_LOADING_DOCUMENTS = "Loading documents..."
@@ -0,0 +1,70 @@
+"""
+Échéances de bout en bout pour les requêtes.
+
+Une échéance est fixée à l'arrivée de la requête (en-tête ou configuration)
+puis propagée à chaque étape, qui borne son attente par le budget restant.
+"""
+import time
+from typing import Mapping, Optional
+from logger import logger
+from constants import DEADLINE_HEADER, DEFAULT_REQUEST_DEADLINE, MAX_REQUEST_DEADLINE
+
+
+class Deadline:
+    """Instant limite d'une requête, mesuré sur une horloge monotone."""
+
+    def __init__(self, budget: float):
+        """
+        Args:
+            budget: Temps alloué à la requête, en secondes
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str],
+                     default: float = DEFAULT_REQUEST_DEADLINE) -> "Deadline":
+        """
+        Crée l'échéance d'une requête à partir de l'en-tête X-Request-Deadline-Ms.
+
+        Une valeur absente ou invalide utilise le budget par défaut ; le budget
+        est plafonné à MAX_REQUEST_DEADLINE.
+
+        Args:
+            headers: En-têtes de la requête
+            default: Budget par défaut en secondes
+
+        Returns:
+            Deadline: L'échéance de la requête
+        """
+        budget = default
+        value = headers.get(DEADLINE_HEADER)
+        if value:
+            try:
+                budget = float(value) / 1000
+            except ValueError:
+                logger.warning(
+                    f"Ignoring invalid {DEADLINE_HEADER} header: {value}")
+        return cls(min(max(budget, 0.0), MAX_REQUEST_DEADLINE))
+
+    def remaining(self) -> float:
+        """Retourne le temps restant en secondes (0 si l'échéance est dépassée)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Indique si l'échéance est dépassée."""
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None, margin: float = 0.0) -> float:
+        """
+        Retourne le délai à accorder à une étape.
+
+        Args:
+            cap: Délai maximal propre à l'étape (ex: timeout d'un health check)
+            margin: Temps à réserver pour les étapes suivantes
+
+        Returns:
+            float: Délai en secondes, jamais négatif
+        """
+        remaining = max(0.0, self.remaining() - margin)
+        return remaining if cap is None else min(cap, remaining)
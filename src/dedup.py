@@ -0,0 +1,220 @@
+"""
+Élimination des doublons à l'ingestion.
+
+Les doublons exacts sont détectés par empreinte du texte normalisé, les
+quasi-doublons par MinHash sur des shingles de mots, indexés par LSH (bandes)
+puis confirmés par la similarité de Jaccard estimée. Le premier exemplaire
+rencontré est conservé ; les identifiants des exemplaires supprimés sont
+ajoutés à ses métadonnées : `duplicate_ids` pour les documents,
+`chunk_duplicate_ids` pour les chunks. Seuls les premiers désignent des
+documents entiers pouvant être considérés comme récupérés avec le document
+conservé.
+"""
+import copy
+import hashlib
+import json
+import random
+import re
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from logger import logger
+from constants import (
+    DEFAULT_DEDUP_THRESHOLD, DEFAULT_DEDUP_NUM_PERM, DEFAULT_DEDUP_BANDS,
+    DEFAULT_DEDUP_SHINGLE_SIZE
+)
+
+# Nombre premier de Mersenne (2^61 - 1) pour les permutations MinHash. Avec des
+# empreintes et des coefficients sur 32 bits, a * h + b tient dans un uint64.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = 1 << 32
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte pour la comparaison : minuscules et espaces compactés."""
+    return _WHITESPACE.sub(" ", text or "").strip().lower()
+
+
+def shingles(text: str, size: int = DEFAULT_DEDUP_SHINGLE_SIZE) -> set:
+    """
+    Découpe un texte normalisé en shingles de `size` mots consécutifs.
+
+    Un texte plus court que `size` mots forme un unique shingle.
+    """
+    words = text.split(" ")
+    if len(words) <= size:
+        return {text}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+class MinHasher:
+    """Calcule des signatures MinHash avec des permutations universelles déterministes."""
+
+    def __init__(self, num_perm: int = DEFAULT_DEDUP_NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        # Coefficients en colonne : une ligne par permutation
+        self._a = np.array([rng.randrange(1, _MAX_HASH) for _ in range(num_perm)],
+                           dtype=np.uint64)[:, None]
+        self._b = np.array([rng.randrange(0, _MAX_HASH) for _ in range(num_perm)],
+                           dtype=np.uint64)[:, None]
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        """Retourne la signature MinHash (num_perm entiers) d'un ensemble de shingles."""
+        hashes = np.fromiter((_hash32(s) for s in shingle_set), dtype=np.uint64,
+                             count=len(shingle_set))
+        # Matrice num_perm x shingles, réduite au minimum de chaque permutation
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+
+def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estime la similarité de Jaccard à partir de deux signatures MinHash."""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+def provenance_keys(label: str) -> Tuple[str, str]:
+    """
+    Retourne les clés de métadonnées (identifiants, nombre) des doublons
+    supprimés pour une nature d'éléments.
+
+    Les doublons de documents sont enregistrés sous `duplicate_ids`, ceux de
+    chunks sous `chunk_duplicate_ids` : un chunk supprimé ne signifie pas que
+    son document est couvert par le chunk conservé.
+    """
+    if label == "document":
+        return "duplicate_ids", "duplicate_count"
+    return f"{label}_duplicate_ids", f"{label}_duplicate_count"
+
+
+def get_duplicate_ids(metadata: Dict[str, Any], key: str = "duplicate_ids") -> List[str]:
+    """
+    Retourne les identifiants des doublons supprimés au profit d'un document.
+
+    Les métadonnées persistées dans Chroma contiennent la liste encodée en JSON.
+
+    Args:
+        metadata: Métadonnées du document ou du chunk conservé
+        key: Clé de provenance (par défaut les doublons de documents)
+    """
+    value = (metadata or {}).get(key)
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    return [str(v) for v in value]
+
+
+def _record_id(doc, index: int, label: str) -> str:
+    record_id = doc.metadata.get("id")
+    if record_id is None or record_id == "":
+        return f"{label}-{index}"
+    return str(record_id)
+
+
+def _merge_provenance(kept, dropped, dropped_id: str, label: str):
+    ids_key, count_key = provenance_keys(label)
+    duplicates = get_duplicate_ids(kept.metadata, ids_key)
+    for duplicate_id in [dropped_id] + get_duplicate_ids(dropped.metadata, ids_key):
+        if duplicate_id not in duplicates and duplicate_id != str(kept.metadata.get("id", "")):
+            duplicates.append(duplicate_id)
+    kept.metadata[ids_key] = duplicates
+    kept.metadata[count_key] = len(duplicates)
+
+
+def _own_copy(kept: List[Any], index: int, copied: set):
+    # Le document conservé est copié (avec ses métadonnées) avant d'y ajouter
+    # la provenance : les documents de l'appelant ne sont jamais modifiés
+    if index not in copied:
+        doc = copy.copy(kept[index])
+        doc.metadata = dict(doc.metadata)
+        kept[index] = doc
+        copied.add(index)
+    return kept[index]
+
+
+def deduplicate_documents(documents, threshold: float = DEFAULT_DEDUP_THRESHOLD,
+                          num_perm: int = DEFAULT_DEDUP_NUM_PERM,
+                          bands: int = DEFAULT_DEDUP_BANDS,
+                          shingle_size: int = DEFAULT_DEDUP_SHINGLE_SIZE,
+                          label: str = "document"):
+    """
+    Supprime les doublons exacts et les quasi-doublons d'une liste de documents.
+
+    Args:
+        documents: Documents ou chunks (objets avec `page_content` et `metadata`)
+        threshold: Similarité de Jaccard estimée à partir de laquelle deux textes
+            sont des quasi-doublons (0 ou None = doublons exacts uniquement)
+        num_perm: Nombre de permutations MinHash
+        bands: Nombre de bandes LSH (doit diviser num_perm)
+        shingle_size: Taille des shingles en mots
+        label: Nature des éléments ("document" ou "chunk"), pour les journaux
+            et les clés de provenance (voir `provenance_keys`)
+
+    Returns:
+        Tuple[List, Dict[str, int]]: Documents conservés, dans l'ordre d'origine
+        (copiés quand des doublons leur ont été rattachés), et statistiques
+        {"input", "exact", "near", "kept"}
+    """
+    if threshold and num_perm % bands != 0:
+        raise ValueError(
+            f"The number of LSH bands ({bands}) must divide num_perm ({num_perm})")
+
+    hasher = MinHasher(num_perm) if threshold else None
+    rows = num_perm // bands
+    by_hash = {}
+    buckets = [{} for _ in range(bands)] if threshold else []
+    signatures = []
+    kept = []
+    copied = set()
+    stats = {"input": len(documents), "exact": 0, "near": 0, "kept": 0}
+
+    for i, doc in enumerate(documents):
+        text = normalize_text(doc.page_content)
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+
+        # Doublon exact
+        original = by_hash.get(digest)
+        if original is not None:
+            _merge_provenance(_own_copy(kept, original, copied), doc,
+                              _record_id(doc, i, label), label)
+            stats["exact"] += 1
+            continue
+
+        # Quasi-doublon : candidats partageant au moins une bande, puis vérification
+        if hasher is not None:
+            signature = hasher.signature(shingles(text, shingle_size))
+            band_keys = [signature[b * rows:(b + 1) * rows].tobytes() for b in range(bands)]
+            candidates = set()
+            for bucket, key in zip(buckets, band_keys):
+                candidates.update(bucket.get(key, ()))
+            match = next((c for c in sorted(candidates)
+                          if estimated_jaccard(signature, signatures[c]) >= threshold), None)
+            if match is not None:
+                _merge_provenance(_own_copy(kept, match, copied), doc,
+                                  _record_id(doc, i, label), label)
+                stats["near"] += 1
+                continue
+            for bucket, key in zip(buckets, band_keys):
+                bucket.setdefault(key, []).append(len(kept))
+            signatures.append(signature)
+
+        by_hash[digest] = len(kept)
+        kept.append(doc)
+
+    stats["kept"] = len(kept)
+    dropped = stats["exact"] + stats["near"]
+    if dropped:
+        logger.info(
+            f"De-duplication dropped {dropped} of {stats['input']} {label}s "
+            f"({100 * dropped / stats['input']:.1f}%): {stats['exact']} exact, "
+            f"{stats['near']} near-duplicates (threshold: {threshold or 'exact only'})")
+    else:
+        logger.info(f"De-duplication found no duplicate among {stats['input']} {label}s")
+    return kept, stats
@@ -1,15 +1,82 @@
 import os
 import json
+from functools import lru_cache
+from typing import Any, Dict, List
+from langchain_core.retrievers import BaseRetriever
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from langchain_community.vectorstores.utils import filter_complex_metadata
+from dedup import deduplicate_documents
+from chunk_store import ChunkStore
+from sharding import ShardedVectorStore, LocalShard, partition_chunks
 from logger import logger
 from constants import (
     DEFAULT_EMBEDDING_MODEL, ENV_TOKENIZERS_PARALLELISM, ENV_TOKENIZERS_PARALLELISM_VALUE,
-    DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, DEFAULT_DB_PATH
+    DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, DEFAULT_DB_PATH, DEFAULT_RETRIEVER_TOP_K,
+    EMBEDDING_BACKENDS, DEFAULT_EMBEDDING_BACKEND, DEFAULT_EMBEDDING_THREADS,
+    DEFAULT_EMBEDDING_BATCH_SIZE, DEFAULT_EMBEDDING_LENGTH_BUCKETS,
+    DEFAULT_DEDUP_ENABLED, DEFAULT_DEDUP_THRESHOLD, DEFAULT_INGEST_BATCH_SIZE,
+    DEFAULT_NUM_SHARDS, DEFAULT_SHARD_TIMEOUT, SHARD_MANIFEST_FILENAME,
+    INGEST_CHECKPOINT_FILENAME
 )
 
 
+@lru_cache(maxsize=None)
+def get_embedding_model(backend=DEFAULT_EMBEDDING_BACKEND, model_name=DEFAULT_EMBEDDING_MODEL,
+                        num_threads=DEFAULT_EMBEDDING_THREADS,
+                        length_buckets=tuple(DEFAULT_EMBEDDING_LENGTH_BUCKETS)):
+    """
+    Crée le modèle d'embedding pour le backend demandé.
+
+    Une seule instance est créée par configuration et partagée par tous les appelants.
+
+    Args:
+        backend: "torch" (PyTorch), "onnx" (ONNX Runtime float32) ou "onnx-int8"
+        model_name: Nom du modèle sentence-transformers
+        num_threads: Nombre de threads d'inférence (0 = tous les cœurs)
+        length_buckets: Longueurs de padding des lots pour les backends ONNX
+
+    Returns:
+        Embeddings: Le modèle d'embedding
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unsupported embedding backend: {backend}. Expected one of {EMBEDDING_BACKENDS}")
+
+    logger.info(f"Loading embedding model {model_name} with backend: {backend}")
+    if backend == "torch":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            encode_kwargs={"batch_size": DEFAULT_EMBEDDING_BATCH_SIZE})
+
+    from onnx_embeddings import OnnxEmbeddings
+    return OnnxEmbeddings(
+        model_name=model_name,
+        quantize=(backend == "onnx-int8"),
+        num_threads=num_threads,
+        length_buckets=list(length_buckets) if length_buckets else None)
+
+
+def get_text_splitter(chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Crée le découpeur de texte utilisé pour produire les chunks.
+
+    Args:
+        chunk_size: Taille maximale d'un chunk en caractères
+        chunk_overlap: Chevauchement entre chunks, en fraction de chunk_size
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    overlap_tokens = int(chunk_size * chunk_overlap)
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap_tokens,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
 def split_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
     """
     Divise les documents en chunks avec un chevauchement spécifié.
@@ -35,14 +102,7 @@ def split_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFA
         return documents
 
     # Sinon, procéder au split
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    overlap_tokens = int(chunk_size * chunk_overlap)
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap_tokens,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    splitter = get_text_splitter(chunk_size, chunk_overlap)
 
     # Splitter les documents
     try:
@@ -57,34 +117,217 @@ def split_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFA
         return documents
 
 
+def get_chunk_id(doc):
+    """
+    Retourne l'identifiant d'un chunk renvoyé par la recherche.
+
+    Les bases créées avant l'ajout de `chunk_id` dans les métadonnées
+    utilisent l'identifiant attribué par Chroma.
+    """
+    return doc.metadata.get('chunk_id') or getattr(doc, 'id', None)
+
+
+def get_chunk_store(vector_store):
+    """
+    Retourne le stockage de chunks associé au vector store.
+
+    Les bases créées avant l'ajout du stockage de chunks n'en ont pas : les
+    textes et métadonnées sont alors lus dans Chroma.
+    """
+    return getattr(vector_store, 'chunk_store', None)
+
+
+def get_shards(vector_store):
+    """Retourne les shards d'un index partitionné (un seul élément sinon)."""
+    if isinstance(vector_store, ShardedVectorStore):
+        return vector_store.shards
+    return [vector_store]
+
+
+def close_vector_store(vector_store, release_system=True):
+    """
+    Libère les ressources d'une base vectorielle ouverte : clients chromadb de
+    chaque shard (index HNSW et connexion SQLite) et stockages de chunks.
+
+    Args:
+        vector_store: La base vectorielle à fermer
+        release_system: Arrêter le système chromadb partagé du dossier avec les
+            versions de chromadb sans compteur de références (à désactiver si
+            une autre base ouverte utilise le même dossier)
+    """
+    for shard in get_shards(vector_store):
+        store = getattr(shard, 'vector_store', shard)
+        close_chroma_client(store, release_system=release_system)
+        store.chunk_store = None
+    if isinstance(vector_store, ShardedVectorStore):
+        vector_store.close()
+
+
+def close_chroma_client(vector_store, release_system=True):
+    """
+    Ferme le client chromadb d'une collection Chroma.
+
+    chromadb partage un système (index HNSW chargés, connexion SQLite) entre
+    les clients d'un même dossier. Depuis chromadb 1.0, `Client.close()` ne
+    l'arrête qu'à la fermeture du dernier client ; les versions antérieures
+    n'ont pas de `close()` et le système est retiré du cache puis arrêté
+    directement si `release_system` est vrai.
+    """
+    client = getattr(vector_store, '_client', None)
+    if client is None:
+        return
+    if hasattr(client, 'close'):
+        client.close()
+    elif release_system:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        system = SharedSystemClient._identifier_to_system.pop(client._identifier, None)
+        if system is not None:
+            system.stop()
+
+
+def get_documents_by_ids(vector_store, chunk_ids):
+    """
+    Récupère des chunks par identifiant, sans recherche par similarité.
+
+    Args:
+        vector_store: La base de données vectorielle
+        chunk_ids: Identifiants des chunks à récupérer
+
+    Returns:
+        List[Document]: Chunks trouvés, dans l'ordre des identifiants demandés
+    """
+    from langchain_core.documents import Document
+
+    if not chunk_ids:
+        return []
+
+    if isinstance(vector_store, ShardedVectorStore):
+        return vector_store.get_by_ids(chunk_ids)
+
+    chunk_store = get_chunk_store(vector_store)
+    if chunk_store is not None:
+        return chunk_store.hydrate(chunk_ids)
+
+    results = vector_store.get(ids=list(chunk_ids))
+
+    by_id = {}
+    for chroma_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+        metadata = metadata or {}
+        by_id[metadata.get('chunk_id') or chroma_id] = Document(
+            page_content=content or '', metadata=metadata, id=chroma_id)
+    return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+
+def search_by_vectors(vector_store, query_vectors, k):
+    """
+    Recherche les k chunks les plus proches pour plusieurs requêtes en un seul appel.
+
+    Args:
+        vector_store: La base de données vectorielle
+        query_vectors: Embeddings des requêtes
+        k: Nombre de chunks à récupérer par requête
+
+    Returns:
+        List[List[Document]]: Chunks récupérés pour chaque requête, par similarité décroissante
+    """
+    from langchain_core.documents import Document
+
+    if not query_vectors:
+        return []
+
+    if isinstance(vector_store, ShardedVectorStore):
+        return vector_store.search_by_vectors(query_vectors, k)
+
+    # Avec un stockage de chunks, seuls les identifiants sont lus dans Chroma
+    chunk_store = get_chunk_store(vector_store)
+    if chunk_store is not None:
+        results = vector_store._collection.query(
+            query_embeddings=query_vectors,
+            n_results=k,
+            include=["distances"]
+        )
+        return [chunk_store.hydrate(ids) for ids in results['ids']]
+
+    # Chroma accepte plusieurs embeddings dans une même requête
+    results = vector_store._collection.query(
+        query_embeddings=query_vectors,
+        n_results=k,
+        include=["documents", "metadatas"]
+    )
+    return [
+        [Document(page_content=content or '', metadata=metadata or {}, id=chroma_id)
+         for chroma_id, content, metadata in zip(ids, contents, metadatas)]
+        for ids, contents, metadatas in zip(results['ids'], results['documents'], results['metadatas'])
+    ]
+
+
+class ChunkRetriever(BaseRetriever):
+    """
+    Retriever par similarité qui n'hydrate en Document que les chunks renvoyés.
+    """
+
+    vector_store: Any
+    search_kwargs: Dict[str, Any]
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Any]:
+        query_vector = self.vector_store.embeddings.embed_query(query)
+        return search_by_vectors(
+            self.vector_store, [query_vector], self.search_kwargs.get("k", DEFAULT_RETRIEVER_TOP_K))[0]
+
+
 def setup_vector_store(documents, persist_directory=DEFAULT_DB_PATH, force_rebuild=False,
-                       embedding_model_name=DEFAULT_EMBEDDING_MODEL):
+                       embedding_model_name=DEFAULT_EMBEDDING_MODEL,
+                       chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+                       embedding_model=None, embedding_backend=DEFAULT_EMBEDDING_BACKEND,
+                       dedup=DEFAULT_DEDUP_ENABLED, dedup_threshold=DEFAULT_DEDUP_THRESHOLD,
+                       num_shards=DEFAULT_NUM_SHARDS, shard_timeout=DEFAULT_SHARD_TIMEOUT):
     """
     Configure la base de données vectorielle avec les documents fournis.
+
+    Un modèle d'embedding déjà instancié peut être fourni via `embedding_model`
+    (par exemple un modèle avec cache pour l'évaluation), sinon il est créé
+    à partir de `embedding_model_name` avec le backend `embedding_backend`.
+
+    Si `dedup` est activé, les doublons exacts et les quasi-doublons (similarité
+    estimée >= `dedup_threshold`) sont supprimés avant et après le découpage.
+
+    Les chunks sont conservés dans un stockage colonnaire (voir chunk_store.py),
+    enregistré avec la base et attaché au vector store (`vector_store.chunk_store`) :
+    la recherche ne renvoie que des identifiants, hydratés en Document à la fin.
+
+    Avec `num_shards` > 1, les chunks sont répartis entre plusieurs collections
+    interrogées en parallèle (voir sharding.py) ; un shard qui ne répond pas en
+    `shard_timeout` secondes est ignoré.
     """
     # Importer Document depuis le bon module
     from langchain_core.documents import Document
-    from copy import deepcopy
 
     # Initialisation du modèle d'embedding
-    embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    if embedding_model is None:
+        embedding_model = get_embedding_model(
+            embedding_backend, embedding_model_name)
     logger.info(f"Using embedding model: {embedding_model_name}")
 
     # Vérification si la base vectorielle existe déjà
     if os.path.exists(persist_directory) and not force_rebuild:
-        logger.info(f"Loading existing vector store from {persist_directory}")
-        return Chroma(persist_directory=persist_directory, embedding_function=embedding_model)
+        vector_store = load_vector_store(
+            persist_directory, embedding_model, shard_timeout=shard_timeout)
+        if len(get_shards(vector_store)) != num_shards:
+            logger.warning(
+                f"Existing vector store has {len(get_shards(vector_store))} shards, "
+                f"rebuild it to use {num_shards}")
+        return vector_store
+
+    # Une construction en mémoire invalide le point de reprise d'une ingestion en flux
+    checkpoint_path = os.path.join(persist_directory, INGEST_CHECKPOINT_FILENAME)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
 
     # Vérification initiale des documents
     if not documents:
         raise ValueError("No documents provided for vector store creation")
 
-    # Log des types de documents reçus
-    doc_types = [type(doc) for doc in documents[:3]] if len(
-        documents) >= 3 else [type(doc) for doc in documents]
-    logger.info(f"Document types before processing: {doc_types}")
-
-    # Vérification et conversion des documents si nécessaire
+    # Conversion des entrées en Document, nécessaire au découpage
     validated_docs = []
     for i, doc in enumerate(documents):
         if isinstance(doc, str):
@@ -98,126 +341,142 @@ def setup_vector_store(documents, persist_directory=DEFAULT_DB_PATH, force_rebui
         raise ValueError(
             "No valid documents provided for vector store creation")
 
+    # Suppression des documents en double
+    if dedup:
+        validated_docs, _ = deduplicate_documents(
+            validated_docs, threshold=dedup_threshold, label="document")
+
     # Division des documents en chunks
     logger.info("Splitting documents into chunks...")
-    chunks = split_documents(validated_docs)
+    chunks = split_documents(
+        validated_docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
     if not chunks:
         logger.warning("No chunks created, using original documents")
         chunks = validated_docs
 
-    # Étape de validation supplémentaire pour s'assurer que tous les chunks sont des objets Document
-    logger.info("Validating chunks before metadata processing...")
-    validated_chunks = []
+    # Suppression des chunks en double (ex: passages de gabarit communs à plusieurs documents)
+    if dedup:
+        chunks, _ = deduplicate_documents(
+            chunks, threshold=dedup_threshold, label="chunk")
+
+    # Normalisation des métadonnées et stockage colonnaire en une seule passe
+    chunk_store = ChunkStore()
     for i, chunk in enumerate(chunks):
         if isinstance(chunk, str):
-            logger.info(f"Converting string chunk at index {i} to Document")
-            validated_chunks.append(Document(page_content=chunk, metadata={}))
+            chunk_store.add(chunk)
         elif hasattr(chunk, 'page_content'):
-            validated_chunks.append(chunk)
+            chunk_store.add(chunk.page_content, getattr(chunk, 'metadata', None))
         else:
             logger.warning(f"Invalid chunk at index {i}, type: {type(chunk)}")
-            try:
-                validated_chunks.append(
-                    Document(page_content=str(chunk), metadata={}))
-            except Exception as e:
-                logger.warning(
-                    f"Could not convert chunk to Document: {str(e)}")
+            chunk_store.add(str(chunk))
+    # Les objets Document intermédiaires ne sont plus nécessaires
+    del chunks, validated_docs
 
+    if not len(chunk_store):
+        raise ValueError(
+            "No valid documents after filtering metadata. Check document format.")
     logger.info(
-        f"Validated {len(validated_chunks)} chunks out of {len(chunks)} original chunks")
-    chunks = validated_chunks
-
-    def filter_complex_metadata_safely(metadata):
-        """
-        Version sécurisée de filter_complex_metadata qui gère proprement les chaînes et les None.
-        """
-        if metadata is None:
-            return {}
-
-        if isinstance(metadata, str):
-            # Si metadata est une chaîne, retourner un dictionnaire avec cette chaîne
-            return {"content": metadata}
-
-        if not isinstance(metadata, dict):
-            # Si ce n'est pas un dictionnaire, renvoyer un dictionnaire vide
-            return {}
-
-        # Pour les dictionnaires, nous devons nous assurer que toutes les valeurs sont des types simples
-        # Ne pas utiliser filter_complex_metadata qui cause des problèmes
-        filtered_metadata = {}
-        for k, v in metadata.items():
-            if isinstance(v, (str, int, float, bool, type(None))):
-                filtered_metadata[k] = v
-            elif isinstance(v, dict):
-                # Pour les dictionnaires imbriqués, aplatir avec des préfixes
-                for sub_k, sub_v in v.items():
-                    if isinstance(sub_v, (str, int, float, bool, type(None))):
-                        filtered_metadata[f"{k}_{sub_k}"] = sub_v
-            elif isinstance(v, (list, tuple)):
-                # Pour les listes, convertir en chaîne JSON si possible
-                try:
-                    filtered_metadata[k] = json.dumps(v)
-                except:
-                    filtered_metadata[k] = str(v)
-            else:
-                # Pour tout autre type, convertir en chaîne
-                filtered_metadata[k] = str(v)
-
-        return filtered_metadata
-
-    # Filtrage des métadonnées complexes
-    filtered_documents = []
-    for chunk in chunks:
-        # Créer un nouveau Document quoi qu'il arrive
-        if isinstance(chunk, str):
-            # Cas simple: c'est une chaîne
-            doc = Document(page_content=chunk, metadata={})
-        elif hasattr(chunk, 'page_content'):
-            # Cas normal: c'est un objet Document ou similaire
-            try:
-                # Extraire le contenu
-                content = chunk.page_content
-
-                # Récupérer et sécuriser les métadonnées
-                if hasattr(chunk, 'metadata'):
-                    # Ne pas utiliser deepcopy qui peut causer des problèmes
-                    metadata = filter_complex_metadata_safely(chunk.metadata)
-                else:
-                    metadata = {}
-
-                # Créer un nouveau Document propre
-                doc = Document(page_content=content, metadata=metadata)
-            except Exception as e:
-                # En cas d'erreur, créer un Document avec le contenu disponible
-                logger.warning(
-                    f"Error processing document attributes: {str(e)}")
-                if hasattr(chunk, 'page_content'):
-                    doc = Document(
-                        page_content=chunk.page_content, metadata={})
-                else:
-                    doc = Document(page_content=str(chunk), metadata={})
-        else:
-            # Cas exceptionnel: c'est un objet inconnu
-            doc = Document(page_content=str(chunk), metadata={})
+        f"Chunk store holds {len(chunk_store)} chunks in {chunk_store.memory_usage() / 1024:.0f} KiB "
+        f"({chunk_store.memory_usage() / len(chunk_store):.0f} bytes per chunk)")
 
-        # Ajouter le document à la liste filtrée
-        filtered_documents.append(doc)
+    if num_shards > 1:
+        logger.info(
+            f"Partitioning {len(chunk_store)} chunks across {num_shards} shards in {persist_directory}...")
+        shard_stores = partition_chunks(chunk_store, num_shards)
+        del chunk_store
+        shards = [LocalShard(write_vector_store(shard_store, shard_directory(persist_directory, i),
+                                                embedding_model))
+                  for i, shard_store in enumerate(shard_stores)]
+        write_shard_manifest(persist_directory, num_shards)
+        return ShardedVectorStore(shards, embedding_model, shard_timeout=shard_timeout)
+
+    vector_store = write_vector_store(
+        chunk_store, persist_directory, embedding_model)
+    # Une base non partitionnée remplace un éventuel index partitionné précédent
+    manifest_path = os.path.join(persist_directory, SHARD_MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    return vector_store
 
-    # Vérifier qu'il reste des documents après filtrage
-    if not filtered_documents:
-        raise ValueError(
-            "No valid documents after filtering metadata. Check document format.")
 
-    # Créer et persister la base vectorielle
+def write_vector_store(chunk_store, persist_directory, embedding_model):
+    """
+    Calcule les embeddings des chunks et les écrit dans une collection Chroma vide.
+
+    Args:
+        chunk_store: Stockage des chunks à indexer
+        persist_directory: Répertoire de la collection
+        embedding_model: Modèle d'embedding
+
+    Returns:
+        Chroma: La base vectorielle, avec son stockage de chunks attaché
+    """
+    # Créer la base vectorielle, en repartant d'une collection vide lors d'une reconstruction
     logger.info(
-        f"Creating new vector store with {len(filtered_documents)} documents in {persist_directory}...")
-    vector_store = Chroma.from_documents(
-        documents=filtered_documents,
-        embedding=embedding_model,
-        persist_directory=persist_directory
-    )
+        f"Creating new vector store with {len(chunk_store)} documents in {persist_directory}...")
+    vector_store = Chroma(persist_directory=persist_directory,
+                          embedding_function=embedding_model)
+    if vector_store._collection.count():
+        vector_store.delete_collection()
+        # Le client abandonné garderait le système chromadb du dossier en vie ;
+        # avec chromadb < 1.0, le système reste partagé avec la base encore servie
+        close_chroma_client(vector_store, release_system=False)
+        vector_store = Chroma(persist_directory=persist_directory,
+                              embedding_function=embedding_model)
+
+    # Écriture par lots des seuls identifiants et embeddings : textes et
+    # métadonnées sont servis par le stockage de chunks, pas dupliqués dans Chroma
+    for start in range(0, len(chunk_store), DEFAULT_INGEST_BATCH_SIZE):
+        ids, texts = chunk_store.records(start, start + DEFAULT_INGEST_BATCH_SIZE)
+        vector_store._collection.add(
+            ids=ids, embeddings=embedding_model.embed_documents(texts))
+
+    chunk_store.save(persist_directory)
+    vector_store.chunk_store = chunk_store
 
     logger.info(
-        f"Vector store created successfully with {len(filtered_documents)} embeddings")
+        f"Vector store created successfully with {len(chunk_store)} embeddings")
+    return vector_store
+
+
+def shard_directory(persist_directory, index):
+    """Retourne le répertoire du shard `index` d'un index partitionné."""
+    return os.path.join(persist_directory, f"shard-{index}")
+
+
+def write_shard_manifest(persist_directory, num_shards):
+    """Enregistre le nombre de shards d'un index partitionné."""
+    with open(os.path.join(persist_directory, SHARD_MANIFEST_FILENAME), 'w', encoding='utf-8') as file:
+        json.dump({"num_shards": num_shards}, file)
+
+
+def load_vector_store(persist_directory, embedding_model, shard_timeout=DEFAULT_SHARD_TIMEOUT):
+    """
+    Ouvre une base vectorielle existante, partitionnée ou non.
+
+    Returns:
+        Chroma ou ShardedVectorStore: La base vectorielle
+    """
+    manifest_path = os.path.join(persist_directory, SHARD_MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            num_shards = json.load(file)["num_shards"]
+        logger.info(
+            f"Loading sharded vector store ({num_shards} shards) from {persist_directory}")
+        shards = []
+        for i in range(num_shards):
+            directory = shard_directory(persist_directory, i)
+            vector_store = Chroma(
+                persist_directory=directory, embedding_function=embedding_model)
+            vector_store.chunk_store = ChunkStore.load(directory)
+            if vector_store.chunk_store is None:
+                raise ValueError(f"Missing chunk store for shard {i} in {directory}")
+            shards.append(LocalShard(vector_store))
+        return ShardedVectorStore(shards, embedding_model, shard_timeout=shard_timeout)
+
+    logger.info(f"Loading existing vector store from {persist_directory}")
+    vector_store = Chroma(
+        persist_directory=persist_directory, embedding_function=embedding_model)
+    vector_store.chunk_store = ChunkStore.load(persist_directory)
     return vector_store
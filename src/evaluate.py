@@ -0,0 +1,329 @@
+"""
+Évaluation hors ligne de la qualité de la récupération.
+
+Balaye plusieurs configurations de découpage (taille et chevauchement des chunks)
+et de récupération (top-k) sur un jeu de requêtes annotées, et rapporte pour
+chacune le recall@k, le MRR, la taille de l'index, le temps de construction et
+la latence de recherche. Aucun LLM n'est nécessaire.
+
+Format du jeu de requêtes (JSONL), une requête par ligne :
+    {"query": "Qu'est-ce que le RAG ?", "relevant_ids": ["2"]}
+"""
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Any
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from utils import load_documents
+from embedding import setup_vector_store, get_embedding_model, search_by_vectors
+from dedup import get_duplicate_ids
+from rerank import CrossEncoderReranker
+from logger import logger
+from constants import (
+    DEFAULT_DATA_PATH, DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_CACHE_DIR,
+    EMBEDDING_BACKENDS, DEFAULT_EMBEDDING_BACKEND,
+    DEFAULT_EVAL_QUERIES_PATH, DEFAULT_EVAL_CHUNK_SIZES,
+    DEFAULT_EVAL_CHUNK_OVERLAPS, DEFAULT_EVAL_TOP_KS, DEFAULT_RERANK_MODEL,
+    ENV_TOKENIZERS_PARALLELISM, ENV_TOKENIZERS_PARALLELISM_VALUE
+)
+
+# Éviter des problèmes avec les tokenizers HuggingFace
+os.environ[ENV_TOKENIZERS_PARALLELISM] = ENV_TOKENIZERS_PARALLELISM_VALUE
+
+
+def load_labelled_queries(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Charge le jeu de requêtes annotées depuis un fichier JSON Lines.
+
+    Args:
+        file_path: Chemin vers le fichier de requêtes
+
+    Returns:
+        List[Dict[str, Any]]: Requêtes avec leurs identifiants de documents pertinents
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        logger.error(f"File not found: {file_path}")
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    queries = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip() or line.strip().startswith('//'):
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(
+                    f"Skipping invalid JSON line {line_number} in {file_path}")
+                continue
+
+            query = data.get('query', '')
+            relevant_ids = [str(doc_id)
+                            for doc_id in data.get('relevant_ids', [])]
+            if not query or not relevant_ids:
+                logger.warning(
+                    f"Skipping line {line_number} in {file_path}: 'query' and 'relevant_ids' are required")
+                continue
+            queries.append({"query": query, "relevant_ids": relevant_ids})
+
+    logger.info(f"Loaded {len(queries)} labelled queries from {file_path}")
+    return queries
+
+
+def get_cached_embeddings(model_name=DEFAULT_EMBEDDING_MODEL, cache_dir=DEFAULT_EMBEDDING_CACHE_DIR,
+                          backend=DEFAULT_EMBEDDING_BACKEND):
+    """
+    Crée un modèle d'embedding dont les vecteurs sont mis en cache sur disque.
+
+    Les embeddings des chunks et des requêtes sont réutilisés d'une configuration
+    à l'autre et d'une exécution à l'autre : seul un texte jamais vu est encodé.
+
+    Args:
+        model_name: Nom du modèle sentence-transformers
+        cache_dir: Répertoire du cache d'embeddings
+        backend: Backend d'inférence (les vecteurs sont mis en cache séparément par backend)
+
+    Returns:
+        CacheBackedEmbeddings: Modèle d'embedding avec cache
+    """
+    underlying = get_embedding_model(backend, model_name)
+    store = LocalFileStore(cache_dir)
+    logger.info(f"Embedding cache location: {cache_dir}")
+    return CacheBackedEmbeddings.from_bytes_store(
+        underlying,
+        store,
+        namespace=f"{backend}/{model_name}",
+        query_embedding_cache=True
+    )
+
+
+def directory_size(path: str) -> int:
+    """Retourne la taille totale en octets des fichiers d'un répertoire."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Retourne le percentile `q` (entre 0 et 100) d'une liste de valeurs."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def retrieved_document_ids(results) -> List[str]:
+    """
+    Convertit une liste de chunks récupérés en identifiants de documents uniques,
+    dans l'ordre de rang.
+
+    Les doublons supprimés à l'ingestion comptent comme récupérés avec le
+    document conservé à leur place.
+    """
+    doc_ids = []
+    for doc in results:
+        for doc_id in [str(doc.metadata.get('id', ''))] + get_duplicate_ids(doc.metadata):
+            if doc_id and doc_id not in doc_ids:
+                doc_ids.append(doc_id)
+    return doc_ids
+
+
+def score_query(doc_ids: List[str], relevant_ids: List[str]) -> Dict[str, float]:
+    """
+    Calcule le recall et le reciprocal rank d'une requête.
+
+    Args:
+        doc_ids: Identifiants des documents récupérés, dans l'ordre de rang
+        relevant_ids: Identifiants des documents pertinents
+
+    Returns:
+        Dict[str, float]: {"recall": ..., "reciprocal_rank": ...}
+    """
+    relevant = set(relevant_ids)
+    hits = [doc_id for doc_id in doc_ids if doc_id in relevant]
+    reciprocal_rank = 0.0
+    for rank, doc_id in enumerate(doc_ids, 1):
+        if doc_id in relevant:
+            reciprocal_rank = 1.0 / rank
+            break
+    return {"recall": len(hits) / len(relevant), "reciprocal_rank": reciprocal_rank}
+
+
+def evaluate_configuration(documents, queries, embedding_model, chunk_size, chunk_overlap,
+                           top_ks, work_dir, reranker=None, rerank_candidates=0) -> List[Dict[str, Any]]:
+    """
+    Construit un index pour une configuration de découpage et l'évalue pour chaque top-k.
+
+    La latence rapportée est celle de la recherche vectorielle (et du re-ranking
+    s'il est activé) : les embeddings des requêtes sont calculés (ou lus du
+    cache) avant la mesure, car ils ne dépendent pas de la configuration évaluée.
+
+    Returns:
+        List[Dict[str, Any]]: Une ligne de résultats par valeur de top-k
+    """
+    persist_directory = tempfile.mkdtemp(prefix="eval_index_", dir=work_dir)
+    try:
+        start = time.perf_counter()
+        vector_store = setup_vector_store(
+            documents, persist_directory, force_rebuild=True,
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            embedding_model=embedding_model)
+        build_time = time.perf_counter() - start
+        index_size = directory_size(persist_directory)
+        num_chunks = vector_store._collection.count()
+
+        query_vectors = [embedding_model.embed_query(item["query"])
+                         for item in queries]
+
+        rows = []
+        for k in top_ks:
+            latencies = []
+            recalls = []
+            reciprocal_ranks = []
+            for item, vector in zip(queries, query_vectors):
+                start = time.perf_counter()
+                if reranker is not None:
+                    candidates = search_by_vectors(
+                        vector_store, [vector], max(rerank_candidates, k))[0]
+                    results = reranker.rerank_batch(
+                        [item["query"]], [candidates], top_n=k)[0]
+                else:
+                    results = search_by_vectors(vector_store, [vector], k)[0]
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                scores = score_query(
+                    retrieved_document_ids(results), item["relevant_ids"])
+                recalls.append(scores["recall"])
+                reciprocal_ranks.append(scores["reciprocal_rank"])
+
+            rows.append({
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "rerank_candidates": rerank_candidates if reranker is not None else 0,
+                "top_k": k,
+                "recall_at_k": sum(recalls) / len(recalls),
+                "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+                "num_chunks": num_chunks,
+                "index_size_bytes": index_size,
+                "build_time_s": build_time,
+                "latency_p50_ms": percentile(latencies, 50),
+                "latency_p95_ms": percentile(latencies, 95),
+            })
+        return rows
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+def run_sweep(documents, queries, embedding_model, chunk_sizes, chunk_overlaps, top_ks,
+              work_dir=None, reranker=None, rerank_candidates=0) -> List[Dict[str, Any]]:
+    """
+    Évalue toutes les combinaisons de taille de chunk, de chevauchement et de top-k.
+
+    Returns:
+        List[Dict[str, Any]]: Résultats de toutes les configurations
+    """
+    results = []
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in chunk_overlaps:
+            logger.info(
+                f"Evaluating chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
+            results.extend(evaluate_configuration(
+                documents, queries, embedding_model, chunk_size, chunk_overlap,
+                top_ks, work_dir, reranker, rerank_candidates))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    """Affiche les résultats du balayage sous forme de tableau."""
+    header = (f"{'chunk':>6} {'overlap':>8} {'k':>4} {'recall@k':>9} {'MRR':>6} "
+              f"{'chunks':>7} {'index KB':>9} {'build s':>8} {'p50 ms':>7} {'p95 ms':>7}")
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['chunk_size']:>6} {row['chunk_overlap']:>8.2f} {row['top_k']:>4} "
+              f"{row['recall_at_k']:>9.3f} {row['mrr']:>6.3f} {row['num_chunks']:>7} "
+              f"{row['index_size_bytes'] / 1024:>9.1f} {row['build_time_s']:>8.2f} "
+              f"{row['latency_p50_ms']:>7.2f} {row['latency_p95_ms']:>7.2f}")
+
+
+def write_results(results: List[Dict[str, Any]], output_path: str):
+    """Écrit les résultats au format CSV pour tracer les courbes qualité/latence."""
+    if not results:
+        return
+    with open(output_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info(f"Evaluation results written to {output_path}")
+
+
+def main():
+    """
+    Point d'entrée de l'évaluation hors ligne.
+    Charge le corpus et les requêtes annotées, balaye les configurations et affiche les résultats.
+    """
+    parser = argparse.ArgumentParser(
+        description='Offline retrieval evaluation (recall@k, MRR, latency)')
+    parser.add_argument('--data_path', type=str, default=DEFAULT_DATA_PATH,
+                        help='Path to the documents to index')
+    parser.add_argument('--queries_path', type=str, default=DEFAULT_EVAL_QUERIES_PATH,
+                        help='Path to the labelled queries (JSONL with query and relevant_ids)')
+    parser.add_argument('--chunk_sizes', type=int, nargs='+', default=DEFAULT_EVAL_CHUNK_SIZES,
+                        help='Chunk sizes to evaluate')
+    parser.add_argument('--chunk_overlaps', type=float, nargs='+', default=DEFAULT_EVAL_CHUNK_OVERLAPS,
+                        help='Chunk overlap ratios to evaluate')
+    parser.add_argument('--top_ks', type=int, nargs='+', default=DEFAULT_EVAL_TOP_KS,
+                        help='Retriever top-k values to evaluate')
+    parser.add_argument('--rerank_candidates', type=int, default=0,
+                        help='Re-rank this many candidates with a cross-encoder (0 disables re-ranking)')
+    parser.add_argument('--rerank_model', type=str, default=DEFAULT_RERANK_MODEL,
+                        help='Cross-encoder model used for re-ranking')
+    parser.add_argument('--embedding_backend', type=str, default=DEFAULT_EMBEDDING_BACKEND,
+                        choices=EMBEDDING_BACKENDS, help='Embedding inference backend')
+    parser.add_argument('--embedding_cache', type=str, default=DEFAULT_EMBEDDING_CACHE_DIR,
+                        help='Directory used to cache embeddings across runs')
+    parser.add_argument('--work_dir', type=str, default=None,
+                        help='Directory for temporary indexes (default: system temp dir)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Optional CSV file to write the results to')
+    args = parser.parse_args()
+
+    documents = load_documents(args.data_path)
+    queries = load_labelled_queries(args.queries_path)
+    if not queries:
+        raise ValueError(f"No labelled queries found in {args.queries_path}")
+
+    embedding_model = get_cached_embeddings(
+        cache_dir=args.embedding_cache, backend=args.embedding_backend)
+
+    # Pas de cache de scores : la latence mesurée est celle du cross-encoder
+    reranker = None
+    if args.rerank_candidates > 0:
+        reranker = CrossEncoderReranker(
+            model_name=args.rerank_model, cache_size=0)
+
+    results = run_sweep(documents, queries, embedding_model,
+                        args.chunk_sizes, args.chunk_overlaps, args.top_ks,
+                        work_dir=args.work_dir, reranker=reranker,
+                        rerank_candidates=args.rerank_candidates)
+    print_results(results)
+    if reranker is not None:
+        stats = reranker.get_stats()
+        print(f"\nRe-ranking: {stats['scored']} candidates scored, "
+              f"{stats['ms_per_candidate']:.2f} ms/candidate")
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
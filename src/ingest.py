@@ -0,0 +1,451 @@
+"""
+Ingestion en flux des corpus plus grands que la mémoire.
+
+Le corpus est lu ligne à ligne et traverse cinq étapes exécutées en parallèle
+(lecture → découpage → normalisation → embedding → écriture), reliées par des
+files bornées : la mémoire utilisée ne dépend que de la taille des files, pas
+de celle du corpus. Chaque lot écrit dans Chroma est suivi d'un point de
+reprise (offset dans le fichier source) : une construction interrompue reprend
+au dernier lot validé. Un document republié (même `id`) remplace ses chunks
+précédents, y compris ceux de numéro supérieur à son nouveau nombre de
+chunks. Le débit et le taux d'occupation de chaque étape sont journalisés
+périodiquement pour identifier le goulot d'étranglement.
+"""
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_chroma import Chroma
+from chunk_store import normalize_metadata
+from embedding import get_text_splitter
+from utils import parse_document_line
+from logger import logger
+from constants import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, DEFAULT_INGEST_BATCH_SIZE,
+    DEFAULT_INGEST_QUEUE_SIZE, DEFAULT_INGEST_REPORT_INTERVAL,
+    INGEST_CHECKPOINT_FILENAME, CHUNK_STORE_FILENAME, SHARD_MANIFEST_FILENAME
+)
+
+# Marqueur de fin de flux transmis d'une étape à la suivante
+_DONE = object()
+_FINGERPRINT_BYTES = 64 * 1024
+
+
+class _Batch:
+    __slots__ = ("ids", "texts", "metadatas", "embeddings", "offset", "documents",
+                 "position", "chunk_counts", "_records")
+
+    def __init__(self):
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.embeddings = None
+        self.offset = 0
+        self.documents = 0
+        # Numéro du prochain chunk sans identifiant de document, après ce lot
+        self.position = 0
+        # Nombre de chunks de chaque document du lot, pour supprimer les anciens chunks
+        self.chunk_counts = {}
+        self._records = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add_document(self, source_id, records):
+        """
+        Ajoute les chunks (identifiant, texte, métadonnées) d'un document.
+
+        Un document déjà présent dans le lot est remplacé en entier (le dernier
+        l'emporte) : le lot ne contient jamais deux fois le même identifiant.
+        """
+        if source_id is not None:
+            for n in range(self.chunk_counts.pop(source_id, 0)):
+                self._records.pop(f"{source_id}-{n}", None)
+            self.chunk_counts[source_id] = len(records)
+        for chunk_id, text, metadata in records:
+            self._records.pop(chunk_id, None)
+            self._records[chunk_id] = (text, metadata)
+
+    def seal(self):
+        """Fige les listes ids / texts / metadatas envoyées aux étapes suivantes."""
+        self.ids = list(self._records)
+        self.texts = [text for text, _ in self._records.values()]
+        self.metadatas = [metadata for _, metadata in self._records.values()]
+        self._records = {}
+
+
+class _StageStats:
+    """Compteurs d'une étape : éléments traités et temps de traitement (hors attente)."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+
+
+def source_fingerprint(file_path: str) -> str:
+    """Empreinte du début du fichier source, pour vérifier qu'un point de reprise le concerne."""
+    with open(file_path, 'rb') as file:
+        return hashlib.sha1(file.read(_FINGERPRINT_BYTES)).hexdigest()
+
+
+def load_checkpoint(persist_directory: str) -> Optional[Dict[str, Any]]:
+    """Charge le point de reprise de l'ingestion, ou None s'il n'existe pas."""
+    path = os.path.join(persist_directory, INGEST_CHECKPOINT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_checkpoint(persist_directory: str, state: Dict[str, Any]):
+    """Enregistre le point de reprise de façon atomique."""
+    path = os.path.join(persist_directory, INGEST_CHECKPOINT_FILENAME)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(temp_path, path)
+
+
+class IngestionPipeline:
+    """
+    Construit une base vectorielle à partir d'un fichier JSONL, en flux et avec reprise.
+    """
+
+    def __init__(self, data_path: str, persist_directory: str, embedding_model,
+                 embedding_name: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 chunk_overlap: float = DEFAULT_CHUNK_OVERLAP,
+                 batch_size: int = DEFAULT_INGEST_BATCH_SIZE,
+                 queue_size: int = DEFAULT_INGEST_QUEUE_SIZE,
+                 report_interval: float = DEFAULT_INGEST_REPORT_INTERVAL):
+        """
+        Args:
+            data_path: Fichier JSONL source
+            persist_directory: Répertoire de la base vectorielle
+            embedding_model: Modèle d'embedding
+            embedding_name: Identifiant du modèle (backend/nom), vérifié à la reprise
+            chunk_size: Taille maximale d'un chunk en caractères
+            chunk_overlap: Chevauchement entre chunks, en fraction de chunk_size
+            batch_size: Nombre de chunks par lot embeddé, écrit et validé
+            queue_size: Nombre de lots en attente entre deux étapes
+            report_interval: Intervalle entre deux rapports de débit (secondes)
+        """
+        self.data_path = os.path.abspath(data_path)
+        self.persist_directory = persist_directory
+        self.embedding_model = embedding_model
+        self.embedding_name = embedding_name
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+
+        # Files bornées : documents entre les premières étapes, lots ensuite
+        self._queues = {
+            "split": queue.Queue(maxsize=batch_size),
+            "normalize": queue.Queue(maxsize=batch_size),
+            "embed": queue.Queue(maxsize=queue_size),
+            "write": queue.Queue(maxsize=queue_size),
+        }
+        self._stats = {
+            "parse": _StageStats("parse", "docs"),
+            "split": _StageStats("split", "chunks"),
+            "normalize": _StageStats("normalize", "chunks"),
+            "embed": _StageStats("embed", "chunks"),
+            "write": _StageStats("write", "chunks"),
+        }
+        self._stop = threading.Event()
+        self._error = None
+        self._state = None
+        self.vector_store = None
+
+    def run(self, resume: bool = True):
+        """
+        Exécute l'ingestion jusqu'à la fin du fichier source.
+
+        Args:
+            resume: Reprendre au dernier lot validé si une ingestion du même
+                fichier avec les mêmes paramètres a été interrompue
+
+        Returns:
+            Chroma: La base vectorielle construite
+        """
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self.vector_store = Chroma(persist_directory=self.persist_directory,
+                                   embedding_function=self.embedding_model)
+        self._state = self._resume_state() if resume else None
+        if self._state is None:
+            self._start_fresh()
+        else:
+            logger.info(
+                f"Resuming ingestion of {self.data_path} at byte {self._state['offset']} "
+                f"({self._state['documents']} documents, "
+                f"{self._state['chunks']} chunks already written)")
+
+        stages = [("parse", self._parse), ("split", self._split),
+                  ("normalize", self._normalize), ("embed", self._embed),
+                  ("write", self._write)]
+        threads = [
+            threading.Thread(target=self._guard, args=(stage,), name=f"ingest-{name}",
+                             daemon=True)
+            for name, stage in stages
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                threads[-1].join(self.report_interval)
+                self._report(time.perf_counter() - start)
+        except KeyboardInterrupt:
+            logger.warning(
+                "Ingestion interrupted, it will resume from the last committed batch")
+            self._stop.set()
+            raise
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if self._error is not None:
+            raise self._error
+
+        self._state["complete"] = True
+        save_checkpoint(self.persist_directory, self._state)
+        logger.info(
+            f"Ingestion complete: {self._state['documents']} documents, "
+            f"{self._state['chunks']} chunks in {time.perf_counter() - start:.1f}s")
+        # Pas de stockage de chunks en mémoire : la recherche lit les textes dans Chroma
+        self.vector_store.chunk_store = None
+        return self.vector_store
+
+    def _resume_state(self) -> Optional[Dict[str, Any]]:
+        state = load_checkpoint(self.persist_directory)
+        if state is None or state.get("complete"):
+            return None
+        expected = self._parameters()
+        if any(state.get(key) != value for key, value in expected.items()):
+            logger.warning(
+                "Ignoring ingestion checkpoint created with a different source or parameters")
+            return None
+        if state["offset"] > os.path.getsize(self.data_path):
+            logger.warning("Ignoring ingestion checkpoint beyond the end of the source file")
+            return None
+        return state
+
+    def _start_fresh(self):
+        # Repartir d'une collection vide ; les fichiers d'une construction en mémoire
+        # ou partitionnée ne décrivent plus la base
+        if self.vector_store._collection.count():
+            self.vector_store.delete_collection()
+            self.vector_store = Chroma(persist_directory=self.persist_directory,
+                                       embedding_function=self.embedding_model)
+        for filename in (CHUNK_STORE_FILENAME, SHARD_MANIFEST_FILENAME):
+            path = os.path.join(self.persist_directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        self._state = dict(self._parameters(), offset=0, documents=0, chunks=0, position=0,
+                           complete=False)
+        save_checkpoint(self.persist_directory, self._state)
+        logger.info(f"Starting pipelined ingestion of {self.data_path}")
+
+    def _parameters(self) -> Dict[str, Any]:
+        return {
+            "source": self.data_path,
+            "fingerprint": source_fingerprint(self.data_path),
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embedding": self.embedding_name,
+        }
+
+    def _guard(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+            logger.error(f"Ingestion stage {stage.__name__.lstrip('_')} failed: {str(e)}")
+            self._stop.set()
+
+    def _put(self, name: str, item):
+        while not self._stop.is_set():
+            try:
+                self._queues[name].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, name: str):
+        while not self._stop.is_set():
+            try:
+                return self._queues[name].get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _parse(self):
+        stats = self._stats["parse"]
+        with open(self.data_path, 'rb') as file:
+            file.seek(self._state["offset"])
+            while not self._stop.is_set():
+                line = file.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                try:
+                    doc = parse_document_line(line.decode('utf-8'))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"Skipping invalid JSON line in {self.data_path}")
+                    doc = None
+                stats.busy += time.perf_counter() - started
+                # L'offset de fin de ligne est transmis même pour une ligne ignorée
+                self._put("split", (doc, file.tell()))
+                if doc is not None:
+                    stats.items += 1
+        self._put("split", _DONE)
+
+    def _split(self):
+        stats = self._stats["split"]
+        splitter = get_text_splitter(self.chunk_size, self.chunk_overlap)
+        while True:
+            item = self._get("split")
+            if item is _DONE:
+                break
+            doc, offset = item
+            started = time.perf_counter()
+            if doc is None:
+                chunks = None
+            elif len(doc.page_content) < self.chunk_size:
+                chunks = [doc]
+            else:
+                chunks = splitter.split_documents([doc])
+            stats.busy += time.perf_counter() - started
+            stats.items += len(chunks or [])
+            self._put("normalize", (chunks, offset))
+        self._put("normalize", _DONE)
+
+    def _normalize(self):
+        stats = self._stats["normalize"]
+        # Numérotation déterministe : une reprise produit les mêmes identifiants.
+        # Les chunks sont numérotés par document : des enregistrements partageant
+        # un même id se remplacent, comme un article republié
+        position = self._state.get("position", self._state["chunks"])
+        batch = _Batch()
+        while True:
+            item = self._get("normalize")
+            if item is _DONE:
+                break
+            chunks, offset = item
+            started = time.perf_counter()
+            if chunks:
+                source_id = normalize_metadata(chunks[0].metadata).get("id")
+                if source_id == "":
+                    source_id = None
+                records = []
+                for n, chunk in enumerate(chunks):
+                    metadata = normalize_metadata(chunk.metadata)
+                    if source_id is None:
+                        chunk_id = f"chunk-{position}"
+                    else:
+                        chunk_id = f"{source_id}-{n}"
+                        metadata["chunk_index"] = n
+                    metadata["chunk_id"] = chunk_id
+                    records.append((chunk_id, chunk.page_content, metadata))
+                    position += 1
+                batch.add_document(source_id, records)
+            batch.offset = offset
+            batch.position = position
+            if chunks is not None:
+                batch.documents += 1
+            stats.busy += time.perf_counter() - started
+            stats.items += len(chunks or [])
+            # Un lot se termine toujours sur une fin de document, pour que l'offset soit valide
+            if len(batch) >= self.batch_size:
+                batch.seal()
+                self._put("embed", batch)
+                batch = _Batch()
+        if len(batch) or batch.offset:
+            batch.seal()
+            self._put("embed", batch)
+        self._put("embed", _DONE)
+
+    def _embed(self):
+        stats = self._stats["embed"]
+        while True:
+            batch = self._get("embed")
+            if batch is _DONE:
+                break
+            started = time.perf_counter()
+            if batch.texts:
+                batch.embeddings = self.embedding_model.embed_documents(batch.texts)
+            stats.busy += time.perf_counter() - started
+            stats.items += len(batch.texts)
+            self._put("write", batch)
+        self._put("write", _DONE)
+
+    def _write(self):
+        stats = self._stats["write"]
+        while True:
+            batch = self._get("write")
+            if batch is _DONE:
+                break
+            started = time.perf_counter()
+            if batch.chunk_counts:
+                self._delete_stale_chunks(batch.chunk_counts)
+            if batch.ids:
+                # upsert : réécrire un lot déjà présent après une reprise est sans effet
+                self.vector_store._collection.upsert(
+                    ids=batch.ids, embeddings=batch.embeddings,
+                    documents=batch.texts, metadatas=batch.metadatas)
+            self._state["offset"] = batch.offset
+            self._state["documents"] += batch.documents
+            self._state["chunks"] += len(batch.ids)
+            self._state["position"] = batch.position
+            save_checkpoint(self.persist_directory, self._state)
+            stats.busy += time.perf_counter() - started
+            stats.items += len(batch.ids)
+
+    def _delete_stale_chunks(self, chunk_counts: Dict[Any, int]):
+        """
+        Supprime les chunks d'une version précédente des documents du lot dont
+        le numéro dépasse leur nouveau nombre de chunks (un seul appel par lot).
+        """
+        clauses = [{"$and": [{"id": source_id}, {"chunk_index": {"$gte": count}}]}
+                   for source_id, count in chunk_counts.items()]
+        where = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+        self.vector_store._collection.delete(where=where)
+
+    def get_stats(self, elapsed: float) -> List[Dict[str, Any]]:
+        """
+        Retourne le débit et le taux d'occupation de chaque étape.
+
+        Args:
+            elapsed: Durée écoulée depuis le début de l'ingestion (secondes)
+
+        Returns:
+            List[Dict[str, Any]]: Une entrée par étape, dans l'ordre du pipeline
+        """
+        return [
+            {
+                "stage": stats.name,
+                "unit": stats.unit,
+                "items": stats.items,
+                "rate": stats.items / elapsed if elapsed else 0.0,
+                "busy": stats.busy / elapsed if elapsed else 0.0,
+            }
+            for stats in self._stats.values()
+        ]
+
+    def _report(self, elapsed: float):
+        stages = self.get_stats(elapsed)
+        bottleneck = max(stages, key=lambda stage: stage["busy"])
+        queues = " ".join(f"{name}={q.qsize()}/{q.maxsize}" for name, q in self._queues.items())
+        logger.info(
+            "Ingest: " + " | ".join(
+                f"{stage['stage']} {stage['rate']:.0f} {stage['unit']}/s ({stage['busy']:.0%} busy)"
+                for stage in stages)
+            + f" | queues {queues} | bottleneck: {bottleneck['stage']}"
+            + f" | committed {self._state['documents']} docs / {self._state['chunks']} chunks")
@@ -0,0 +1,511 @@
+"""
+Pool de serveurs LLM compatibles OpenAI (LM Studio) avec répartition de charge.
+
+Chaque génération est routée vers le serveur sain ayant le moins de requêtes en
+cours (`least_outstanding`) ou la plus faible latence moyenne pondérée par sa
+charge (`ewma`). Un serveur est éjecté après plusieurs échecs consécutifs puis
+réadmis dès qu'un health check réussit. Une requête de couverture (hedging)
+peut être envoyée à un second serveur sain si la première tarde à répondre ;
+en streaming, le délai porte sur le premier morceau de la réponse.
+"""
+import os
+import time
+import random
+import threading
+from queue import Empty, Queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+import requests
+from requests.exceptions import ConnectionError, Timeout, RequestException
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from logger import logger, request_logger
+from constants import (
+    DEFAULT_MODEL_NAME, DEFAULT_TEMPERATURE, DEFAULT_HEALTH_CHECK_TIMEOUT,
+    LLM_ROUTING_POLICIES, DEFAULT_LLM_ROUTING, DEFAULT_LLM_EJECT_AFTER,
+    DEFAULT_LLM_PROBE_INTERVAL, DEFAULT_LLM_HEDGE_AFTER, DEFAULT_LLM_EWMA_ALPHA
+)
+
+
+def check_llm_availability(url, timeout=DEFAULT_HEALTH_CHECK_TIMEOUT):
+    """Check if the LLM service is available by making a simple request within `timeout` seconds."""
+    start = time.monotonic()
+    try:
+        # Try a simple request to the models endpoint (standard for OpenAI-compatible APIs)
+        response = requests.get(f"{url}/models", timeout=timeout)
+        if response.status_code == 200:
+            request_logger.info(f"LLM service available at {url}")
+            return True
+
+        # If models endpoint doesn't work, try a direct test with a simple completion
+        headers = {
+            "Content-Type": "application/json",
+        }
+        test_data = {
+            # This should be ignored by most OpenAI compatible APIs if model doesn't match
+            "model": "gpt-3.5-turbo",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "max_tokens": 5
+        }
+
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            logger.warning(f"LLM health check timed out at {url}")
+            return False
+        response = requests.post(
+            f"{url}/chat/completions", headers=headers, json=test_data, timeout=remaining)
+        # Accept any non-server error (even 401 or 404 means the server is responding)
+        if response.status_code < 500:
+            request_logger.info(f"LLM service responding at {url}")
+            return True
+
+        logger.warning(
+            f"LLM service returned status code {response.status_code} at {url}")
+        return False
+
+    except (ConnectionError, Timeout) as e:
+        logger.warning(f"Connection error when checking LLM service: {str(e)}")
+        return False
+    except RequestException as e:
+        logger.warning(f"Request error when checking LLM service: {str(e)}")
+        return False
+    except Exception as e:
+        logger.warning(f"Unexpected error when checking LLM service: {str(e)}")
+        return False
+
+
+class LLMEndpoint:
+    """Un serveur LLM du pool et son état de santé et de charge."""
+
+    def __init__(self, url: str, client):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+
+class LLMPool:
+    """
+    Ensemble de serveurs LLM avec routage, éjection et réadmission automatiques.
+    """
+
+    def __init__(self, urls: List[str], api_key: str = "NotNeeded",
+                 model_name: str = DEFAULT_MODEL_NAME, temperature: float = DEFAULT_TEMPERATURE,
+                 policy: str = DEFAULT_LLM_ROUTING, eject_after: int = DEFAULT_LLM_EJECT_AFTER,
+                 probe_interval: float = DEFAULT_LLM_PROBE_INTERVAL,
+                 hedge_after: float = DEFAULT_LLM_HEDGE_AFTER):
+        """
+        Initialise le pool et démarre le thread de health check.
+
+        Args:
+            urls: URLs de base des serveurs (ex: http://host:1234/v1)
+            api_key: Clé API (factice pour LM Studio)
+            model_name: Nom du modèle à utiliser sur chaque serveur
+            temperature: Température de génération
+            policy: Politique de routage ("least_outstanding" ou "ewma")
+            eject_after: Nombre d'échecs consécutifs avant éjection d'un serveur
+            probe_interval: Intervalle entre deux health checks (secondes)
+            hedge_after: Délai avant une requête de couverture (secondes, 0 = désactivé)
+        """
+        if not urls:
+            raise ValueError("An LLM pool needs at least one endpoint URL")
+        if policy not in LLM_ROUTING_POLICIES:
+            raise ValueError(
+                f"Unknown LLM routing policy: {policy}. Expected one of {LLM_ROUTING_POLICIES}")
+
+        self.policy = policy
+        self.eject_after = eject_after
+        self.probe_interval = probe_interval
+        self.hedge_after = hedge_after
+        self.endpoints = [
+            LLMEndpoint(url, ChatOpenAI(
+                openai_api_key=api_key, base_url=url, model=model_name,
+                temperature=temperature, max_retries=0))
+            for url in urls
+        ]
+        self._lock = threading.Lock()
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=max(2, 2 * len(urls)), thread_name_prefix="llm-hedge")
+
+        self._stop = threading.Event()
+        self._prober = threading.Thread(
+            target=self._probe_loop, name="llm-pool-prober", daemon=True)
+        self._prober.start()
+        logger.info(
+            f"LLM pool initialized with {len(urls)} endpoints (policy: {policy}, "
+            f"hedge after: {hedge_after or 'disabled'})")
+
+    def choose(self, exclude=(), healthy_only: bool = False) -> Optional[LLMEndpoint]:
+        """
+        Choisit le serveur vers lequel router une requête et compte la requête en cours.
+
+        Si aucun serveur n'est sain, tous sont considérés afin de ne pas refuser
+        une requête sur la base d'un état de santé potentiellement périmé.
+
+        Args:
+            exclude: Serveurs à écarter (ex: celui de la requête initiale lors d'un hedging)
+            healthy_only: Ne retourner qu'un serveur sain non exclu, ou None
+
+        Returns:
+            Optional[LLMEndpoint]: Le serveur choisi (None seulement avec healthy_only)
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints
+                          if e.healthy and e not in exclude]
+            if not candidates:
+                if healthy_only:
+                    return None
+                candidates = [
+                    e for e in self.endpoints if e not in exclude] or self.endpoints
+            # Mélanger pour départager aléatoirement les serveurs à égalité
+            random.shuffle(candidates)
+            endpoint = min(candidates, key=self._cost)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _cost(self, endpoint: LLMEndpoint) -> float:
+        if self.policy == "ewma":
+            # Les serveurs sans mesure sont essayés en premier
+            latency = endpoint.ewma_latency or 0.0
+            return latency * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def record_success(self, endpoint: LLMEndpoint, latency: float):
+        """Enregistre la fin réussie d'une requête et met à jour la latence moyenne."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.consecutive_failures = 0
+            endpoint.ewma_latency = latency if endpoint.ewma_latency is None else \
+                (1 - DEFAULT_LLM_EWMA_ALPHA) * endpoint.ewma_latency + DEFAULT_LLM_EWMA_ALPHA * latency
+
+    def record_failure(self, endpoint: LLMEndpoint, error: Exception):
+        """Enregistre l'échec d'une requête et éjecte le serveur après trop d'échecs consécutifs."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and endpoint.consecutive_failures >= self.eject_after:
+                endpoint.healthy = False
+                logger.warning(
+                    f"Ejecting LLM endpoint {endpoint.url} after "
+                    f"{endpoint.consecutive_failures} consecutive failures: {str(error)}")
+
+    def release(self, endpoint: LLMEndpoint):
+        """Libère une requête abandonnée sans mettre à jour la santé du serveur."""
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def is_available(self) -> bool:
+        """Indique si au moins un serveur du pool est sain."""
+        with self._lock:
+            return any(e.healthy for e in self.endpoints)
+
+    def probe(self):
+        """Vérifie la santé de chaque serveur, éjecte ou réadmet selon le résultat."""
+        for endpoint in self.endpoints:
+            available = check_llm_availability(endpoint.url)
+            with self._lock:
+                if available and not endpoint.healthy:
+                    endpoint.healthy = True
+                    endpoint.consecutive_failures = 0
+                    logger.info(f"Re-admitting LLM endpoint {endpoint.url}")
+                elif not available and endpoint.healthy:
+                    endpoint.healthy = False
+                    logger.warning(
+                        f"Ejecting LLM endpoint {endpoint.url}: health check failed")
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning(f"LLM pool health check failed: {str(e)}")
+
+    def stop(self):
+        """Arrête le thread de health check."""
+        self._stop.set()
+
+    def invoke(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs):
+        """
+        Envoie une requête au pool, avec une requête de couverture optionnelle.
+
+        Returns:
+            BaseMessage: La réponse du premier serveur ayant répondu avec succès
+        """
+        if not self.hedge_after or len(self.endpoints) < 2:
+            return self._call(self.choose(), messages, stop, **kwargs)
+
+        primary_endpoint = self.choose()
+        primary = self._hedge_executor.submit(
+            self._call, primary_endpoint, messages, stop, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        # La requête initiale tarde : envoyer une copie à un autre serveur sain
+        hedge_endpoint = self._choose_hedge(primary_endpoint)
+        if hedge_endpoint is None:
+            return primary.result()
+        hedge = self._hedge_executor.submit(
+            self._call, hedge_endpoint, messages, stop, **kwargs)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self._hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _choose_hedge(self, primary: LLMEndpoint) -> Optional[LLMEndpoint]:
+        # Jamais le serveur de la requête initiale, ni un serveur éjecté
+        endpoint = self.choose(exclude=[primary], healthy_only=True)
+        if endpoint is None:
+            request_logger.info(
+                f"No other healthy LLM endpoint to hedge to after {self.hedge_after:.2f}s")
+            return None
+        with self._lock:
+            self._hedges += 1
+        request_logger.info(
+            f"Hedging LLM request to {endpoint.url} after {self.hedge_after:.2f}s")
+        return endpoint
+
+    def _call(self, endpoint: LLMEndpoint, messages, stop, **kwargs):
+        start = time.monotonic()
+        try:
+            result = endpoint.client.invoke(messages, stop=stop, **kwargs)
+        except Exception as e:
+            self.record_failure(endpoint, e)
+            raise
+        self.record_success(endpoint, time.monotonic() - start)
+        return result
+
+    def stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+               **kwargs) -> Iterator[AIMessageChunk]:
+        """
+        Génère la réponse en streaming depuis un serveur du pool.
+
+        Si le serveur échoue avant d'avoir produit le moindre morceau, la requête
+        est renvoyée une fois vers un autre serveur. Avec le hedging activé, une
+        copie est aussi envoyée à un autre serveur sain si le premier morceau
+        tarde ; le premier serveur à produire un morceau fournit toute la réponse.
+        """
+        if self.hedge_after and len(self.endpoints) >= 2:
+            yield from self._hedged_stream(messages, stop, **kwargs)
+            return
+
+        tried = []
+        while True:
+            endpoint = self.choose(exclude=tried)
+            tried.append(endpoint)
+            start = time.monotonic()
+            produced = False
+            try:
+                for chunk in endpoint.client.stream(messages, stop=stop, **kwargs):
+                    produced = True
+                    yield chunk
+            except GeneratorExit:
+                # Le consommateur a abandonné la génération (ex: échéance atteinte)
+                self.release(endpoint)
+                raise
+            except Exception as e:
+                self.record_failure(endpoint, e)
+                if produced or len(tried) >= min(2, len(self.endpoints)):
+                    raise
+                logger.warning(
+                    f"LLM endpoint {endpoint.url} failed before streaming, retrying on another endpoint")
+                continue
+            self.record_success(endpoint, time.monotonic() - start)
+            return
+
+    def _hedged_stream(self, messages, stop, **kwargs) -> Iterator[AIMessageChunk]:
+        # Chaque tentative lit son flux dans un thread et publie ses morceaux dans
+        # une file commune ; la première à produire un morceau est retenue et
+        # les autres sont abandonnées.
+        events = Queue()
+        attempts = [_StreamAttempt(self, self.choose(), messages, stop, kwargs, events)]
+        winner = hedge = None
+        can_hedge = True
+        try:
+            while True:
+                timeout = self.hedge_after if winner is None and can_hedge else None
+                try:
+                    attempt, kind, value = events.get(timeout=timeout)
+                except Empty:
+                    can_hedge = False
+                    hedge_endpoint = self._choose_hedge(attempts[0].endpoint)
+                    if hedge_endpoint is not None:
+                        hedge = _StreamAttempt(self, hedge_endpoint, messages, stop, kwargs, events)
+                        attempts.append(hedge)
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        attempt.finished = True
+                        if any(not a.finished for a in attempts):
+                            continue
+                        if len(attempts) >= min(2, len(self.endpoints)):
+                            raise value
+                        # Échec avant le premier morceau : un nouvel essai ailleurs
+                        logger.warning(
+                            f"LLM endpoint {attempt.endpoint.url} failed before streaming, "
+                            f"retrying on another endpoint")
+                        can_hedge = False
+                        attempts.append(_StreamAttempt(
+                            self, self.choose(exclude=[a.endpoint for a in attempts]),
+                            messages, stop, kwargs, events))
+                        continue
+                    winner = attempt
+                    for other in attempts:
+                        if other is not winner:
+                            other.cancel()
+                    if winner is hedge:
+                        with self._lock:
+                            self._hedge_wins += 1
+
+                if attempt is not winner:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Fin normale, erreur ou abandon par le consommateur
+            for attempt in attempts:
+                attempt.cancel()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Retourne l'état de chaque serveur du pool.
+
+        Returns:
+            Dict[str, Any]: Politique, statistiques de hedging et état par serveur
+        """
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "endpoints": [
+                    {
+                        "url": e.url,
+                        "healthy": e.healthy,
+                        "outstanding": e.outstanding,
+                        "ewma_latency_seconds": e.ewma_latency,
+                        "requests": e.requests,
+                        "failures": e.failures,
+                    }
+                    for e in self.endpoints
+                ],
+            }
+
+
+class _StreamAttempt:
+    """Flux d'un serveur lu dans un thread, dont les morceaux sont publiés dans une file."""
+
+    def __init__(self, pool: LLMPool, endpoint: LLMEndpoint, messages, stop,
+                 kwargs: Dict[str, Any], events: Queue):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.finished = False
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(messages, stop, kwargs, events),
+            name="llm-hedge-stream", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Abandonne le flux au prochain morceau reçu."""
+        self._cancelled.set()
+
+    def _run(self, messages, stop, kwargs, events: Queue):
+        start = time.monotonic()
+        try:
+            stream = self.endpoint.client.stream(messages, stop=stop, **kwargs)
+            for chunk in stream:
+                if self._cancelled.is_set():
+                    # Abandonnée : ni succès ni échec pour la santé du serveur
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+                    self.pool.release(self.endpoint)
+                    return
+                events.put((self, "chunk", chunk))
+        except Exception as e:
+            self.pool.record_failure(self.endpoint, e)
+            events.put((self, "error", e))
+            return
+        self.pool.record_success(self.endpoint, time.monotonic() - start)
+        events.put((self, "done", None))
+
+
+class PooledChatModel(BaseChatModel):
+    """
+    Modèle de chat LangChain qui délègue chaque appel à un serveur du pool.
+    """
+
+    pool: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai-compatible-pool"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        message = self.pool.invoke(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in self.pool.stream(messages, stop=stop, **kwargs):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+
+@lru_cache(maxsize=None)
+def get_llm_pool() -> Optional[LLMPool]:
+    """
+    Crée le pool de serveurs LLM à partir de la variable LM_STUDIO_URLS.
+
+    Le pool est créé une seule fois et partagé par toutes les chaînes RAG.
+
+    Returns:
+        Optional[LLMPool]: Le pool, ou None si LM_STUDIO_URLS n'est pas définie
+    """
+    urls = [url.strip().rstrip("/")
+            for url in os.getenv("LM_STUDIO_URLS", "").split(",") if url.strip()]
+    if not urls:
+        return None
+
+    return LLMPool(
+        urls,
+        api_key=os.getenv("LM_STUDIO_API_KEY", "NotNeeded"),
+        model_name=os.getenv("LM_STUDIO_MODEL", DEFAULT_MODEL_NAME),
+        temperature=float(
+            os.getenv("LM_TEMPERATURE", str(DEFAULT_TEMPERATURE))),
+        policy=os.getenv("LLM_ROUTING", DEFAULT_LLM_ROUTING),
+        eject_after=int(
+            os.getenv("LLM_EJECT_AFTER", str(DEFAULT_LLM_EJECT_AFTER))),
+        probe_interval=float(
+            os.getenv("LLM_PROBE_INTERVAL", str(DEFAULT_LLM_PROBE_INTERVAL))),
+        hedge_after=float(
+            os.getenv("LLM_HEDGE_AFTER", str(DEFAULT_LLM_HEDGE_AFTER))),
+    )
@@ -1,11 +1,197 @@
 """
 Module de journalisation centralisé pour le projet Chatbot-RAG.
 Configure un système de journalisation uniforme qui écrit à la fois dans un fichier et sur la console.
+
+Le comportement peut être ajusté par variables d'environnement :
+    LOG_FORMAT        "text" (par défaut) ou "json"
+    LOG_MAX_BYTES     Taille maximale d'un fichier de log avant rotation (0 = pas de rotation)
+    LOG_BACKUP_COUNT  Nombre de fichiers de log conservés après rotation
+    LOG_ASYNC         "true" pour écrire les logs depuis un thread d'arrière-plan
+    LOG_QUEUE_SIZE    Taille de la file d'attente en mode asynchrone
+    LOG_DROP_POLICY   "drop_new", "drop_old" ou "block" lorsque la file est pleine
+    LOG_SAMPLING      Échantillonnage par logger, ex: "chatbot_rag.request=0.1"
 """
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
 import sys
+import threading
+from datetime import datetime
+from constants import (
+    DEFAULT_LOG_FORMAT, DEFAULT_LOG_MAX_BYTES, DEFAULT_LOG_BACKUP_COUNT,
+    DEFAULT_LOG_ASYNC, DEFAULT_LOG_QUEUE_SIZE, DEFAULT_LOG_DROP_POLICY,
+    DEFAULT_LOG_BLOCK_TIMEOUT, DEFAULT_LOG_SAMPLING
+)
+
+DROP_POLICIES = ("drop_new", "drop_old", "block")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formate chaque enregistrement sous forme d'un objet JSON sur une ligne."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ne conserve qu'une fraction des enregistrements des loggers configurés.
+
+    L'échantillonnage est déterministe (un enregistrement sur 1/taux) et ne
+    s'applique qu'aux niveaux inférieurs à WARNING : les avertissements et
+    erreurs sont toujours conservés. La décision est prise une seule fois par
+    enregistrement, ce qui permet de partager le filtre entre plusieurs handlers.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # Chaque handler appelle le filtre : réutiliser la décision déjà prise
+        decision = getattr(record, "_sampled", None)
+        if decision is None:
+            decision = self._sample(record)
+            record._sampled = decision
+        return decision
+
+    def _sample(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        with self._lock:
+            count = self._counters.get(record.name, 0) + 1
+            self._counters[record.name] = count
+        # Conserver l'enregistrement lorsque la partie entière de count * rate change
+        return int(count * rate) != int((count - 1) * rate)
+
+    def _rate_for(self, name):
+        # Le logger le plus spécifique configuré s'applique (ex: "a.b" avant "a")
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler non bloquant avec une file bornée et une politique de rejet.
+
+    Seule la fusion du message et de ses arguments est faite dans le thread
+    appelant ; le formatage et les écritures sont délégués au thread d'écriture.
+    """
+
+    def __init__(self, log_queue, drop_policy=DEFAULT_LOG_DROP_POLICY,
+                 block_timeout=DEFAULT_LOG_BLOCK_TIMEOUT):
+        super().__init__(log_queue)
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                f"Unknown log drop policy: {drop_policy}. Expected one of {DROP_POLICIES}")
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._reported = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if not self._put(record):
+            with self._drop_lock:
+                self.dropped += 1
+            return
+
+        # Signaler les enregistrements perdus dès que la file a de la place
+        with self._drop_lock:
+            pending = self.dropped - self._reported
+            if pending <= 0:
+                return
+            self._reported = self.dropped
+        warning = logging.LogRecord(
+            record.name, logging.WARNING, __file__, 0,
+            f"Dropped {pending} log records (queue full, policy: {self.drop_policy})",
+            None, None)
+        # L'avertissement n'évince ni n'attend aucun enregistrement : s'il ne
+        # tient pas dans la file, il est reporté au prochain enregistrement accepté
+        try:
+            self.queue.put_nowait(warning)
+        except queue.Full:
+            with self._drop_lock:
+                self._reported -= pending
+
+    def _put(self, record):
+        try:
+            if self.drop_policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            if self.drop_policy != "drop_old":
+                return False
+        # Politique "drop_old" : libérer la place de l'enregistrement le plus ancien
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        with self._drop_lock:
+            self.dropped += 1
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False
+
+
+def parse_sampling_rates(spec, invalid=None):
+    """
+    Analyse une spécification d'échantillonnage de la forme "logger=taux,logger=taux".
+
+    Args:
+        spec (str): Spécification d'échantillonnage
+        invalid (list, optional): Liste complétée avec les règles invalides,
+            ignorées et signalées une fois les handlers configurés
+
+    Returns:
+        dict: Taux d'échantillonnage par nom de logger
+    """
+    rates = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = float(rate)
+        except ValueError:
+            if invalid is not None:
+                invalid.append(item.strip())
+    return rates
 
 
 def setup_logger(name="chatbot_rag", log_level=logging.INFO):
@@ -32,9 +218,17 @@ def setup_logger(name="chatbot_rag", log_level=logging.INFO):
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
 
-    # Générer un nom de fichier avec timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file_path = os.path.join(logs_dir, f"{name}_{timestamp}.log")
+    # Un fichier par logger, avec rotation par taille
+    log_file_path = os.path.join(logs_dir, f"{name}.log")
+    max_bytes = int(os.getenv("LOG_MAX_BYTES", str(DEFAULT_LOG_MAX_BYTES)))
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT",
+                       str(DEFAULT_LOG_BACKUP_COUNT)))
+    log_format = os.getenv("LOG_FORMAT", DEFAULT_LOG_FORMAT).lower()
+    use_async = os.getenv(
+        "LOG_ASYNC", str(DEFAULT_LOG_ASYNC)).lower() in ("1", "true", "yes")
+    invalid_sampling_rules = []
+    sampling_rates = parse_sampling_rates(
+        os.getenv("LOG_SAMPLING", DEFAULT_LOG_SAMPLING), invalid_sampling_rules)
 
     # Configurer le logger
     logger = logging.getLogger(name)
@@ -45,25 +239,58 @@ def setup_logger(name="chatbot_rag", log_level=logging.INFO):
         logger.handlers.clear()
 
     # Formateur pour les messages
-    formatter = logging.Formatter(
-        '%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
 
     # Gestionnaire pour les fichiers
-    file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
     file_handler.setFormatter(formatter)
     file_handler.setLevel(log_level)
-    logger.addHandler(file_handler)
 
-    # Gestionnaire pour la console
-    console_handler = logging.StreamHandler(sys.stdout)
+    # Gestionnaire pour la console, sur stderr : stdout reste réservé aux
+    # résultats (ex: JSONL du mode batch)
+    console_handler = logging.StreamHandler(sys.stderr)
     console_handler.setFormatter(formatter)
     console_handler.setLevel(log_level)
-    logger.addHandler(console_handler)
+
+    sampling_filter = SamplingFilter(
+        sampling_rates) if sampling_rates else None
+
+    if use_async:
+        # Les écritures sont faites par un thread d'arrière-plan alimenté par une file bornée
+        queue_size = int(os.getenv("LOG_QUEUE_SIZE",
+                         str(DEFAULT_LOG_QUEUE_SIZE)))
+        drop_policy = os.getenv("LOG_DROP_POLICY", DEFAULT_LOG_DROP_POLICY)
+        queue_handler = BoundedQueueHandler(
+            queue.Queue(maxsize=queue_size), drop_policy=drop_policy)
+        queue_handler.setLevel(log_level)
+        if sampling_filter:
+            queue_handler.addFilter(sampling_filter)
+        logger.addHandler(queue_handler)
+
+        listener = logging.handlers.QueueListener(
+            queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+        listener.start()
+        # Vider la file avant la fin du processus
+        atexit.register(listener.stop)
+    else:
+        for handler in (file_handler, console_handler):
+            if sampling_filter:
+                handler.addFilter(sampling_filter)
+            logger.addHandler(handler)
 
     # Journaliser la création du logger
-    logger.info(f"Logger initialized. Logs will be saved to: {log_file_path}")
+    logger.info(
+        f"Logger initialized. Logs will be saved to: {log_file_path} "
+        f"(format: {log_format}, async: {use_async})")
+    for rule in invalid_sampling_rules:
+        logger.warning(f"Ignoring invalid log sampling rule: {rule}")
 
     return logger
 
@@ -89,6 +316,11 @@ def get_logger(name="chatbot_rag", log_level=None):
 # Logger par défaut pour le projet
 logger = setup_logger()
 
+# Logger enfant pour les messages à fort volume du chemin de requête.
+# Il partage les handlers du logger par défaut et peut être échantillonné
+# indépendamment (ex: LOG_SAMPLING="chatbot_rag.request=0.1").
+request_logger = logger.getChild("request")
+
 # Ajouter un commentaire d'utilisation pour clarifier l'import
 """
 Exemple d'utilisation dans d'autres modules:
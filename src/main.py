@@ -1,13 +1,21 @@
 import os
+import sys
+import json
 import argparse
 from dotenv import load_dotenv
 from utils import load_documents
 from chatbot import ChatbotCLI
+from batch import load_batch_queries, run_batch
 from rag import setup_rag_pipeline
-from embedding import setup_vector_store
+from embedding import setup_vector_store, get_embedding_model
+from ingest import IngestionPipeline, load_checkpoint
+from rerank import CrossEncoderReranker
 from logger import logger
 from constants import (
-    DEFAULT_DATA_PATH, DEFAULT_DB_PATH,
+    DEFAULT_DATA_PATH, DEFAULT_DB_PATH, DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_RERANK_MODEL, DEFAULT_RERANK_CANDIDATES,
+    EMBEDDING_BACKENDS, DEFAULT_EMBEDDING_BACKEND, DEFAULT_DEDUP_THRESHOLD,
+    DEFAULT_NUM_SHARDS, DEFAULT_SHARD_TIMEOUT, DEFAULT_EMBEDDING_MODEL,
     MSG_LOADING_DOCUMENTS, MSG_LOADED_DOCUMENTS,
     MSG_SETUP_VECTOR_STORE, MSG_INIT_RAG, MSG_RAG_INITIALIZED,
     MSG_USING_DATA, MSG_VECTOR_STORE_LOCATION,
@@ -33,6 +41,33 @@ def main():
                         help='Path to store the vector database')
     parser.add_argument('--rebuild_db', action='store_true',
                         help='Force rebuilding the vector database')
+    parser.add_argument('--embedding_backend', type=str, default=DEFAULT_EMBEDDING_BACKEND,
+                        choices=EMBEDDING_BACKENDS,
+                        help='Embedding inference backend (onnx-int8 is fastest on CPU)')
+    parser.add_argument('--no_dedup', action='store_true',
+                        help='Keep duplicate documents and chunks when building the database')
+    parser.add_argument('--dedup_threshold', type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help='Estimated Jaccard similarity above which texts are near-duplicates (0 = exact duplicates only)')
+    parser.add_argument('--num_shards', type=int, default=DEFAULT_NUM_SHARDS,
+                        help='Number of shards the vector index is partitioned into when building it')
+    parser.add_argument('--shard_timeout', type=float, default=DEFAULT_SHARD_TIMEOUT,
+                        help='Seconds to wait for each shard before answering without it')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Build the database with the streaming ingestion pipeline (corpora larger than RAM, resumable)')
+    parser.add_argument('--restart_ingest', action='store_true',
+                        help='Pipeline mode: ignore the checkpoint of an interrupted build and start over')
+    parser.add_argument('--rerank', action='store_true',
+                        help='Re-rank a wider candidate set with a cross-encoder')
+    parser.add_argument('--rerank_model', type=str, default=DEFAULT_RERANK_MODEL,
+                        help='Cross-encoder model used for re-ranking')
+    parser.add_argument('--rerank_candidates', type=int, default=DEFAULT_RERANK_CANDIDATES,
+                        help='Number of candidates retrieved before re-ranking')
+    parser.add_argument('--queries-file', type=str, default=None,
+                        help='Run in batch mode on the queries in this file (JSONL or one question per line)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Batch mode: JSONL file for the results (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                        help='Batch mode: maximum number of concurrent LLM generations')
     args = parser.parse_args()
 
     # Vérification de l'existence du fichier de données
@@ -40,27 +75,88 @@ def main():
         logger.error(f"Data file not found at {args.data_path}")
         raise FileNotFoundError(f"Data file not found at {args.data_path}")
 
-    # Chargement et traitement des documents
-    logger.info(MSG_LOADING_DOCUMENTS)
-    documents = load_documents(args.data_path)
-    logger.info(MSG_LOADED_DOCUMENTS.format(len(documents)))
+    if args.pipeline:
+        # Ingestion en flux : le corpus n'est jamais chargé entièrement en mémoire
+        logger.info(MSG_SETUP_VECTOR_STORE)
+        vector_store = setup_pipelined_vector_store(args)
+    else:
+        # Chargement et traitement des documents
+        logger.info(MSG_LOADING_DOCUMENTS)
+        documents = load_documents(args.data_path)
+        logger.info(MSG_LOADED_DOCUMENTS.format(len(documents)))
 
-    # Création ou chargement du vector store
-    logger.info(MSG_SETUP_VECTOR_STORE)
-    vector_store = setup_vector_store(
-        documents, args.db_path, force_rebuild=args.rebuild_db)
+        # Création ou chargement du vector store
+        logger.info(MSG_SETUP_VECTOR_STORE)
+        vector_store = setup_vector_store(
+            documents, args.db_path, force_rebuild=args.rebuild_db,
+            embedding_backend=args.embedding_backend,
+            dedup=not args.no_dedup, dedup_threshold=args.dedup_threshold,
+            num_shards=args.num_shards, shard_timeout=args.shard_timeout)
 
     # Configuration du pipeline RAG
     logger.info(MSG_INIT_RAG)
-    rag_chain = setup_rag_pipeline(vector_store)
+    reranker = CrossEncoderReranker(
+        model_name=args.rerank_model) if args.rerank else None
+    rag_chain = setup_rag_pipeline(
+        vector_store, reranker=reranker, candidates=args.rerank_candidates)
+
+    # Mode batch : traitement du fichier de requêtes puis sortie
+    if args.queries_file:
+        run_batch_mode(args, rag_chain, vector_store)
+        return
 
     # Démarrage de l'interface CLI
     logger.info(MSG_RAG_INITIALIZED)
     logger.info(MSG_USING_DATA.format(args.data_path))
     logger.info(MSG_VECTOR_STORE_LOCATION.format(args.db_path))
-    chatbot = ChatbotCLI(rag_chain)
+    chatbot = ChatbotCLI(rag_chain, vector_store=vector_store)
     chatbot.start()
 
 
+def setup_pipelined_vector_store(args):
+    """
+    Construit la base avec l'ingestion en flux si nécessaire, sinon l'ouvre.
+
+    Une construction interrompue est reprise au dernier lot validé, même sans
+    --rebuild_db, sauf si --restart_ingest est demandé.
+    """
+    checkpoint = load_checkpoint(args.db_path) if os.path.exists(args.db_path) else None
+    interrupted = checkpoint is not None and not checkpoint.get("complete")
+    if not (args.rebuild_db or interrupted or not os.path.exists(args.db_path)):
+        return setup_vector_store([], args.db_path, embedding_backend=args.embedding_backend)
+
+    if args.num_shards > 1:
+        logger.warning("Pipelined ingestion builds a single collection, ignoring --num_shards")
+    if not args.no_dedup:
+        logger.info("De-duplication is not applied by the pipelined ingestion")
+
+    pipeline = IngestionPipeline(
+        args.data_path, args.db_path,
+        get_embedding_model(args.embedding_backend),
+        embedding_name=f"{args.embedding_backend}/{DEFAULT_EMBEDDING_MODEL}")
+    return pipeline.run(resume=not args.restart_ingest)
+
+
+def run_batch_mode(args, rag_chain, vector_store):
+    """
+    Traite toutes les requêtes du fichier de requêtes et écrit les résultats en JSONL,
+    dans l'ordre de complétion.
+    """
+    items = load_batch_queries(args.queries_file)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    errors = 0
+    try:
+        for result in run_batch(items, rag_chain, vector_store, concurrency=args.concurrency):
+            if "error" in result:
+                errors += 1
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logger.info(
+        f"Batch completed: {len(items)} queries, {errors} errors")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,203 @@
+"""
+Backend d'embedding optimisé pour CPU avec ONNX Runtime.
+
+Le modèle sentence-transformers est exporté une fois au format ONNX (et
+optionnellement quantifié dynamiquement en int8), puis exécuté par ONNX Runtime
+avec un nombre de threads explicite. Le pooling moyen et la normalisation L2
+reproduisent ceux du modèle sentence-transformers d'origine.
+"""
+import os
+import inspect
+import numpy as np
+from pathlib import Path
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from logger import logger
+from constants import (
+    DEFAULT_EMBEDDING_MODEL, DEFAULT_ONNX_CACHE_DIR, DEFAULT_EMBEDDING_BATCH_SIZE,
+    DEFAULT_EMBEDDING_MAX_SEQ_LENGTH, DEFAULT_EMBEDDING_THREADS
+)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_int8.onnx"
+
+
+def resolve_num_threads(num_threads: Optional[int] = None) -> int:
+    """Retourne le nombre de threads d'inférence (tous les cœurs disponibles par défaut)."""
+    if num_threads:
+        return num_threads
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def export_onnx_model(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """
+    Exporte un modèle transformers au format ONNX, avec quantification dynamique int8 optionnelle.
+
+    L'export n'est fait qu'une fois : les fichiers existants sont réutilisés.
+
+    Args:
+        model_name: Nom du modèle Hugging Face
+        output_dir: Répertoire où écrire le modèle et le tokenizer
+        quantize: Produire aussi une version quantifiée int8
+
+    Returns:
+        Path: Chemin du modèle ONNX à utiliser
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / ONNX_MODEL_FILE
+    quantized_path = output_dir / ONNX_QUANTIZED_MODEL_FILE
+
+    if not model_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {model_name} to ONNX in {output_dir}...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+
+        dummy = tokenizer(["Exemple de texte pour l'export"],
+                          return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                       if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"}
+                        for name in input_names + ["last_hidden_state"]}
+
+        # L'exporteur TorchScript gère les axes dynamiques de ce modèle
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[name] for name in input_names),
+                str(model_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **export_kwargs
+            )
+        tokenizer.save_pretrained(str(output_dir))
+        logger.info(f"ONNX model exported to {model_path}")
+
+    if not quantize:
+        return model_path
+
+    if not quantized_path.exists():
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info("Applying dynamic int8 quantization...")
+        quantize_dynamic(str(model_path), str(quantized_path),
+                         weight_type=QuantType.QInt8)
+        logger.info(f"Quantized ONNX model written to {quantized_path}")
+    return quantized_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Embeddings LangChain calculés par ONNX Runtime sur CPU.
+
+    Les textes sont triés par longueur avant le découpage en lots pour limiter
+    le padding ; avec `length_buckets`, chaque lot est complété jusqu'à la plus
+    petite longueur de la liste qui le contient, ce qui limite le nombre de
+    formes d'entrée différentes vues par le runtime.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, quantize: bool = True,
+                 cache_dir: str = DEFAULT_ONNX_CACHE_DIR,
+                 num_threads: int = DEFAULT_EMBEDDING_THREADS,
+                 batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+                 max_seq_length: int = DEFAULT_EMBEDDING_MAX_SEQ_LENGTH,
+                 length_buckets: Optional[List[int]] = None):
+        """
+        Initialise le backend ONNX (export et quantification au premier lancement).
+
+        Args:
+            model_name: Nom du modèle sentence-transformers
+            quantize: Utiliser le modèle quantifié dynamiquement en int8
+            cache_dir: Répertoire des modèles exportés
+            num_threads: Threads intra-opération d'ONNX Runtime (0 = tous les cœurs)
+            batch_size: Nombre de textes par appel au runtime
+            max_seq_length: Longueur maximale en tokens (troncature au-delà)
+            length_buckets: Longueurs de padding autorisées (None = padding au plus long du lot)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.length_buckets = sorted(
+            b for b in (length_buckets or []) if b <= max_seq_length)
+
+        model_dir = Path(cache_dir) / model_name.replace("/", "__")
+        model_path = export_onnx_model(model_name, model_dir, quantize=quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        # Un seul thread inter-opération : le parallélisme est à l'intérieur des opérateurs
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = resolve_num_threads(num_threads)
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {inp.name for inp in self.session.get_inputs()}
+
+        logger.info(
+            f"ONNX embedding backend ready: {model_path.name} "
+            f"({options.intra_op_num_threads} threads, buckets: {self.length_buckets or 'none'})")
+
+    def _padding_length(self, lengths: List[int]) -> int:
+        longest = max(lengths)
+        for bucket in self.length_buckets:
+            if bucket >= longest:
+                return bucket
+        return min(longest, self.max_seq_length)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length,
+                                 padding=False)
+        padded_length = self._padding_length(
+            [len(ids) for ids in encoded["input_ids"]])
+        encoded = self.tokenizer.pad(encoded, padding="max_length",
+                                     max_length=padded_length, return_tensors="np")
+
+        inputs = {name: encoded[name].astype(np.int64)
+                  for name in self.input_names if name in encoded}
+        if "token_type_ids" in self.input_names and "token_type_ids" not in inputs:
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+        hidden = self.session.run(None, inputs)[0]
+
+        # Pooling moyen sur les tokens réels puis normalisation L2
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / \
+            np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.clip(np.linalg.norm(
+            pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Calcule les embeddings d'une liste de textes."""
+        if not texts:
+            return []
+
+        # Trier par longueur pour regrouper des textes de taille proche dans un même lot
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_indices = order[start:start + self.batch_size]
+            embeddings = self._embed_batch(
+                [texts[i] for i in batch_indices])
+            for i, vector in zip(batch_indices, embeddings):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Calcule l'embedding d'une requête."""
+        return self.embed_documents([text])[0]
@@ -2,6 +2,10 @@ import os
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
+from langchain.retrievers import ContextualCompressionRetriever
+from embedding import ChunkRetriever, get_shards
+from llm_pool import get_llm_pool, PooledChatModel
+from rerank import TopNReranker
 from logger import logger
 from constants import (
     DEFAULT_RETRIEVER_TOP_K, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP,
@@ -9,7 +13,8 @@ from constants import (
     ERROR_MISSING_TEXT_FIELD, ERROR_MISSING_ID_FIELD,
     ERROR_INVALID_JSON, ERROR_PROCESSING_LINE,
     MSG_LOADING_DOCUMENTS, MSG_LOADED_DOCUMENTS,
-    DEFAULT_LM_STUDIO_URL, DEFAULT_MODEL_NAME, DEFAULT_TEMPERATURE
+    DEFAULT_LM_STUDIO_URL, DEFAULT_MODEL_NAME, DEFAULT_TEMPERATURE,
+    DEFAULT_RERANK_CANDIDATES
 )
 
 
@@ -17,9 +22,18 @@ def get_llm():
     """
     Initialise et configure le modèle de langage via LM Studio.
 
+    Si LM_STUDIO_URLS liste plusieurs serveurs, les requêtes sont réparties
+    entre eux par le pool partagé (voir llm_pool.py).
+
     Returns:
-        ChatOpenAI: Instance du modèle de langage configurée
+        BaseChatModel: Instance du modèle de langage configurée
     """
+    pool = get_llm_pool()
+    if pool is not None:
+        logger.info(
+            f"Connecting to LLM pool: {', '.join(e.url for e in pool.endpoints)}")
+        return PooledChatModel(pool=pool)
+
     # Utilisation d'une clé API factice si LM Studio n'en a pas besoin
     api_key = os.getenv("LM_STUDIO_API_KEY", "NotNeeded")
     base_url = os.getenv("LM_STUDIO_URL", DEFAULT_LM_STUDIO_URL)
@@ -37,13 +51,122 @@ def get_llm():
     )
 
 
-def setup_rag_pipeline(vector_store, k=DEFAULT_RETRIEVER_TOP_K):
+def build_query_with_history(query, history):
+    """
+    Ajoute l'historique condensé de la conversation à une question de suivi.
+
+    Le résultat est destiné au prompt uniquement : la récupération se fait
+    avec la question seule, pour que l'historique ne déplace pas la recherche
+    vers les sujets des échanges précédents.
+
+    Args:
+        query: Question de l'utilisateur
+        history: Historique condensé (voir SessionStore.build_history)
+
+    Returns:
+        str: Question enrichie de l'historique, ou la question seule sans historique
+    """
+    if not history:
+        return query
+    return f"{query}\n\nPrevious conversation (for context):\n{history}"
+
+
+def generate_answer(rag_chain, question, documents):
+    """
+    Génère une réponse à partir de documents déjà récupérés, sans nouvelle recherche.
+
+    Args:
+        rag_chain: La chaîne RAG configurée par setup_rag_pipeline
+        question: Question de l'utilisateur
+        documents: Chunks à utiliser comme contexte
+
+    Returns:
+        str: La réponse générée
+    """
+    result = rag_chain.combine_documents_chain.invoke(
+        {"input_documents": documents, "question": question})
+    return result.get("output_text", "No answer generated")
+
+
+def build_retriever(vector_store, k=DEFAULT_RETRIEVER_TOP_K, reranker=None,
+                    candidates=DEFAULT_RERANK_CANDIDATES):
+    """
+    Construit le retriever du pipeline, avec une étape de re-ranking optionnelle.
+
+    Args:
+        vector_store: La base de données vectorielle
+        k: Nombre de chunks à conserver pour le prompt
+        reranker: Re-ranker optionnel (ex: CrossEncoderReranker)
+        candidates: Nombre de candidats récupérés avant re-ranking
+
+    Returns:
+        BaseRetriever: Le retriever configuré
+    """
+    shards = get_shards(vector_store)
+    if len(shards) > 1:
+        logger.info(
+            f"Sharded retrieval: scatter-gather over {len(shards)} shards "
+            f"(shard timeout: {vector_store.shard_timeout}s)")
+
+    if reranker is None:
+        # Récupérer les k chunks les plus pertinents
+        return ChunkRetriever(vector_store=vector_store, search_kwargs={"k": k})
+
+    # Récupérer un ensemble élargi de candidats, puis ne garder que les k meilleurs.
+    # Le re-ranker est partagé entre collections : k est propre à ce retriever.
+    logger.info(
+        f"Re-ranking enabled: {max(candidates, k)} candidates -> top {k} ({reranker.model_name})")
+    return ContextualCompressionRetriever(
+        base_compressor=TopNReranker(reranker=reranker, top_n=k),
+        base_retriever=ChunkRetriever(
+            vector_store=vector_store, search_kwargs={"k": max(candidates, k)})
+    )
+
+
+def get_reranker(rag_chain):
+    """Retourne le re-ranker de la chaîne RAG (avec son top_n), ou None si le re-ranking est désactivé."""
+    return getattr(rag_chain.retriever, "base_compressor", None)
+
+
+def get_search_k(rag_chain):
+    """Retourne le nombre de chunks demandés à la base vectorielle par la chaîne RAG."""
+    retriever = getattr(rag_chain.retriever, "base_retriever", rag_chain.retriever)
+    return retriever.search_kwargs.get("k", DEFAULT_RETRIEVER_TOP_K)
+
+
+def stream_answer(rag_chain, question, documents):
+    """
+    Génère la réponse morceau par morceau à partir de documents déjà récupérés.
+
+    Utilise le même prompt et le même formatage du contexte que la chaîne RAG,
+    ce qui permet de conserver une réponse partielle si la génération est interrompue.
+
+    Args:
+        rag_chain: La chaîne RAG configurée par setup_rag_pipeline
+        question: Question de l'utilisateur
+        documents: Chunks à utiliser comme contexte
+
+    Yields:
+        str: Morceaux successifs de la réponse
+    """
+    llm_chain = rag_chain.combine_documents_chain.llm_chain
+    context = "\n\n".join(doc.page_content for doc in documents)
+    prompt_text = llm_chain.prompt.format(context=context, question=question)
+    for chunk in llm_chain.llm.stream(prompt_text):
+        yield chunk.content
+
+
+def setup_rag_pipeline(vector_store, k=DEFAULT_RETRIEVER_TOP_K, reranker=None,
+                       candidates=DEFAULT_RERANK_CANDIDATES):
     """
     Configure le pipeline RAG avec le vector store fourni.
 
     Args:
         vector_store: La base de données vectorielle pour la récupération de contexte
+            (Chroma ou ShardedVectorStore)
         k: Nombre de documents à récupérer par requête (par défaut: 3)
+        reranker: Re-ranker optionnel appliqué aux candidats récupérés
+        candidates: Nombre de candidats récupérés avant re-ranking
 
     Returns:
         RetrievalQA: La chaîne RAG configurée
@@ -72,11 +195,7 @@ def setup_rag_pipeline(vector_store, k=DEFAULT_RETRIEVER_TOP_K):
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_store.as_retriever(
-            search_type="similarity",
-            # Récupérer les k chunks les plus pertinents
-            search_kwargs={"k": k}
-        ),
+        retriever=build_retriever(vector_store, k, reranker, candidates),
         return_source_documents=True,
         chain_type_kwargs={"prompt": prompt}
     )
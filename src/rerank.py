@@ -0,0 +1,186 @@
+"""
+Re-ranking des chunks récupérés avec un cross-encoder.
+
+Le retriever récupère un ensemble élargi de candidats ; le cross-encoder note
+chaque paire (requête, chunk) en un seul appel par lot et seuls les meilleurs
+chunks sont conservés pour le prompt. Les scores sont mis en cache par
+(hash de la requête, hash du texte du chunk) : le cache reste valide après une
+reconstruction de l'index et peut être partagé entre plusieurs collections.
+Chaque retriever conserve son propre nombre de chunks (voir TopNReranker)
+sans modifier le re-ranker partagé.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+from pydantic import PrivateAttr
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from logger import logger, request_logger
+from constants import (
+    DEFAULT_RERANK_MODEL, DEFAULT_RETRIEVER_TOP_K,
+    DEFAULT_RERANK_BATCH_SIZE, DEFAULT_RERANK_CACHE_SIZE
+)
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class CrossEncoderReranker(BaseDocumentCompressor):
+    """
+    Compresseur de documents LangChain qui re-classe les candidats avec un cross-encoder CPU.
+    """
+
+    model_name: str = DEFAULT_RERANK_MODEL
+    top_n: int = DEFAULT_RETRIEVER_TOP_K
+    batch_size: int = DEFAULT_RERANK_BATCH_SIZE
+    cache_size: int = DEFAULT_RERANK_CACHE_SIZE
+
+    _model: Any = PrivateAttr(default=None)
+    _cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: Dict[str, float] = PrivateAttr(default_factory=lambda: {
+        "scored": 0, "cache_hits": 0, "seconds": 0.0})
+
+    def _get_model(self):
+        # Chargement paresseux : le modèle n'est chargé qu'à la première requête
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info(f"Loading re-ranking model: {self.model_name}")
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks=None) -> Sequence[Document]:
+        """Re-classe les documents candidats et conserve les `top_n` meilleurs."""
+        return self.rerank_batch([query], [list(documents)])[0]
+
+    def rerank_batch(self, queries: List[str], candidate_lists: List[List[Document]],
+                     top_n: Optional[int] = None) -> List[List[Document]]:
+        """
+        Re-classe les candidats de plusieurs requêtes en un seul appel au cross-encoder.
+
+        Args:
+            queries: Requêtes
+            candidate_lists: Chunks candidats pour chaque requête
+            top_n: Nombre de chunks à conserver par requête (par défaut `self.top_n`)
+
+        Returns:
+            List[List[Document]]: Les `top_n` meilleurs chunks de chaque requête,
+            avec leur score dans les métadonnées (`rerank_score`)
+        """
+        if top_n is None:
+            top_n = self.top_n
+        keys = []
+        scores = []
+        pending = []
+        for query, candidates in zip(queries, candidate_lists):
+            query_hash = _hash_text(query)
+            query_keys = []
+            query_scores = []
+            for doc in candidates:
+                key = (query_hash, _hash_text(doc.page_content))
+                score = self._cache_get(key)
+                if score is None:
+                    pending.append((len(scores), len(query_scores), query, doc))
+                query_keys.append(key)
+                query_scores.append(score)
+            keys.append(query_keys)
+            scores.append(query_scores)
+
+        hits = sum(len(query_keys) for query_keys in keys) - len(pending)
+        if pending:
+            start = time.perf_counter()
+            predicted = self._get_model().predict(
+                [(query, doc.page_content) for _, _, query, doc in pending],
+                batch_size=self.batch_size,
+                show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            for (i, j, _, _), score in zip(pending, predicted):
+                scores[i][j] = float(score)
+                self._cache_put(keys[i][j], float(score))
+            self._record(len(pending), hits, elapsed)
+            request_logger.info(
+                f"Re-ranked {len(pending)} candidates in {elapsed * 1000:.1f} ms "
+                f"({elapsed * 1000 / len(pending):.2f} ms/candidate, {hits} cache hits)")
+        else:
+            self._record(0, hits, 0.0)
+
+        results = []
+        for candidates, query_scores in zip(candidate_lists, scores):
+            ranked = sorted(zip(candidates, query_scores),
+                            key=lambda pair: pair[1], reverse=True)
+            results.append([
+                Document(page_content=doc.page_content,
+                         metadata=dict(doc.metadata, rerank_score=score),
+                         id=getattr(doc, 'id', None))
+                for doc, score in ranked[:top_n]
+            ])
+        return results
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Retourne les statistiques cumulées du re-ranking, dont la latence par candidat.
+
+        Returns:
+            Dict[str, float]: Candidats notés, hits du cache, latence moyenne par candidat (ms)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["ms_per_candidate"] = (stats["seconds"] * 1000 / stats["scored"]
+                                     if stats["scored"] else 0.0)
+        return stats
+
+    def clear_cache(self):
+        """Vide le cache des scores."""
+        with self._lock:
+            self._cache.clear()
+
+    def _record(self, scored: int, hits: int, seconds: float):
+        with self._lock:
+            self._stats["scored"] += scored
+            self._stats["cache_hits"] += hits
+            self._stats["seconds"] += seconds
+
+    def _cache_get(self, key) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key, score: float):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+class TopNReranker(BaseDocumentCompressor):
+    """
+    Re-ranker d'un retriever : délègue au re-ranker partagé (modèle et cache
+    communs) en conservant son propre nombre de chunks.
+    """
+
+    reranker: Any
+    top_n: int = DEFAULT_RETRIEVER_TOP_K
+
+    @property
+    def model_name(self) -> str:
+        return self.reranker.model_name
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks=None) -> Sequence[Document]:
+        """Re-classe les documents candidats et conserve les `top_n` meilleurs."""
+        return self.rerank_batch([query], [list(documents)])[0]
+
+    def rerank_batch(self, queries: List[str],
+                     candidate_lists: List[List[Document]]) -> List[List[Document]]:
+        """Re-classe les candidats de plusieurs requêtes (voir CrossEncoderReranker.rerank_batch)."""
+        return self.reranker.rerank_batch(queries, candidate_lists, top_n=self.top_n)
@@ -0,0 +1,221 @@
+"""
+Stockage des sessions de conversation, partagé par la CLI et l'API.
+
+Chaque session conserve une fenêtre bornée des derniers échanges sous forme
+compacte (question, réponse tronquée, identifiants des chunks sources) plutôt
+que les objets Document complets. Une session est liée à la collection
+interrogée lors de son premier échange : ses sources n'ont de sens que dans
+cette collection. Les sessions sont évincées par LRU et par durée
+d'inactivité (TTL).
+"""
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import List, NamedTuple, Optional, Tuple
+from logger import logger
+from constants import (
+    DEFAULT_SESSION_MAX_SESSIONS, DEFAULT_SESSION_TTL, DEFAULT_SESSION_MAX_TURNS,
+    DEFAULT_HISTORY_TOKEN_BUDGET, DEFAULT_HISTORY_ANSWER_CHARS, CHARS_PER_TOKEN
+)
+
+
+class Turn(NamedTuple):
+    """Un échange de conversation sous forme compacte."""
+    query: str
+    answer: str
+    source_ids: Tuple[str, ...]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estime le nombre de tokens d'un texte à partir de sa longueur."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class SessionCollectionMismatch(ValueError):
+    """Levée quand une session est utilisée avec une autre collection que la sienne."""
+
+    def __init__(self, session_id: str, collection: str, requested: str):
+        super().__init__(
+            f"Session {session_id} belongs to collection '{collection}', "
+            f"not '{requested}'")
+        self.session_id = session_id
+        self.collection = collection
+        self.requested = requested
+
+
+class Session:
+    """Fenêtre bornée des derniers échanges d'une conversation."""
+
+    def __init__(self, session_id: str, max_turns: int = DEFAULT_SESSION_MAX_TURNS,
+                 collection: Optional[str] = None):
+        self.session_id = session_id
+        self.collection = collection
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+
+    @property
+    def last_turn(self) -> Optional[Turn]:
+        return self.turns[-1] if self.turns else None
+
+
+class SessionStore:
+    """
+    Stockage thread-safe des sessions avec éviction LRU et TTL.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_SESSION_MAX_SESSIONS,
+                 ttl: float = DEFAULT_SESSION_TTL,
+                 max_turns: int = DEFAULT_SESSION_MAX_TURNS,
+                 max_answer_chars: int = DEFAULT_HISTORY_ANSWER_CHARS):
+        """
+        Initialise le stockage des sessions.
+
+        Args:
+            max_sessions: Nombre maximal de sessions conservées
+            ttl: Durée d'inactivité (en secondes) après laquelle une session expire
+            max_turns: Nombre d'échanges conservés par session
+            max_answer_chars: Longueur maximale d'une réponse stockée
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_answer_chars = max_answer_chars
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def get_or_create(self, session_id: Optional[str] = None,
+                      collection: Optional[str] = None) -> Session:
+        """
+        Retourne la session demandée, ou en crée une nouvelle si elle n'existe pas.
+
+        Args:
+            session_id: Identifiant de session (un nouvel identifiant est généré si absent)
+            collection: Collection interrogée ; une session qui n'est encore liée à
+                aucune collection y est liée
+
+        Returns:
+            Session: La session
+
+        Raises:
+            SessionCollectionMismatch: Si la session est liée à une autre collection
+        """
+        with self._lock:
+            self._evict_expired()
+            session = self._touch(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex,
+                                  max_turns=self.max_turns, collection=collection)
+                self._sessions[session.session_id] = session
+                self._evict_overflow()
+            elif collection is not None:
+                if session.collection is None:
+                    session.collection = collection
+                elif session.collection != collection:
+                    raise SessionCollectionMismatch(
+                        session.session_id, session.collection, collection)
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Retourne une session existante, ou None si elle est inconnue ou expirée."""
+        with self._lock:
+            self._evict_expired()
+            return self._touch(session_id)
+
+    def add_turn(self, session_id: str, query: str, answer: str, source_ids: List[str],
+                 collection: Optional[str] = None) -> Session:
+        """
+        Enregistre un échange dans la session (créée si nécessaire).
+
+        Args:
+            session_id: Identifiant de session
+            query: Question de l'utilisateur
+            answer: Réponse générée
+            source_ids: Identifiants des chunks utilisés comme contexte
+            collection: Collection dans laquelle les sources ont été récupérées
+
+        Returns:
+            Session: La session mise à jour
+
+        Raises:
+            SessionCollectionMismatch: Si la session est liée à une autre collection
+        """
+        session = self.get_or_create(session_id, collection=collection)
+        if len(answer) > self.max_answer_chars:
+            answer = answer[:self.max_answer_chars] + "..."
+        turn = Turn(query, answer, tuple(str(source_id)
+                    for source_id in source_ids if source_id))
+        with self._lock:
+            session.turns.append(turn)
+        return session
+
+    def get_last_source_ids(self, session_id: str) -> Optional[List[str]]:
+        """
+        Retourne les identifiants des sources du dernier échange de la session.
+
+        Returns:
+            Optional[List[str]]: Identifiants des chunks, ou None si la session est inconnue
+        """
+        session = self.get(session_id)
+        if session is None:
+            return None
+        last_turn = session.last_turn
+        return list(last_turn.source_ids) if last_turn else []
+
+    def build_history(self, session_id: Optional[str],
+                      token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET) -> str:
+        """
+        Construit un historique condensé qui tient dans le budget de tokens.
+
+        Les échanges les plus récents sont prioritaires ; les plus anciens sont
+        abandonnés dès que le budget est atteint.
+
+        Args:
+            session_id: Identifiant de session
+            token_budget: Nombre maximal de tokens (estimé) de l'historique
+
+        Returns:
+            str: Historique condensé, ou chaîne vide s'il n'y a pas d'historique
+        """
+        session = self.get(session_id) if session_id else None
+        if session is None:
+            return ""
+
+        lines = []
+        used = 0
+        with self._lock:
+            turns = list(session.turns)
+        for turn in reversed(turns):
+            entry = f"User: {turn.query}\nAssistant: {turn.answer}"
+            cost = estimate_tokens(entry)
+            if used + cost > token_budget:
+                break
+            lines.append(entry)
+            used += cost
+        return "\n".join(reversed(lines))
+
+    def _touch(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_expired(self):
+        # Les sessions les moins récemment utilisées sont en tête de l'OrderedDict
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl:
+                break
+            del self._sessions[session_id]
+            logger.debug(f"Session {session_id} expired")
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            session_id, _ = self._sessions.popitem(last=False)
+            logger.debug(f"Session {session_id} evicted (LRU)")
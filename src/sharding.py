@@ -0,0 +1,269 @@
+"""
+Index vectoriel partitionné en shards avec recherche scatter-gather.
+
+Les chunks sont répartis entre N shards par hachage de leur identifiant. Une
+recherche interroge tous les shards en parallèle (top-k par shard), puis
+fusionne les résultats partiels en un top-k global. Un shard qui ne répond pas
+dans le délai imparti est ignoré : le résultat est dégradé plutôt que bloqué.
+
+Chaque shard a ses propres workers et un nombre borné de requêtes en cours :
+un shard lent ou bloqué n'occupe que ses propres workers, et son délai ne court
+qu'à partir du début effectif de sa requête.
+"""
+import heapq
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+from chunk_store import ChunkStore
+from logger import logger, request_logger
+from constants import DEFAULT_SHARD_TIMEOUT, DEFAULT_SHARD_MAX_IN_FLIGHT
+
+
+def shard_for(chunk_id: str, num_shards: int) -> int:
+    """Retourne le shard d'un chunk (hachage stable d'une exécution à l'autre)."""
+    return zlib.crc32(chunk_id.encode("utf-8")) % num_shards
+
+
+def partition_chunks(chunk_store: ChunkStore, num_shards: int) -> List[ChunkStore]:
+    """
+    Répartit les chunks d'un stockage entre `num_shards` stockages, en conservant
+    leurs identifiants.
+
+    Returns:
+        List[ChunkStore]: Un stockage par shard
+    """
+    shards = [ChunkStore() for _ in range(num_shards)]
+    for position, chunk_id in enumerate(chunk_store.ids):
+        shards[shard_for(chunk_id, num_shards)].add(
+            chunk_store.text(position), chunk_store.metadata(position), chunk_id=chunk_id)
+    return shards
+
+
+class LocalShard:
+    """
+    Shard servi dans le processus par une collection Chroma et son stockage de chunks.
+
+    Un shard distant doit exposer les mêmes méthodes `query`, `hydrate` et `count`.
+    """
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+
+    def query(self, query_vectors, k: int) -> List[List[Tuple[float, str]]]:
+        """Retourne, pour chaque requête, les k couples (distance, identifiant) les plus proches."""
+        results = self.vector_store._collection.query(
+            query_embeddings=query_vectors,
+            n_results=k,
+            include=["distances"]
+        )
+        return [list(zip(distances, ids))
+                for ids, distances in zip(results['ids'], results['distances'])]
+
+    def hydrate(self, chunk_ids) -> List[Any]:
+        """Construit les Document des chunks demandés."""
+        return self.vector_store.chunk_store.hydrate(chunk_ids)
+
+    def count(self) -> int:
+        """Nombre de chunks du shard."""
+        return self.vector_store._collection.count()
+
+
+class _ShardCall:
+    """Requête en cours sur un shard, avec l'instant où elle a réellement démarré."""
+
+    __slots__ = ("index", "submitted", "started", "future")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.submitted = time.monotonic()
+        self.started = None
+        self.future = None
+
+    def deadline(self, timeout: float) -> float:
+        # Une requête pas encore démarrée est bornée depuis sa soumission : avec
+        # des workers réservés par slot, cela n'arrive que si le shard est saturé
+        return (self.started or self.submitted) + timeout
+
+
+class ShardedVectorStore:
+    """
+    Ensemble de shards interrogés en parallèle comme un seul index.
+    """
+
+    def __init__(self, shards: List[Any], embeddings, shard_timeout: float = DEFAULT_SHARD_TIMEOUT,
+                 per_shard_k: Optional[int] = None,
+                 max_in_flight: int = DEFAULT_SHARD_MAX_IN_FLIGHT):
+        """
+        Args:
+            shards: Shards (LocalShard ou équivalent distant), dans l'ordre de partition
+            embeddings: Modèle d'embedding partagé par tous les shards
+            shard_timeout: Délai maximal d'une requête sur un shard, à partir de
+                son démarrage (secondes)
+            per_shard_k: Nombre de résultats demandés à chaque shard (défaut: k global)
+            max_in_flight: Nombre maximal de requêtes en cours par shard ; au-delà,
+                le shard est ignoré pour la recherche
+        """
+        self.shards = shards
+        self.embeddings = embeddings
+        self.shard_timeout = shard_timeout
+        self.per_shard_k = per_shard_k
+        self.max_in_flight = max_in_flight
+        # Un worker par slot : une requête admise démarre sans attendre
+        self._executors = [
+            ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f"shard-{i}")
+            for i in range(len(shards))]
+        self._slots = [threading.BoundedSemaphore(max_in_flight) for _ in shards]
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "degraded": 0,
+                       "timeouts": [0] * len(shards), "errors": [0] * len(shards),
+                       "busy": [0] * len(shards)}
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def search_by_vectors(self, query_vectors, k: int) -> List[List[Any]]:
+        """
+        Interroge tous les shards en parallèle et fusionne les top-k partiels.
+
+        Args:
+            query_vectors: Embeddings des requêtes
+            k: Nombre de chunks à renvoyer par requête
+
+        Returns:
+            List[List[Document]]: Chunks récupérés pour chaque requête, par distance croissante
+        """
+        shard_k = min(self.per_shard_k or k, k)
+        start = time.perf_counter()
+        calls = []
+        missing = 0
+        for i in range(len(self.shards)):
+            call = self._submit(i, query_vectors, shard_k)
+            if call is None:
+                missing += 1
+            else:
+                calls.append(call)
+
+        partials = []
+        pending = {call.future: call for call in calls}
+        while pending:
+            now = time.monotonic()
+            for future, call in list(pending.items()):
+                if not future.done() and now >= call.deadline(self.shard_timeout):
+                    # La requête continue dans son worker, mais n'occupe qu'un slot de son shard
+                    del pending[future]
+                    future.cancel()
+                    missing += 1
+                    with self._lock:
+                        self._stats["timeouts"][call.index] += 1
+                    logger.warning(
+                        f"Shard {call.index} did not answer within "
+                        f"{self.shard_timeout:.2f}s, skipping it")
+            if not pending:
+                break
+            next_deadline = min(call.deadline(self.shard_timeout) for call in pending.values())
+            done, _ = wait(list(pending), timeout=max(0.0, next_deadline - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                call = pending.pop(future)
+                try:
+                    partials.append((call.index, future.result()))
+                except Exception as e:
+                    missing += 1
+                    with self._lock:
+                        self._stats["errors"][call.index] += 1
+                    logger.warning(f"Shard {call.index} search failed: {str(e)}")
+
+        if not partials:
+            raise RuntimeError("No shard answered the search")
+
+        with self._lock:
+            self._stats["searches"] += 1
+            if missing:
+                self._stats["degraded"] += 1
+
+        # Fusion : top-k global sur les distances, puis hydratation par shard
+        results = []
+        for q in range(len(query_vectors)):
+            candidates = [(distance, chunk_id, i)
+                          for i, per_query in partials for distance, chunk_id in per_query[q]]
+            top = heapq.nsmallest(k, candidates)
+            by_shard = {}
+            for _, chunk_id, i in top:
+                by_shard.setdefault(i, []).append(chunk_id)
+            hydrated = {}
+            for i, chunk_ids in by_shard.items():
+                for doc in self.shards[i].hydrate(chunk_ids):
+                    hydrated[doc.id] = doc
+            results.append([hydrated[chunk_id] for _, chunk_id, _ in top if chunk_id in hydrated])
+
+        request_logger.info(
+            f"Scatter-gather over {len(partials)}/{len(self.shards)} shards took "
+            f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        return results
+
+    def _submit(self, i: int, query_vectors, k: int) -> Optional[_ShardCall]:
+        """Lance la requête sur le shard i, ou retourne None si tous ses slots sont occupés."""
+        slots = self._slots[i]
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["busy"][i] += 1
+            logger.warning(
+                f"Shard {i} already has {self.max_in_flight} searches in flight, skipping it")
+            return None
+
+        call = _ShardCall(i)
+
+        def run():
+            call.started = time.monotonic()
+            try:
+                return self.shards[i].query(query_vectors, k)
+            finally:
+                slots.release()
+
+        try:
+            call.future = self._executors[i].submit(run)
+        except Exception:
+            slots.release()
+            raise
+        return call
+
+    def get_by_ids(self, chunk_ids) -> List[Any]:
+        """Récupère des chunks par identifiant auprès du shard qui les détient."""
+        by_shard = {}
+        for chunk_id in chunk_ids:
+            by_shard.setdefault(shard_for(chunk_id, len(self.shards)), []).append(chunk_id)
+        hydrated = {}
+        for i, ids in by_shard.items():
+            for doc in self.shards[i].hydrate(ids):
+                hydrated[doc.id] = doc
+        return [hydrated[chunk_id] for chunk_id in chunk_ids if chunk_id in hydrated]
+
+    def count(self) -> int:
+        """Nombre total de chunks indexés."""
+        return sum(shard.count() for shard in self.shards)
+
+    def close(self):
+        """Arrête les workers des shards ; les requêtes encore en cours se terminent seules."""
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retourne les statistiques de recherche.
+
+        Returns:
+            Dict[str, Any]: Nombre de shards, recherches, recherches dégradées,
+            timeouts, erreurs et refus (slots occupés) par shard
+        """
+        with self._lock:
+            return {
+                "num_shards": len(self.shards),
+                "shard_timeout": self.shard_timeout,
+                "searches": self._stats["searches"],
+                "degraded": self._stats["degraded"],
+                "timeouts": list(self._stats["timeouts"]),
+                "errors": list(self._stats["errors"]),
+                "busy": list(self._stats["busy"]),
+            }
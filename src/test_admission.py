@@ -0,0 +1,105 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from admission import AdmissionController, AdmissionRejected  # noqa: E402
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Test the bounded admission layer in front of the LLM stage"""
+
+    def test_limits_in_flight(self):
+        """No more than max_in_flight slots are held at once"""
+        controller = AdmissionController(max_in_flight=2, max_queue=10, queue_timeout=5)
+        peak = []
+        active = [0]
+        lock = threading.Lock()
+
+        def work():
+            with controller.slot():
+                with lock:
+                    active[0] += 1
+                    peak.append(active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(controller.get_metrics()["admitted_total"], 8)
+
+    def test_queue_full_is_rejected_with_429(self):
+        """A request arriving on a full queue is rejected immediately"""
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=5)
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire()
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_wait_timeout_is_rejected_with_503(self):
+        """A queued request gives up after its timeout"""
+        controller = AdmissionController(max_in_flight=1, max_queue=5)
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire(timeout=0.05)
+        self.assertEqual(ctx.exception.status_code, 503)
+        metrics = controller.get_metrics()
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["rejected_total"]["timeout"], 1)
+
+    def test_interactive_served_before_batch(self):
+        """Queued interactive requests are admitted before queued batch requests"""
+        controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5)
+        controller.acquire()
+        order = []
+
+        def wait_for_slot(priority):
+            with controller.slot(priority):
+                order.append(priority)
+
+        batch = threading.Thread(target=wait_for_slot, args=("batch",))
+        batch.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=wait_for_slot, args=("interactive",))
+        interactive.start()
+        time.sleep(0.05)
+        controller.release()
+        batch.join()
+        interactive.join()
+        self.assertEqual(order, ["interactive", "batch"])
+
+    def test_interactive_preempts_queued_batch(self):
+        """On a full queue, an interactive request evicts a queued batch request"""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        controller.acquire()
+        errors = []
+
+        def batch_request():
+            try:
+                controller.acquire("batch")
+            except AdmissionRejected as e:
+                errors.append(e.status_code)
+
+        batch = threading.Thread(target=batch_request)
+        batch.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=controller.acquire, args=("interactive",))
+        interactive.start()
+        batch.join(timeout=1)
+        self.assertEqual(errors, [503])
+        controller.release()
+        interactive.join(timeout=1)
+        self.assertEqual(controller.get_metrics()["in_flight"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
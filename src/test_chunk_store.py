@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from chunk_store import ChunkStore, normalize_metadata  # noqa: E402
+
+
+class TestChunkStore(unittest.TestCase):
+    """Test the columnar chunk store"""
+
+    def test_round_trip_text_and_metadata(self):
+        """Texts and normalized metadata are returned unchanged for each chunk"""
+        store = ChunkStore()
+        store.add("first chunk", {"id": "a", "year": 2020, "score": 0.5})
+        store.add("second", {"id": "a", "draft": True, "tags": ["x", "y"]})
+        store.add("", None)
+
+        self.assertEqual(store.ids, ["a-0", "a-1", "chunk-2"])
+        self.assertEqual(store.get("a-0"), ("first chunk", {
+            "id": "a", "year": 2020, "score": 0.5, "chunk_id": "a-0"}))
+        self.assertEqual(store.get("a-1"), ("second", {
+            "id": "a", "draft": True, "tags": '["x", "y"]', "chunk_id": "a-1"}))
+        self.assertEqual(store.get("chunk-2"), ("", {"chunk_id": "chunk-2"}))
+        self.assertIsNone(store.get("missing"))
+
+    def test_mixed_column_types_are_promoted(self):
+        """A key holding ints then floats or strings keeps every value"""
+        store = ChunkStore()
+        store.add("a", {"value": 1})
+        store.add("b", {"value": 2.5})
+        store.add("c", {"value": "n/a"})
+        self.assertEqual([store.metadata(i)["value"] for i in range(3)], [1, 2.5, "n/a"])
+
+    def test_save_and_load(self):
+        """A saved store is reloaded identically"""
+        store = ChunkStore()
+        for i in range(5):
+            store.add(f"text {i}", {"id": str(i % 2), "page": i, "source": "doc.jsonl"})
+        with tempfile.TemporaryDirectory() as directory:
+            store.save(directory)
+            loaded = ChunkStore.load(directory)
+        self.assertEqual(loaded.ids, store.ids)
+        for chunk_id in store.ids:
+            self.assertEqual(loaded.get(chunk_id), store.get(chunk_id))
+
+    def test_normalize_metadata(self):
+        """Nested dicts are flattened and None values dropped"""
+        self.assertEqual(
+            normalize_metadata({"author": {"name": "x", "tags": ["y"]}, "empty": None}),
+            {"author_name": "x"})
+        self.assertEqual(normalize_metadata("raw"), {"content": "raw"})
+
+
+if __name__ == "__main__":
+    unittest.main()
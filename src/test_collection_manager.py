@@ -0,0 +1,165 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from collection_manager import Collection, CollectionManager, UnknownCollection  # noqa: E402
+
+_MB = 1024 * 1024
+
+
+class TestCollectionManager(unittest.TestCase):
+    """Test lazy opening and LRU eviction of named collections"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.default_path = os.path.join(self.root, "db")
+        self.collections_path = os.path.join(self.root, "collections")
+        for path in (self.default_path, os.path.join(self.collections_path, "a"),
+                     os.path.join(self.collections_path, "b")):
+            os.makedirs(path)
+        self.opened = []
+        self.closed = []
+        self.last_copies = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def open_collection(self, name, path, documents=None):
+        self.opened.append((name, documents))
+        if documents is not None:
+            # A build writes its documents into the given directory
+            os.makedirs(path)
+            with open(os.path.join(path, "documents"), "w") as file:
+                file.write(" ".join(documents))
+        return Collection(name, vector_store=path, rag_chain=None, memory=40 * _MB)
+
+    def documents(self, name):
+        with open(os.path.join(self.collections_path, name, "documents")) as file:
+            return file.read()
+
+    def close_collection(self, collection, last_copy):
+        self.closed.append(collection.name)
+        self.last_copies.append(last_copy)
+
+    def manager(self, budget_mb=100):
+        return CollectionManager(self.default_path, self.collections_path,
+                                 self.open_collection, memory_budget_mb=budget_mb,
+                                 close_collection=self.close_collection)
+
+    def test_opened_once_on_first_use(self):
+        """A collection is opened on its first request only, from its own directory"""
+        manager = self.manager()
+        self.assertEqual(manager.names(), ["default", "a", "b"])
+        self.assertEqual(self.opened, [])
+        self.assertEqual(manager.acquire("a").vector_store, os.path.join(self.collections_path, "a"))
+        manager.acquire("a")
+        self.assertEqual(manager.acquire().vector_store, self.default_path)
+        self.assertEqual(self.opened, [("a", None), ("default", None)])
+
+    def test_unknown_and_invalid_names(self):
+        """Unknown collections and unsafe names are rejected without opening anything"""
+        manager = self.manager()
+        with self.assertRaises(UnknownCollection):
+            manager.acquire("missing")
+        for name in ("../db", "", "a/b", "x" * 65):
+            with self.assertRaises(ValueError):
+                manager.acquire(name)
+        self.assertEqual(self.opened, [])
+        self.assertEqual(manager._load_locks, {})
+
+    def test_least_recently_used_is_evicted(self):
+        """Going over the memory budget closes the least recently used collection"""
+        manager = self.manager(budget_mb=100)
+        manager.acquire("default")
+        manager.acquire("a")
+        manager.acquire("default")
+        manager.acquire("b")
+        self.assertEqual(list(manager.loaded()), ["default", "b"])
+        self.assertEqual(manager.get_stats()["evictions"], 1)
+        # "a" is still used by the request that acquired it
+        self.assertEqual(self.closed, [])
+        manager.acquire("a")
+        self.assertEqual(self.opened.count(("a", None)), 2)
+
+    def test_build_replaces_only_its_collection(self):
+        """Building a collection leaves the other loaded collections in place"""
+        manager = self.manager()
+        default = manager.acquire("default")
+        built = manager.build("c", ["doc"])
+        self.assertIs(manager.acquire("default"), default)
+        self.assertEqual(self.opened[-2:], [("c", ["doc"]), ("c", None)])
+        self.assertEqual(built.vector_store, os.path.join(self.collections_path, "c"))
+        self.assertEqual(self.documents("c"), "doc")
+        self.assertEqual(list(manager.loaded()), ["c", "default"])
+        self.assertEqual(sorted(os.listdir(self.collections_path)), ["a", "b", "c"])
+
+    def test_evicted_collection_closed_after_last_release(self):
+        """An evicted collection is closed once the requests using it are done"""
+        manager = self.manager(budget_mb=50)
+        with manager.use("a") as first:
+            manager.release(manager.acquire("b"))
+            self.assertNotIn("a", manager.loaded())
+            self.assertEqual(self.closed, [])
+            self.assertEqual(first.name, "a")
+        self.assertEqual(self.closed, ["a"])
+        manager.release(manager.acquire("default"))
+        self.assertEqual(self.closed, ["a", "b"])
+
+    def test_shared_resources_released_with_last_copy(self):
+        """An evicted copy still in use does not release what a reopened copy shares"""
+        manager = self.manager(budget_mb=50)
+        first = manager.acquire("a")
+        manager.release(manager.acquire("b"))
+        second = manager.acquire("a")
+        self.assertIsNot(first, second)
+        self.assertEqual(second.path, first.path)
+        manager.release(first)
+        self.assertEqual(list(zip(self.closed, self.last_copies)), [("b", True), ("a", False)])
+        manager.release(second)
+        manager.release(manager.acquire("b"))
+        self.assertEqual(list(zip(self.closed, self.last_copies))[-1], ("a", True))
+        self.assertEqual(manager._copies, {os.path.join(self.collections_path, "b"): 1})
+
+    def test_rebuild_waits_for_requests_on_the_served_collection(self):
+        """A rebuild never rewrites the directory of a collection still in use"""
+        manager = self.manager()
+        manager.build("a", ["v1"])
+        served = manager.acquire("a")
+        rebuilt = []
+        builder = threading.Thread(
+            target=lambda: rebuilt.append(manager.build("a", ["v2"])), daemon=True)
+        builder.start()
+        builder.join(0.2)
+        # The new version is built aside while the old one keeps serving
+        self.assertTrue(builder.is_alive())
+        self.assertEqual(self.documents("a"), "v1")
+        # Only the two staging copies are closed so far
+        self.assertEqual(self.closed.count("a"), 2)
+
+        manager.release(served)
+        builder.join(2.0)
+        self.assertFalse(builder.is_alive())
+        self.assertEqual(self.documents("a"), "v2")
+        self.assertEqual(self.closed.count("a"), 3)
+        self.assertIs(manager.acquire("a"), rebuilt[0])
+        self.assertEqual(sorted(os.listdir(self.collections_path)), ["a", "b"])
+
+    def test_failed_build_leaves_the_served_collection(self):
+        """A build that fails keeps the current version and removes its staging directory"""
+        manager = self.manager()
+        manager.build("a", ["v1"])
+        served = manager.acquire("a")
+        with self.assertRaises(TypeError):
+            manager.build("a", [1])
+        self.assertIs(manager.acquire("a"), served)
+        self.assertEqual(self.documents("a"), "v1")
+        self.assertEqual(sorted(os.listdir(self.collections_path)), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from dedup import (  # noqa: E402
+    MinHasher, _hash32, deduplicate_documents, get_duplicate_ids, normalize_text, shingles
+)
+
+BASE_TEXT = (
+    "The city council approved the new public transport plan on Monday, "
+    "adding three bus lines, extending tram service hours until midnight and "
+    "lowering fares for students and retirees starting next spring."
+)
+
+
+def make_doc(doc_id, text):
+    return SimpleNamespace(page_content=text, metadata={"id": doc_id})
+
+
+class TestDeduplication(unittest.TestCase):
+    """Test exact and near-duplicate elimination at ingest"""
+
+    def test_exact_duplicates_are_dropped(self):
+        """Texts differing only by case and whitespace are exact duplicates"""
+        docs = [make_doc("1", BASE_TEXT), make_doc("2", "  " + BASE_TEXT.upper())]
+        kept, stats = deduplicate_documents(docs, threshold=0)
+        self.assertEqual([doc.metadata["id"] for doc in kept], ["1"])
+        self.assertEqual(stats["exact"], 1)
+
+    def test_near_duplicates_keep_provenance(self):
+        """A republished copy with a small edit is dropped and recorded on the survivor"""
+        republished = BASE_TEXT.replace("Monday", "Monday evening")
+        unrelated = "Recipe: whisk two eggs with flour and milk, then rest the batter for an hour."
+        docs = [make_doc("1", BASE_TEXT), make_doc("2", republished), make_doc("3", unrelated)]
+        kept, stats = deduplicate_documents(docs, threshold=0.6)
+        self.assertEqual([doc.metadata["id"] for doc in kept], ["1", "3"])
+        self.assertEqual(stats["near"], 1)
+        self.assertEqual(get_duplicate_ids(kept[0].metadata), ["2"])
+        self.assertEqual(kept[0].metadata["duplicate_count"], 1)
+
+    def test_caller_documents_are_not_modified(self):
+        """Provenance is added to a copy of the kept document, not to the caller's"""
+        original = make_doc("1", BASE_TEXT)
+        kept, _ = deduplicate_documents([original, make_doc("2", BASE_TEXT)], threshold=0)
+        self.assertIsNot(kept[0], original)
+        self.assertEqual(original.metadata, {"id": "1"})
+        self.assertEqual(get_duplicate_ids(kept[0].metadata), ["2"])
+
+    def test_chunk_duplicates_use_their_own_key(self):
+        """Chunk-level duplicates are not recorded as duplicate documents"""
+        chunks = [make_doc("1", BASE_TEXT), make_doc("2", BASE_TEXT)]
+        chunks[1].metadata["duplicate_ids"] = ["3"]
+        kept, _ = deduplicate_documents(chunks, threshold=0, label="chunk")
+        self.assertEqual(get_duplicate_ids(kept[0].metadata), [])
+        self.assertEqual(get_duplicate_ids(kept[0].metadata, "chunk_duplicate_ids"), ["2"])
+        self.assertEqual(kept[0].metadata["chunk_duplicate_count"], 1)
+
+    def test_signature_matches_permutation_minimum(self):
+        """The vectorized signature is the minimum of each universal hash"""
+        hasher = MinHasher(num_perm=16)
+        shingle_set = shingles(normalize_text(BASE_TEXT))
+        hashes = [_hash32(s) for s in shingle_set]
+        expected = [min((int(a) * h + int(b)) % ((1 << 61) - 1) for h in hashes)
+                    for a, b in zip(hasher._a[:, 0], hasher._b[:, 0])]
+        self.assertEqual([int(v) for v in hasher.signature(shingle_set)], expected)
+
+    def test_distinct_texts_are_kept(self):
+        """Unrelated texts are never merged"""
+        docs = [make_doc(str(i), f"Document number {i} talks about topic {i * 7} in detail.")
+                for i in range(20)]
+        kept, stats = deduplicate_documents(docs)
+        self.assertEqual(len(kept), 20)
+        self.assertEqual(stats["exact"] + stats["near"], 0)
+
+    def test_persisted_duplicate_ids_are_decoded(self):
+        """Duplicate IDs stored as JSON in the vector store are decoded"""
+        self.assertEqual(get_duplicate_ids({"duplicate_ids": '["4", "7"]'}), ["4", "7"])
+        self.assertEqual(get_duplicate_ids({}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import ingest  # noqa: E402
+from ingest import IngestionPipeline, load_checkpoint  # noqa: E402
+
+
+class FakeEmbeddings:
+    """Embedding model returning one-dimensional vectors"""
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+
+def _matches(metadata, where):
+    if "$or" in where:
+        return any(_matches(metadata, clause) for clause in where["$or"])
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    (key, condition), = where.items()
+    if isinstance(condition, dict):
+        return key in metadata and metadata[key] >= condition["$gte"]
+    return metadata.get(key) == condition
+
+
+class FakeCollection:
+    """In-memory collection that rejects duplicate IDs in one upsert, like Chroma"""
+
+    def __init__(self):
+        self.records = {}
+        self.upserts = []
+        self.fail_on_upsert = None
+
+    def count(self):
+        return len(self.records)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Expected IDs to be unique, found duplicates in {ids}")
+        if self.fail_on_upsert == len(self.upserts):
+            raise RuntimeError("write failed")
+        self.upserts.append(list(ids))
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            self.records[chunk_id] = (text, metadata)
+
+    def delete(self, where):
+        for chunk_id, (_, metadata) in list(self.records.items()):
+            if _matches(metadata, where):
+                del self.records[chunk_id]
+
+
+class FakeChroma:
+    """Stand-in for langchain_chroma.Chroma, one collection per directory"""
+
+    collections = {}
+
+    def __init__(self, persist_directory, embedding_function):
+        self.persist_directory = persist_directory
+        self._collection = self.collections.setdefault(persist_directory, FakeCollection())
+
+    def delete_collection(self):
+        self.collections.pop(self.persist_directory, None)
+
+
+class TestIngestionPipeline(unittest.TestCase):
+    """Test batching, checkpoints and resumption of the streaming ingestion"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.db = os.path.join(self.root, "db")
+        FakeChroma.collections = {}
+        self.checkpoints = []
+        save_checkpoint = ingest.save_checkpoint
+
+        def record_checkpoint(directory, state):
+            self.checkpoints.append(dict(state))
+            save_checkpoint(directory, state)
+
+        patchers = [mock.patch.object(ingest, "Chroma", FakeChroma),
+                    mock.patch.object(ingest, "save_checkpoint", record_checkpoint)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_corpus(self, records, name="corpus.jsonl"):
+        """Write JSONL records and return the path and the offset at the end of each line"""
+        path = os.path.join(self.root, name)
+        offsets = []
+        with open(path, "wb") as file:
+            for record in records:
+                file.write((json.dumps(record) + "\n").encode("utf-8"))
+                offsets.append(file.tell())
+        return path, offsets
+
+    def corpus(self, count=12):
+        # Long documents are split in two chunks; every third one has no id
+        records = []
+        for i in range(count):
+            text = f"document {i} " + "word " * (30 if i % 2 else 5)
+            records.append({"text": text} if i % 3 == 2 else {"id": f"d{i}", "text": text})
+        return records
+
+    def pipeline(self, data_path, directory=None, batch_size=3):
+        return IngestionPipeline(data_path, directory or self.db, FakeEmbeddings(),
+                                 embedding_name="fake", chunk_size=100, chunk_overlap=0.0,
+                                 batch_size=batch_size, report_interval=0.05)
+
+    def collection(self, directory=None):
+        return FakeChroma.collections[directory or self.db]
+
+    def test_batches_end_on_a_document(self):
+        """No document is split across two writes and every checkpoint is a line end"""
+        data_path, offsets = self.write_corpus(self.corpus())
+        self.pipeline(data_path).run()
+
+        documents_per_write = [{chunk_id.rsplit("-", 1)[0] for chunk_id in ids
+                                if not chunk_id.startswith("chunk-")}
+                               for ids in self.collection().upserts]
+        for i, documents in enumerate(documents_per_write):
+            for other in documents_per_write[i + 1:]:
+                self.assertFalse(documents & other)
+
+        committed = [state["offset"] for state in self.checkpoints[1:]]
+        self.assertEqual(committed, sorted(committed))
+        self.assertTrue(set(committed) <= set(offsets))
+        state = load_checkpoint(self.db)
+        self.assertTrue(state["complete"])
+        self.assertEqual(state["offset"], offsets[-1])
+        self.assertEqual(state["documents"], 12)
+        self.assertEqual(state["chunks"], self.collection().count())
+
+    def test_resume_after_failure(self):
+        """A failed build resumes from its checkpoint without duplicating or skipping chunks"""
+        data_path, _ = self.write_corpus(self.corpus())
+        reference_dir = os.path.join(self.root, "reference")
+        self.pipeline(data_path, reference_dir).run()
+        expected = self.collection(reference_dir).records
+
+        FakeChroma(self.db, None)._collection.fail_on_upsert = 2
+        with self.assertRaises(RuntimeError):
+            self.pipeline(data_path).run()
+        interrupted = load_checkpoint(self.db)
+        self.assertFalse(interrupted["complete"])
+        self.assertEqual(len(self.collection().upserts), 2)
+
+        self.collection().fail_on_upsert = None
+        self.pipeline(data_path).run(resume=True)
+        written = sum(self.collection().upserts, [])
+        self.assertEqual(len(written), len(set(written)))
+        self.assertEqual(self.collection().records, expected)
+
+    def test_restart_ignores_checkpoint(self):
+        """resume=False (--restart_ingest) starts over from an empty collection"""
+        data_path, _ = self.write_corpus(self.corpus())
+        FakeChroma(self.db, None)._collection.fail_on_upsert = 1
+        with self.assertRaises(RuntimeError):
+            self.pipeline(data_path).run()
+        partial = self.collection()
+
+        self.pipeline(data_path).run(resume=False)
+        self.assertIsNot(self.collection(), partial)
+        self.assertEqual(self.checkpoints[-1]["documents"], 12)
+        self.assertEqual(sum(len(ids) for ids in self.collection().upserts),
+                         self.collection().count())
+
+    def test_repeated_id_within_a_batch(self):
+        """Records sharing an id in one batch are written once, the last one wins"""
+        long_text = "first " + "word " * 30
+        data_path, _ = self.write_corpus([
+            {"id": "a", "text": long_text}, {"id": "b", "text": "b"},
+            {"id": "a", "text": "short a"}, {"text": "no id"}, {"text": "no id"}])
+        self.pipeline(data_path, batch_size=100).run()
+
+        stored = self.collection().records
+        self.assertEqual(len(self.collection().upserts), 1)
+        self.assertEqual(sorted(stored), ["a-0", "b-0", "chunk-4", "chunk-5"])
+        self.assertEqual(stored["a-0"][0], "short a")
+
+    def test_republished_document_drops_old_chunks(self):
+        """A document republished with fewer chunks loses its higher-numbered chunks"""
+        long_text = "first " + "word " * 30
+        data_path, _ = self.write_corpus([
+            {"id": "a", "text": long_text}, {"id": "b", "text": long_text},
+            {"id": "a", "text": "short a"}, {"id": 7, "text": long_text},
+            {"id": 7, "text": "short 7"}])
+        self.pipeline(data_path, batch_size=1).run()
+
+        stored = self.collection().records
+        self.assertEqual(sorted(stored), ["7-0", "a-0", "b-0", "b-1"])
+        self.assertEqual(stored["a-0"][0], "short a")
+        self.assertEqual(stored["7-0"][0], "short 7")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import llm_pool  # noqa: E402
+from llm_pool import LLMPool  # noqa: E402
+
+
+class FakeClient:
+    """Chat client answering with its own name after an optional delay or failing"""
+
+    def __init__(self, name, delay=0.0, fail=False, chunks=3):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.chunks = chunks
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def invoke(self, messages, stop=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        return self.name
+
+    def stream(self, messages, stop=None, **kwargs):
+        self.calls += 1
+        try:
+            time.sleep(self.delay)
+            if self.fail:
+                raise ConnectionError(f"{self.name} is down")
+            for i in range(self.chunks):
+                yield f"{self.name}-{i}"
+        finally:
+            self.closed.set()
+
+
+class TestLLMPool(unittest.TestCase):
+    """Test routing, ejection, re-admission and hedging with fake clients"""
+
+    def pool(self, clients, **kwargs):
+        kwargs.setdefault("probe_interval", 3600)
+        pool = LLMPool([f"http://llm{i}:1234/v1" for i in range(len(clients))], **kwargs)
+        self.addCleanup(pool.stop)
+        for endpoint, client in zip(pool.endpoints, clients):
+            endpoint.client = client
+        return pool
+
+    def wait_idle(self, pool, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while any(e.outstanding for e in pool.endpoints) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([e.outstanding for e in pool.endpoints], [0] * len(pool.endpoints))
+
+    def test_least_outstanding_routing(self):
+        """Requests go to the endpoint with the fewest requests in flight"""
+        pool = self.pool([FakeClient("a"), FakeClient("b")])
+        first = pool.choose()
+        second = pool.choose()
+        self.assertIsNot(first, second)
+        pool.record_success(first, 0.1)
+        self.assertIs(pool.choose(), first)
+
+    def test_ewma_routing(self):
+        """The ewma policy prefers the endpoint with the lowest latency times load"""
+        pool = self.pool([FakeClient("a"), FakeClient("b")], policy="ewma")
+        slow, fast = pool.endpoints
+        slow.ewma_latency, fast.ewma_latency = 1.2, 0.5
+        self.assertIs(pool.choose(), fast)
+        self.assertIs(pool.choose(), fast)
+        # 0.5 * 3 > 1.2 * 1 once two requests are in flight on the fast endpoint
+        self.assertIs(pool.choose(), slow)
+
+    def test_ejection_and_readmission(self):
+        """An endpoint is ejected after consecutive failures and re-admitted by a health check"""
+        pool = self.pool([FakeClient("a", fail=True), FakeClient("b")], eject_after=2)
+        broken, healthy = pool.endpoints
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                pool._call(broken, [], None)
+        self.assertFalse(broken.healthy)
+        self.assertEqual([pool.choose() for _ in range(3)], [healthy] * 3)
+
+        with mock.patch.object(llm_pool, "check_llm_availability", return_value=True):
+            pool.probe()
+        self.assertTrue(broken.healthy)
+        self.assertEqual(broken.consecutive_failures, 0)
+        self.assertIs(pool.choose(), broken)
+
+    def test_hedged_invoke(self):
+        """A slow request is copied to another endpoint and the first answer wins"""
+        slow, fast = FakeClient("slow", delay=0.5), FakeClient("fast")
+        pool = self.pool([slow, fast], hedge_after=0.05)
+        pool.endpoints[1].outstanding = 1  # route the first request to the slow endpoint
+        self.assertEqual(pool.invoke([]), "fast")
+        pool.endpoints[1].outstanding -= 1
+        self.assertEqual(pool.get_metrics()["hedges"], 1)
+        self.assertEqual(pool.get_metrics()["hedge_wins"], 1)
+        self.wait_idle(pool)
+
+    def test_no_hedge_without_another_healthy_endpoint(self):
+        """The hedge never goes back to the primary endpoint or to an ejected one"""
+        slow, ejected = FakeClient("slow", delay=0.2), FakeClient("ejected")
+        pool = self.pool([slow, ejected], hedge_after=0.05)
+        pool.endpoints[1].healthy = False
+        self.assertEqual(pool.invoke([]), "slow")
+        self.assertEqual(slow.calls, 1)
+        self.assertEqual(ejected.calls, 0)
+        self.assertEqual(pool.get_metrics()["hedges"], 0)
+
+    def test_hedged_stream(self):
+        """A stream without a first chunk is hedged and only the winner's chunks are returned"""
+        slow, fast = FakeClient("slow", delay=0.3), FakeClient("fast")
+        pool = self.pool([slow, fast], hedge_after=0.05)
+        pool.endpoints[1].outstanding = 1
+        chunks = list(pool.stream([]))
+        pool.endpoints[1].outstanding -= 1
+        self.assertEqual(chunks, ["fast-0", "fast-1", "fast-2"])
+        self.assertEqual(pool.get_metrics()["hedge_wins"], 1)
+        # The losing stream is closed and released without counting as a failure
+        self.assertTrue(slow.closed.wait(2.0))
+        self.wait_idle(pool)
+        self.assertEqual([e.failures for e in pool.endpoints], [0, 0])
+
+    def test_stream_retries_failure_before_first_chunk(self):
+        """A stream failing before its first chunk is sent again to another endpoint"""
+        broken, healthy = FakeClient("broken", fail=True), FakeClient("healthy")
+        for hedge_after in (0, 0.5):
+            pool = self.pool([broken, healthy], hedge_after=hedge_after)
+            pool.endpoints[1].outstanding = 1
+            chunks = list(pool.stream([]))
+            pool.endpoints[1].outstanding -= 1
+            self.assertEqual(chunks, ["healthy-0", "healthy-1", "healthy-2"])
+            self.assertEqual(pool.endpoints[0].failures, 1)
+            self.assertEqual(pool.get_metrics()["hedges"], 0)
+
+    def test_abandoned_stream_releases_endpoint(self):
+        """Closing a hedged stream early releases its endpoint"""
+        client = FakeClient("a", chunks=100)
+        pool = self.pool([client, FakeClient("b")], hedge_after=0.5)
+        pool.endpoints[1].outstanding = 1
+        stream = pool.stream([])
+        self.assertEqual(next(stream), "a-0")
+        stream.close()
+        pool.endpoints[1].outstanding -= 1
+        self.assertTrue(client.closed.wait(2.0))
+        self.wait_idle(pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import io
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from logger import (  # noqa: E402
+    BoundedQueueHandler, SamplingFilter, parse_sampling_rates, setup_logger
+)
+
+
+def make_record(msg, name="test", level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 0, msg, None, None)
+
+
+def drain(log_queue):
+    messages = []
+    while True:
+        try:
+            messages.append(log_queue.get_nowait().getMessage())
+        except queue.Empty:
+            return messages
+
+
+class TestBoundedQueueHandler(unittest.TestCase):
+    """Test the drop policies and the dropped-record counter of the async log queue"""
+
+    def handler(self, policy, maxsize=2, block_timeout=0.05):
+        log_queue = queue.Queue(maxsize=maxsize)
+        return log_queue, BoundedQueueHandler(log_queue, drop_policy=policy,
+                                              block_timeout=block_timeout)
+
+    def test_drop_new_keeps_queued_records(self):
+        """drop_new discards the incoming record when the queue is full"""
+        log_queue, handler = self.handler("drop_new")
+        for i in range(3):
+            handler.emit(make_record(f"r{i}"))
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(drain(log_queue), ["r0", "r1"])
+
+    def test_drop_old_keeps_newest_records(self):
+        """drop_old evicts the oldest queued record to make room for the new one"""
+        log_queue, handler = self.handler("drop_old")
+        for i in range(4):
+            handler.emit(make_record(f"r{i}"))
+        self.assertEqual(handler.dropped, 2)
+        # The drop warning never evicts a record: it waits for free space
+        self.assertEqual(drain(log_queue), ["r2", "r3"])
+
+    def test_block_waits_for_free_space(self):
+        """block waits up to block_timeout for the consumer before dropping"""
+        log_queue, handler = self.handler("block", maxsize=1, block_timeout=1.0)
+        handler.emit(make_record("r0"))
+        threading.Timer(0.05, log_queue.get).start()
+        handler.emit(make_record("r1"))
+        self.assertEqual(handler.dropped, 0)
+        self.assertEqual(drain(log_queue), ["r1"])
+
+        handler.block_timeout = 0.05
+        handler.emit(make_record("r2"))
+        start = time.monotonic()
+        handler.emit(make_record("r3"))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(drain(log_queue), ["r2"])
+
+    def test_dropped_records_are_reported(self):
+        """The number of dropped records is logged once the queue has room again"""
+        log_queue, handler = self.handler("drop_new")
+        for i in range(4):
+            handler.emit(make_record(f"r{i}"))
+        self.assertEqual(handler.dropped, 2)
+        drain(log_queue)
+        handler.emit(make_record("r4"))
+        self.assertEqual(drain(log_queue), [
+            "r4", "Dropped 2 log records (queue full, policy: drop_new)"])
+        handler.emit(make_record("r5"))
+        self.assertEqual(drain(log_queue), ["r5"])
+
+    def test_record_arguments_are_merged(self):
+        """Message arguments are merged in the calling thread"""
+        log_queue, handler = self.handler("drop_new")
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, "%s items", (3,), None)
+        handler.emit(record)
+        queued = log_queue.get_nowait()
+        self.assertEqual((queued.msg, queued.args), ("3 items", None))
+        self.assertEqual(record.args, (3,))
+
+    def test_unknown_policy(self):
+        """An unknown drop policy is rejected"""
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(queue.Queue(), drop_policy="drop_all")
+
+
+class TestSamplingFilter(unittest.TestCase):
+    """Test per-logger sampling of log records"""
+
+    def kept(self, sampling_filter, name, count, level=logging.INFO):
+        return sum(sampling_filter.filter(make_record("m", name, level)) for _ in range(count))
+
+    def test_rate_per_logger(self):
+        """Each configured logger keeps its own fraction of records"""
+        sampling_filter = SamplingFilter({"requests": 0.25, "chroma": 0.5, "noisy": 0})
+        self.assertEqual(self.kept(sampling_filter, "requests", 8), 2)
+        self.assertEqual(self.kept(sampling_filter, "chroma", 8), 4)
+        self.assertEqual(self.kept(sampling_filter, "noisy", 8), 0)
+        self.assertEqual(self.kept(sampling_filter, "other", 8), 8)
+
+    def test_most_specific_logger_applies(self):
+        """Child loggers inherit the closest configured rate"""
+        sampling_filter = SamplingFilter({"app": 0.5, "app.db": 1.0})
+        self.assertEqual(self.kept(sampling_filter, "app.db", 6), 6)
+        self.assertEqual(self.kept(sampling_filter, "app.api", 6), 3)
+
+    def test_warnings_are_never_sampled(self):
+        """Warnings and errors are always kept"""
+        sampling_filter = SamplingFilter({"app": 0})
+        self.assertEqual(self.kept(sampling_filter, "app", 5, logging.WARNING), 5)
+        self.assertEqual(self.kept(sampling_filter, "app", 5, logging.ERROR), 5)
+
+    def test_parse_sampling_rates(self):
+        """Sampling rules are parsed and invalid ones ignored"""
+        invalid = []
+        self.assertEqual(parse_sampling_rates("a=0.1, b.c=1,bad=x,", invalid),
+                         {"a": 0.1, "b.c": 1.0})
+        self.assertEqual(invalid, ["bad=x"])
+        self.assertEqual(parse_sampling_rates(None), {})
+
+
+class TestSetupLogger(unittest.TestCase):
+    """Test sampling through the handlers configured by setup_logger"""
+
+    name = "test_sampling"
+
+    def setUp(self):
+        self.console = io.StringIO()
+        patchers = [
+            mock.patch.dict(os.environ, {"LOG_SAMPLING": f"{self.name}.request=0.1,bad",
+                                         "LOG_ASYNC": "false", "LOG_FORMAT": "text"}),
+            mock.patch.object(sys, "stderr", self.console),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.logger = setup_logger(self.name)
+        self.addCleanup(self.close_logger)
+        self.log_path = self.logger.handlers[0].baseFilename
+
+    def close_logger(self):
+        for handler in list(self.logger.handlers):
+            handler.close()
+            self.logger.removeHandler(handler)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def count(self, text, message):
+        return sum(1 for line in text.splitlines() if message in line)
+
+    def test_file_and_console_keep_the_same_records(self):
+        """Sampled records are written to the log file and the console alike"""
+        request_logger = self.logger.getChild("request")
+        for i in range(100):
+            request_logger.info(f"sampled request {i}")
+        self.logger.info("unsampled message")
+        for handler in self.logger.handlers:
+            handler.flush()
+        with open(self.log_path, encoding="utf-8") as file:
+            logged = file.read()
+        console = self.console.getvalue()
+
+        self.assertEqual(self.count(logged, "sampled request"), 10)
+        self.assertEqual(self.count(console, "sampled request"), 10)
+        self.assertEqual(self.count(logged, "unsampled message"), 1)
+        self.assertEqual(self.count(console, "unsampled message"), 1)
+
+    def test_invalid_sampling_rule_is_logged(self):
+        """An invalid sampling rule is reported through the configured handlers"""
+        with open(self.log_path, encoding="utf-8") as file:
+            logged = file.read()
+        self.assertEqual(self.count(logged, "[WARNING]"), 1)
+        self.assertIn("Ignoring invalid log sampling rule: bad", logged)
+        self.assertIn("Ignoring invalid log sampling rule: bad", self.console.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from langchain_core.documents import Document  # noqa: E402
+from rerank import CrossEncoderReranker, TopNReranker  # noqa: E402
+
+
+class FakeCrossEncoder:
+    """Cross-encoder scoring a chunk by the number it ends with, recording each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append(list(pairs))
+        return [float(text.rsplit(" ", 1)[-1]) for _, text in pairs]
+
+
+def make_docs(*scores):
+    return [Document(page_content=f"chunk scored {score}", metadata={"id": str(i)})
+            for i, score in enumerate(scores)]
+
+
+class TestCrossEncoderReranker(unittest.TestCase):
+    """Test top-n selection and the score cache of the re-ranker"""
+
+    def reranker(self, **kwargs):
+        reranker = CrossEncoderReranker(**kwargs)
+        reranker._model = FakeCrossEncoder()
+        return reranker
+
+    def test_keeps_best_candidates(self):
+        """Candidates are sorted by score and only the top_n best are kept"""
+        reranker = self.reranker(top_n=2)
+        kept = reranker.compress_documents(make_docs(1, 5, 3), "query")
+        self.assertEqual([doc.metadata["id"] for doc in kept], ["1", "2"])
+        self.assertEqual([doc.metadata["rerank_score"] for doc in kept], [5.0, 3.0])
+
+    def test_top_n_per_call(self):
+        """A per-call top_n leaves the shared instance unchanged"""
+        reranker = self.reranker(top_n=1)
+        results = reranker.rerank_batch(["q1", "q2"], [make_docs(1, 2, 3), make_docs(4)], top_n=2)
+        self.assertEqual([len(docs) for docs in results], [2, 1])
+        self.assertEqual(reranker.top_n, 1)
+
+    def test_scores_are_cached(self):
+        """A repeated (query, chunk text) pair is not scored again"""
+        reranker = self.reranker()
+        reranker.rerank_batch(["query"], [make_docs(1, 2)])
+        # Same texts under other ids, plus one new chunk
+        reranker.rerank_batch(["query"], [make_docs(1, 2, 7)])
+        self.assertEqual([len(pairs) for pairs in reranker._model.calls], [2, 1])
+        self.assertEqual(reranker.get_stats()["cache_hits"], 2)
+        self.assertEqual(reranker.get_stats()["scored"], 3)
+
+        # The cache is keyed by query as well
+        reranker.rerank_batch(["other query"], [make_docs(1)])
+        self.assertEqual(len(reranker._model.calls), 3)
+
+    def test_cache_is_bounded(self):
+        """The least recently used scores are evicted beyond cache_size"""
+        reranker = self.reranker(cache_size=2)
+        reranker.rerank_batch(["query"], [make_docs(1, 2)])
+        reranker.rerank_batch(["query"], [make_docs(1)])
+        reranker.rerank_batch(["query"], [make_docs(3)])
+        reranker.rerank_batch(["query"], [make_docs(1, 2)])
+        self.assertEqual(reranker._model.calls[-1], [("query", "chunk scored 2")])
+
+        disabled = self.reranker(cache_size=0)
+        disabled.rerank_batch(["query"], [make_docs(1)])
+        disabled.rerank_batch(["query"], [make_docs(1)])
+        self.assertEqual(len(disabled._model.calls), 2)
+
+    def test_retrievers_keep_their_own_top_n(self):
+        """Retrievers sharing a re-ranker keep their own top_n and share its cache"""
+        reranker = self.reranker(top_n=4)
+        small = TopNReranker(reranker=reranker, top_n=1)
+        large = TopNReranker(reranker=reranker, top_n=3)
+        self.assertEqual(len(small.compress_documents(make_docs(1, 2, 3), "query")), 1)
+        self.assertEqual(len(large.compress_documents(make_docs(1, 2, 3), "query")), 3)
+        self.assertEqual(len(small.rerank_batch(["query"], [make_docs(1, 2)])[0]), 1)
+        self.assertEqual(len(reranker._model.calls), 1)
+        self.assertEqual(reranker.top_n, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from session import SessionCollectionMismatch, SessionStore, estimate_tokens  # noqa: E402
+
+
+class TestSessionStore(unittest.TestCase):
+    """Test the bounded, compact conversation session store"""
+
+    def test_turn_window_is_bounded(self):
+        """Only the last max_turns exchanges are kept"""
+        store = SessionStore(max_turns=3)
+        session_id = store.get_or_create().session_id
+        for i in range(10):
+            store.add_turn(session_id, f"q{i}", f"a{i}", [f"doc-{i}"])
+        session = store.get(session_id)
+        self.assertEqual([turn.query for turn in session.turns], ["q7", "q8", "q9"])
+
+    def test_last_source_ids(self):
+        """The sources of the last exchange are returned as chunk IDs"""
+        store = SessionStore()
+        store.add_turn("s1", "q", "a", ["1-0", "2-0", None])
+        self.assertEqual(store.get_last_source_ids("s1"), ["1-0", "2-0"])
+        self.assertIsNone(store.get_last_source_ids("unknown"))
+
+    def test_lru_eviction(self):
+        """The least recently used session is evicted first"""
+        store = SessionStore(max_sessions=2)
+        store.get_or_create("a")
+        store.get_or_create("b")
+        store.get("a")
+        store.get_or_create("c")
+        self.assertIsNotNone(store.get("a"))
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(len(store), 2)
+
+    def test_ttl_eviction(self):
+        """Idle sessions expire after the TTL"""
+        store = SessionStore(ttl=0.01)
+        store.get_or_create("a")
+        time.sleep(0.02)
+        self.assertIsNone(store.get("a"))
+
+    def test_history_fits_token_budget(self):
+        """The condensed history keeps the most recent turns within the budget"""
+        store = SessionStore(max_turns=50, max_answer_chars=40)
+        for i in range(50):
+            store.add_turn("s", f"question {i}", "x" * 200, [])
+        history = store.build_history("s", token_budget=64)
+        self.assertLessEqual(estimate_tokens(history), 64)
+        self.assertIn("question 49", history)
+        self.assertNotIn("question 0\n", history)
+        self.assertEqual(store.build_history("unknown"), "")
+
+    def test_session_is_bound_to_its_collection(self):
+        """A session keeps the collection of its sources and refuses another one"""
+        store = SessionStore()
+        store.add_turn("s", "q", "a", ["1-0"], collection="faq")
+        self.assertEqual(store.get("s").collection, "faq")
+        self.assertEqual(store.get_or_create("s", collection="faq").session_id, "s")
+        with self.assertRaises(SessionCollectionMismatch):
+            store.get_or_create("s", collection="default")
+        with self.assertRaises(SessionCollectionMismatch):
+            store.add_turn("s", "q2", "a2", ["2-0"], collection="default")
+        self.assertEqual(store.get_last_source_ids("s"), ["1-0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
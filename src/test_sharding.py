@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from chunk_store import ChunkStore  # noqa: E402
+from sharding import ShardedVectorStore, partition_chunks, shard_for  # noqa: E402
+
+
+class InMemoryShard:
+    """Shard holding fixed (distance, chunk_id) results, as a remote worker would return"""
+
+    def __init__(self, results, delay=0.0):
+        self.results = results
+        self.delay = delay
+
+    def query(self, query_vectors, k):
+        time.sleep(self.delay)
+        return [sorted(self.results)[:k] for _ in query_vectors]
+
+    def hydrate(self, chunk_ids):
+        return [SimpleNamespace(id=chunk_id) for chunk_id in chunk_ids]
+
+    def count(self):
+        return len(self.results)
+
+
+class TestShardedVectorStore(unittest.TestCase):
+    """Test hash partitioning and scatter-gather search"""
+
+    def test_partition_keeps_every_chunk_once(self):
+        """Each chunk lands in the shard given by its hash, with its ID preserved"""
+        store = ChunkStore()
+        for i in range(50):
+            store.add(f"text {i}", {"id": str(i // 3)})
+        shards = partition_chunks(store, 4)
+        self.assertEqual(sorted(sum((shard.ids for shard in shards), [])), sorted(store.ids))
+        for index, shard in enumerate(shards):
+            for chunk_id in shard.ids:
+                self.assertEqual(shard_for(chunk_id, 4), index)
+                self.assertEqual(shard.get(chunk_id), store.get(chunk_id))
+
+    def test_merge_returns_global_top_k(self):
+        """Partial top-k lists are merged by distance"""
+        sharded = ShardedVectorStore([
+            InMemoryShard([(0.1, "a"), (0.5, "b"), (0.9, "c")]),
+            InMemoryShard([(0.2, "d"), (0.3, "e")]),
+        ], embeddings=None)
+        results = sharded.search_by_vectors([[0.0], [1.0]], k=3)
+        self.assertEqual([[doc.id for doc in docs] for docs in results],
+                         [["a", "d", "e"], ["a", "d", "e"]])
+
+    def test_slow_shard_degrades_result(self):
+        """A shard slower than the timeout is skipped instead of blocking the search"""
+        sharded = ShardedVectorStore([
+            InMemoryShard([(0.1, "fast")]),
+            InMemoryShard([(0.0, "slow")], delay=0.5),
+        ], embeddings=None, shard_timeout=0.05)
+        start = time.perf_counter()
+        results = sharded.search_by_vectors([[0.0]], k=2)
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual([doc.id for doc in results[0]], ["fast"])
+        self.assertEqual(sharded.get_stats()["timeouts"], [0, 1])
+        self.assertEqual(sharded.get_stats()["degraded"], 1)
+
+    def test_concurrent_searches_do_not_time_out_in_queue(self):
+        """Time spent waiting behind other searches does not count against a shard"""
+        sharded = ShardedVectorStore([
+            InMemoryShard([(0.1, "a")], delay=0.05),
+            InMemoryShard([(0.2, "b")], delay=0.05),
+        ], embeddings=None, shard_timeout=0.5)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(
+                lambda _: sharded.search_by_vectors([[0.0]], k=2), range(64)))
+        self.assertTrue(all([doc.id for doc in r[0]] == ["a", "b"] for r in results))
+        self.assertEqual(sharded.get_stats()["degraded"], 0)
+
+    def test_hung_shard_only_holds_its_own_slots(self):
+        """A hung shard is skipped once its slots are used, other shards keep answering"""
+        release = threading.Event()
+
+        class HungShard(InMemoryShard):
+            def query(self, query_vectors, k):
+                release.wait(5)
+                return super().query(query_vectors, k)
+
+        sharded = ShardedVectorStore([
+            InMemoryShard([(0.1, "ok")]),
+            HungShard([(0.0, "hung")]),
+        ], embeddings=None, shard_timeout=0.05, max_in_flight=2)
+        try:
+            for _ in range(5):
+                results = sharded.search_by_vectors([[0.0]], k=2)
+                self.assertEqual([doc.id for doc in results[0]], ["ok"])
+            stats = sharded.get_stats()
+            self.assertEqual(stats["timeouts"], [0, 2])
+            self.assertEqual(stats["busy"], [0, 3])
+        finally:
+            release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,44 @@
 import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from langchain_core.documents import Document
 from logger import logger
 
 
+def parse_document_line(line: str) -> Optional[Document]:
+    """
+    Convertit une ligne JSONL en Document.
+
+    Args:
+        line: Ligne du fichier
+
+    Returns:
+        Optional[Document]: Le document, ou None pour une ligne vide ou un commentaire
+
+    Raises:
+        json.JSONDecodeError: Si la ligne n'est pas du JSON valide
+    """
+    if not line.strip() or line.strip().startswith('//'):  # Ignorer les commentaires
+        return None
+
+    data = json.loads(line)
+    # Adaptation en fonction de la structure de vos données
+    content = data.get('text', '') or data.get('content', '')
+    # Extraire les métadonnées, mais s'assurer qu'elles sont de types primitifs
+    metadata = {}
+    for k, v in data.items():
+        if k not in ['text', 'content']:
+            if isinstance(v, (str, int, float, bool)):
+                metadata[k] = v
+            elif isinstance(v, dict):
+                # Aplatir les dictionnaires imbriqués
+                for sub_k, sub_v in v.items():
+                    if isinstance(sub_v, (str, int, float, bool)):
+                        metadata[f"{k}_{sub_k}"] = sub_v
+
+    return Document(page_content=content, metadata=metadata)
+
+
 def load_documents(file_path: str) -> List[Document]:
     """
     Charge les documents depuis un fichier JSON Lines.
@@ -26,30 +60,14 @@ def load_documents(file_path: str) -> List[Document]:
         # Chargement depuis un fichier JSONL
         with open(file_path, 'r', encoding='utf-8') as file:
             for line in file:
-                if line.strip() and not line.strip().startswith('//'):  # Ignorer les commentaires
-                    try:
-                        data = json.loads(line)
-                        # Adaptation en fonction de la structure de vos données
-                        content = data.get(
-                            'text', '') or data.get('content', '')
-                        # Extraire les métadonnées, mais s'assurer qu'elles sont de types primitifs
-                        metadata = {}
-                        for k, v in data.items():
-                            if k not in ['text', 'content']:
-                                if isinstance(v, (str, int, float, bool)):
-                                    metadata[k] = v
-                                elif isinstance(v, dict):
-                                    # Aplatir les dictionnaires imbriqués
-                                    for sub_k, sub_v in v.items():
-                                        if isinstance(sub_v, (str, int, float, bool)):
-                                            metadata[f"{k}_{sub_k}"] = sub_v
-
-                        doc = Document(page_content=content, metadata=metadata)
-                        documents.append(doc)
-
-                    except json.JSONDecodeError:
-                        logger.warning(
-                            f"Skipping invalid JSON line in {file_path}")
+                try:
+                    doc = parse_document_line(line)
+                except json.JSONDecodeError:
+                    logger.warning(
+                        f"Skipping invalid JSON line in {file_path}")
+                    continue
+                if doc is not None:
+                    documents.append(doc)
     else:
         # Support pour d'autres formats pourrait être ajouté ici
         logger.error(f"Unsupported file format: {file_path.suffix}")